@@ -16,8 +16,11 @@
 
 import os
 import re
+import json
+import time
 import argparse
 import logging
+import multiprocessing
 
 # Add Django settings for the sake of imports
 os.environ['DJANGO_SETTINGS_MODULE'] = 'iris.core.settings'
@@ -25,8 +28,9 @@ from django.conf import settings
 from django.db import transaction
 from pyquery import PyQuery as pq
 
-from iris.etl.url import URL
+from iris.etl.url import URL, Downloader, PAGES, get_session
 from iris.etl import snapshot
+from iris.packagedb import payloads
 
 
 NAME_AND_LAST_MODIFIED = re.compile(
@@ -77,69 +81,128 @@ def guess_latest(baseurl):
     raise Exception("Can't find latest snapshot in:%s" % url)
 
 
-def import_snapshot(product, snapshot_path):
+def get_fingerprints(filename):
+    """
+    Get fingerprints of files of the last imported snapshot
+    """
+    if os.path.exists(filename):
+        with open(filename) as reader:
+            return json.load(reader)
+    return {}
+
+
+def save_fingerprints(filename, fingerprints):
+    """
+    Save fingerprints of files of the imported snapshot
+    """
+    with open(filename, 'w') as writer:
+        json.dump(fingerprints, writer)
+
+
+def import_snapshot(product, snapshot_path, jobs=1, fpfile=None):
     print('Starting snapshot data update...')
+    fingerprints = get_fingerprints(fpfile) if fpfile else None
     transaction.set_autocommit(False)
-    snapshot.from_dir(product, snapshot_path)
+    snapshot.from_dir(product, snapshot_path, jobs, fingerprints)
+    # rebuilt in the same transaction, so API never serves lists older
+    # than the data
+    payloads.rebuild()
     transaction.commit()
+    if fpfile:
+        save_fingerprints(fpfile, fingerprints)
 
 
 def parse_args():
     desc = "Download Tizen snapshots to the given workdir on your file system."
     parser = argparse.ArgumentParser(description=desc)
     parser.add_argument('workdir', type=str, help='Use for saving Snapshots')
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of processes to parse snapshot files, '
+                        'default is the number of CPUs')
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help='number of concurrent downloads, default is 8')
+    parser.add_argument('--no-check-certificate', action='store_true',
+                        help="don't verify TLS certificates of the server")
+    parser.add_argument('--full', action='store_true',
+                        help='import all files of snapshots instead of '
+                        'those changed since the last import')
     return parser.parse_args()
 
 
+def download_product(pname, urlstring, workdir, downloader, args):
+    """
+    download the latest snapshot of a product and import it
+    """
+    baseurl = URL(urlstring)
+    latesturl = guess_latest(baseurl)
+    pdir = os.path.join(workdir, latesturl.href.split('//')[1])
+
+    buildurl = latesturl.join('build.xml')
+    text = pq(buildurl.fetch())
+
+    idfile = os.path.join(workdir, '%s.latest.timestamp' % pname)
+    newid = text('id').text()
+    lastid = get_lastid(idfile)
+
+    if lastid and newid <= lastid:
+        print "%s has no update yet!" % pname
+        print "Last download timestamp: %s" % lastid
+        return
+
+    start = time.time()
+    downloader.reset_stats()
+    urls = [buildurl]
+    for target in each(text, 'buildtarget', 'name'):
+        # Image
+        image_path = os.path.join(
+            'builddata', 'images', target, 'images.xml')
+        urls.append(latesturl.join(image_path))
+
+        # Packages
+        pkg_path = os.path.join('repos', target, 'packages', 'repodata')
+        urls.extend(latesturl.join(pkg_path).glob('*-primary.xml.gz'))
+
+    # Manifest
+    manifest_path = os.path.join('builddata', 'manifest')
+    urls.extend(latesturl.join(manifest_path).listdir())
+
+    downloader.download_all(urls, workdir)
+    logger.info('%s: %d files in %.1fs, %d downloaded, %d resumed, '
+                '%d skipped, %d bytes', pname, downloader.stats['files'],
+                time.time() - start, downloader.stats['downloaded'],
+                downloader.stats['resumed'], downloader.stats['skipped'],
+                downloader.stats['bytes'])
+
+    fpfile = os.path.join(workdir, '%s.fingerprints.json' % pname)
+    if args.full and os.path.exists(fpfile):
+        os.remove(fpfile)
+    import_snapshot(pname, pdir, args.jobs, fpfile)
+
+    save_lastid(idfile, newid)
+
+
 def main():
     """
     download snapshots and call import_packages script
     """
     args = parse_args()
     workdir = args.workdir
+    verify = not args.no_check_certificate
+    downloader = Downloader(args.workers, verify=verify)
+    get_session().verify = verify
 
     if not os.path.exists(workdir):
         os.makedirs(workdir)
+    # pages are revalidated by conditional requests in the next run
+    pages_file = os.path.join(workdir, '.pages.json')
+    PAGES.load(pages_file)
 
-    for pname, urlstring in settings.IRIS_PRODUCT_MAPPING:
-        baseurl = URL(urlstring)
-        latesturl = guess_latest(baseurl)
-        pdir = os.path.join(workdir, latesturl.href.split('//')[1])
-
-        buildurl = latesturl.join('build.xml')
-        text = pq(buildurl.fetch())
-
-        idfile = os.path.join(workdir, '%s.latest.timestamp' % pname)
-        newid = text('id').text()
-        lastid = get_lastid(idfile)
-
-        if lastid and newid <= lastid:
-            print "%s has no update yet!" % pname
-            print "Last download timestamp: %s" % lastid
-            continue
-
-        buildurl.download(workdir)
-
-        for target in each(text, 'buildtarget', 'name'):
-            # Image
-            image_path = os.path.join(
-                'builddata', 'images', target, 'images.xml')
-            imgxmlurl = latesturl.join(image_path)
-            imgxmlurl.download(workdir)
-
-            # Packages
-            pkg_path = os.path.join('repos', target, 'packages', 'repodata')
-            for url in latesturl.join(pkg_path).glob('*-primary.xml.gz'):
-                url.download(workdir)
-
-        # Manifest
-        manifest_path = os.path.join('builddata', 'manifest')
-        for url in latesturl.join(manifest_path).listdir():
-            url.download(workdir)
-
-        import_snapshot(pname, pdir)
-
-        save_lastid(idfile, newid)
+    try:
+        for pname, urlstring in settings.IRIS_PRODUCT_MAPPING:
+            download_product(pname, urlstring, workdir, downloader, args)
+    finally:
+        PAGES.save(pages_file)
 
 
 if __name__ == '__main__':
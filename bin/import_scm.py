@@ -17,7 +17,9 @@ Data is available from:
 
 import os
 import sys
+import time
 import argparse
+import subprocess
 
 from django.db import transaction
 
@@ -31,9 +33,26 @@ if PROJECT not in sys.path:
 # Add Django settings for the sake of imports
 os.environ['DJANGO_SETTINGS_MODULE'] = 'iris.core.settings'
 
-from django.core.cache import cache
+from django.conf import settings
 
 from iris.etl import scm
+from iris.packagedb import payloads
+
+
+def git(filename, *args):
+    """
+    Run git command in the repository where `filename` locates
+    """
+    cwd = os.path.dirname(os.path.abspath(filename))
+    return subprocess.check_output(('git',) + args, cwd=cwd)
+
+
+def git_show(filename, rev):
+    """
+    Get content of `filename` at revision `rev`
+    """
+    return git(filename, 'show', '%s:./%s' % (rev, os.path.basename(filename)))
+
 
 def main():
     """
@@ -42,15 +61,48 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('domain', type=file, help='domain data file')
     parser.add_argument('gittree', type=file, help='git tree data file')
+    parser.add_argument('--incremental', metavar='STATEFILE',
+                        help='only import blocks changed since the commit '
+                        'recorded in STATEFILE, then record the imported '
+                        'commit into it. Data files must be in a git repo')
+    parser.add_argument('--full-hours', type=float, metavar='HOURS',
+                        default=settings.SCM_FULL_IMPORT_HOURS,
+                        help='with --incremental, import all blocks if the '
+                        'last full import is older than HOURS, '
+                        '%(default)s by default')
     args = parser.parse_args()
 
+    base, head, full_time = None, None, None
+    if args.incremental:
+        head = git(args.domain.name, 'rev-parse', 'HEAD').strip()
+        last, full_time = scm.read_state(args.incremental)
+        if last and (full_time is None or
+                     time.time() - full_time > args.full_hours * 3600):
+            print('No full import in %s hours, import all' % args.full_hours)
+            last, full_time = None, None
+        elif last == head:
+            print('No new commit since %s' % head)
+            return
+        if last:
+            try:
+                base = (git_show(args.domain.name, last),
+                        git_show(args.gittree.name, last))
+            except subprocess.CalledProcessError:
+                print("Can't read data of commit %s, import all" % last)
+                full_time = None
+            else:
+                print('Importing changes from %s to %s' % (last, head))
+
     print('Starting package data update...')
     transaction.set_autocommit(False)
-    scm.from_file(args.domain, args.gittree)
-    # note: cache.clear() must located in transaction, because without commit,
-    # the clear method doesn't work for database backend
-    cache.clear()
+    scm.from_file(args.domain, args.gittree, base)
+    # rebuilt in the same transaction, so API never serves lists older
+    # than the data
+    payloads.rebuild()
     transaction.commit()
 
+    if head:
+        scm.save_state(args.incremental, head, full_time)
+
 if __name__ == '__main__':
     main()
@@ -10,8 +10,17 @@ SYS_PROXY=/etc/sysconfig/proxy
 
 IMPORT_SCM=import_scm.py
 IMPORT_SNAPSHOT=download_snapshots.py
+# maintenance commands of iris. rebuild_payloads should also run more often
+# than this script to show web UI changes in the packagedb API sooner, and
+# prune_changes deletes changes older than PACKAGEDB_CHANGES_RETENTION_DAYS,
+# e.g. by cron:
+#   */5 * * * * python -m iris.manage rebuild_payloads
+MANAGE="python -m iris.manage"
 
 GITPATH=$(grep -E '^SCM_META_GIT_PATH = ".+"' /etc/iris/iris.conf | awk -F'"' '{print $2}')
+# last imported commit of scm/meta/git, removed by uploads to the scm API
+SCM_COMMIT=$(grep -E '^SCM_IMPORT_STATE = ".+"' /etc/iris/iris.conf | awk -F'"' '{print $2}')
+SCM_COMMIT=${SCM_COMMIT:-$WORKDIR/$PROJECT.last_commit}
 
 set_proxy(){
     . $SYS_PROXY
@@ -59,7 +68,10 @@ echo "$(date)|import scm start"
         fi
     fi
 
-    pull && cd $WORKDIR && $IMPORT_SCM $PROJECT/domains $PROJECT/git-trees
+    pull && cd $WORKDIR && $IMPORT_SCM --incremental $SCM_COMMIT \
+        $PROJECT/domains $PROJECT/git-trees
     $IMPORT_SNAPSHOT $WORKDIR
+    $MANAGE rebuild_payloads
+    $MANAGE prune_changes
 ) 9>$LOCKFILE
 echo "$(date)|import scm done"
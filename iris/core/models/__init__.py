@@ -28,17 +28,24 @@ __all__ = []
 
 # Package Database related model imports:
 from iris.core.models.packagedb import (Domain, SubDomain, License,
-    GitTree, Package, Product, Image, role_users)
+    GitTree, Package, Product, Image, ApiPayload, ChangeLog, ChangeLogState,
+    role_users, bulk_role_users)
 from iris.core.models.submissions import (
     PackageBuild, ImageBuild, Submission, SubmissionBuild, BuildGroup,
-    SubmissionGroup, Snapshot, DISPLAY_STATUS)
+    SubmissionGroup, SubmissionTrigram, QueuedEvent, Snapshot,
+    DISPLAY_STATUS)
 from iris.core.models.user import (UserProfile, UserParty,
     DomainRole, SubDomainRole, GitTreeRole)
 
 
 __all__.extend(['Domain', 'SubDomain', 'License', 'GitTree', 'Package',
-                'Product', 'Image', 'role_users'])
+                'Product', 'Image', 'ApiPayload', 'ChangeLog',
+                'ChangeLogState', 'role_users', 'bulk_role_users'])
 __all__.extend(['PackageBuild', 'ImageBuild', 'Submission', 'SubmissionBuild',
-                'BuildGroup', 'SubmissionGroup', 'Snapshot', 'DISPLAY_STATUS'])
+                'BuildGroup', 'SubmissionGroup', 'SubmissionTrigram',
+                'QueuedEvent', 'Snapshot', 'DISPLAY_STATUS'])
 __all__.extend(['UserProfile', 'UserParty',
                 'DomainRole', 'SubDomainRole', 'GitTreeRole', ])
+
+# connects receivers of model signals
+from iris.core import signals
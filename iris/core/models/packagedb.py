@@ -25,6 +25,10 @@ Models related to packaging and version control go here.
 APP_LABEL = 'core'
 
 from django.db import models
+from django.contrib.auth.models import User
+
+# number of objects whose users of roles are queried at a time
+ROLE_USERS_BATCH_SIZE = 500
 
 
 def role_users(roles_set, *args):
@@ -40,6 +44,35 @@ def role_users(roles_set, *args):
     return result
 
 
+def bulk_role_users(role_model, owner, pks, *args):
+    '''
+        return {pk: users of roles like role_users()} of objects in `pks`,
+        which roles of `role_model` refer to by field `owner`. Users are
+        dicts of `args`, or User objects if no `args` are given.
+        Users of every ROLE_USERS_BATCH_SIZE objects are queried by one
+        query over the group membership table, no matter what is
+        prefetched, and User objects by another one.
+    '''
+    # the same as get_role_display()
+    display = dict(role_model._meta.get_field('role').choices)
+    fields = ['user__%s' % arg for arg in args]
+    result = {pk: {} for pk in pks}
+    for i in range(0, len(pks), ROLE_USERS_BATCH_SIZE):
+        rows = list(role_model.objects.filter(
+            **{'%s__in' % owner: pks[i:i + ROLE_USERS_BATCH_SIZE]}).order_by(
+                'pk', 'user__pk').values_list(
+                    owner, 'role', 'user__pk', *fields))
+        objs = {} if args else User.objects.in_bulk(
+            set(row[2] for row in rows if row[2] is not None))
+        for row in rows:
+            users = result[row[0]].setdefault(
+                display.get(row[1], row[1]), [])
+            if row[2] is not None:
+                users.append(dict(zip(args, row[3:])) if args
+                             else objs[row[2]])
+    return result
+
+
 class RolesMixin(object):
 
     def get_users(rolestring):
@@ -250,3 +283,108 @@ class Image(models.Model):
     class Meta:
         app_label = APP_LABEL
         unique_together = ('name', 'target', 'product')
+
+
+class ApiPayload(models.Model):
+    """
+    Precomputed JSON of a packagedb API list, gzip compressed. They are
+    built and served by iris.packagedb.payloads.
+    """
+
+    # name of the list, such as "gittrees"
+    name = models.CharField(max_length=64, unique=True)
+    # increased when content changes
+    version = models.IntegerField(default=0)
+    etag = models.CharField(max_length=64)
+    data = models.BinaryField()
+    built = models.DateTimeField()
+    stale = models.BooleanField(default=False)
+
+    def __unicode__(self):
+        return u'%s v%d' % (self.name, self.version)
+
+    class Meta:
+        app_label = APP_LABEL
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Mark all lists stale, they are rebuilt by rebuild_payloads
+        """
+        cls.objects.filter(stale=False).update(stale=True)
+
+
+class ChangeLog(models.Model):
+    """
+    Change applied by iris.etl.loader.Loader, or by the web UI, admin and
+    events to entities and relationships registered in the loader (see
+    iris.core.signals). Revisions increase monotonically so clients can
+    ask for changes after the last one they have seen.
+
+    Writers call lock() first in their transactions, so revisions are
+    committed in order and readers never skip a revision committed later.
+    Changes older than a retention period are deleted by prune().
+    """
+    OPS = ('create', 'update', 'delete', 'add', 'remove')
+
+    revision = models.AutoField(primary_key=True)
+    # model name, such as "gittree", or "gittree,package" of relationships
+    entity = models.CharField(max_length=64)
+    # JSON of candidate key, such as {"gitpath": "platform/upstream/bluez"},
+    # or a list of candidate keys of both sides of relationships
+    key = models.TextField()
+    op = models.CharField(max_length=8, choices=zip(OPS, OPS))
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return u'%d %s %s %s' % (self.revision, self.op, self.entity,
+                                 self.key)
+
+    class Meta:
+        app_label = APP_LABEL
+
+    @classmethod
+    def lock(cls):
+        """
+        Lock out other writers until the current transaction ends, and
+        returns the ChangeLogState
+        """
+        state, _created = ChangeLogState.objects.select_for_update(
+            ).get_or_create(pk=1)
+        return state
+
+    @classmethod
+    def pruned(cls):
+        """
+        The last revision deleted by prune(), changes after it are complete
+        """
+        return ChangeLogState.objects.filter(pk=1).values_list(
+            'pruned', flat=True).first() or 0
+
+    @classmethod
+    def prune(cls, before):
+        """
+        Delete changes created before datetime `before`, returns the number
+        of changes deleted
+        """
+        state = cls.lock()
+        last = cls.objects.filter(created__lt=before).order_by(
+            '-revision').values_list('revision', flat=True).first()
+        if last is None or last <= state.pruned:
+            return 0
+        count = cls.objects.filter(revision__lte=last).count()
+        cls.objects.filter(revision__lte=last).delete()
+        state.pruned = last
+        state.save()
+        return count
+
+
+class ChangeLogState(models.Model):
+    """
+    The only row of it is locked by writers of ChangeLog, and records the
+    last revision pruned
+    """
+    pruned = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = APP_LABEL
@@ -13,6 +13,7 @@ This is the submission related Django database model module for the iris-core.
 
 Models related to submissions and acceptance go here.
 """
+from itertools import combinations
 from collections import defaultdict
 
 # Disabling class checks for the sake of Django specific Meta classes.
@@ -24,6 +25,7 @@ from collections import defaultdict
 APP_LABEL = 'core'
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
@@ -34,7 +36,36 @@ DISPLAY_STATUS = {
 }
 
 
-class PackageBuild(models.Model):
+class CountedBuild(object):
+    """
+    Mixin of builds keeping counters of their build group up to date
+    when they are saved or deleted.
+
+    COUNTERS maps build status to counter field of BuildGroup.
+    """
+    COUNTERS = {}
+
+    def saved_status(self):
+        """
+        Status in database, None if not saved
+        """
+        if not self.pk:
+            return None
+        return type(self).objects.filter(pk=self.pk).values_list(
+            'status', flat=True).first()
+
+    def save(self, *args, **kwargs):
+        old = self.saved_status()
+        super(CountedBuild, self).save(*args, **kwargs)
+        BuildGroup.count_build(self.group_id, self.COUNTERS, old, self.status)
+
+    def delete(self, *args, **kwargs):
+        BuildGroup.count_build(self.group_id, self.COUNTERS,
+                               self.saved_status(), None)
+        super(CountedBuild, self).delete(*args, **kwargs)
+
+
+class PackageBuild(CountedBuild, models.Model):
     """
     Class representing the package building step of the build process.
 
@@ -46,6 +77,10 @@ class PackageBuild(models.Model):
         'SUCCESS': 'Succeeded',
         'FAILURE': 'Failed',
         }
+    COUNTERS = {
+        'SUCCESS': 'packages_succeeded',
+        'FAILURE': 'packages_failed',
+        }
 
     package = models.ForeignKey('Package')
     status = models.CharField(max_length=64, choices=STATUS.items())
@@ -75,7 +110,7 @@ class PackageBuild(models.Model):
         unique_together = ('package', 'repo', 'arch', 'group')
 
 
-class ImageBuild(models.Model):
+class ImageBuild(CountedBuild, models.Model):
     """
     Class representing the image building step of the build process.
     """
@@ -85,6 +120,11 @@ class ImageBuild(models.Model):
         'SUCCESS': 'Succeeded',
         'FAILURE': 'Failed',
         }
+    COUNTERS = {
+        'BUILDING': 'images_building',
+        'SUCCESS': 'images_succeeded',
+        'FAILURE': 'images_failed',
+        }
 
     name = models.CharField(max_length=255, db_index=True)
     repo = models.CharField(max_length=255)
@@ -149,23 +189,115 @@ class BuildGroup(models.Model):
     operate_reason = models.TextField()
     snapshot = models.ForeignKey('Snapshot', blank=True, null=True)
 
+    # Number of package and image builds in each status. They are updated
+    # by saving builds (see CountedBuild) and never by saving the group
+    # itself, and can be rebuilt by update_counters()
+    packages_succeeded = models.IntegerField(default=0)
+    packages_failed = models.IntegerField(default=0)
+    images_building = models.IntegerField(default=0)
+    images_succeeded = models.IntegerField(default=0)
+    images_failed = models.IntegerField(default=0)
+
+    COUNTERS = ('packages_succeeded', 'packages_failed', 'images_building',
+                'images_succeeded', 'images_failed')
+
     def __unicode__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # counters loaded with this object may be out of date
+        if self.pk and not kwargs.get('force_insert') and \
+                'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.local_fields
+                if not field.primary_key and field.name not in self.COUNTERS]
+        super(BuildGroup, self).save(*args, **kwargs)
+
     @property
     def display_status(self):
         return self.STATUS[self.status]
 
+    @staticmethod
+    def count_build(group_id, counters, old, new):
+        """
+        Move a build of group `group_id` from status `old` to `new` in
+        `counters`, which maps status to counter field
+        """
+        if old == new:
+            return
+        changes = {}
+        if old in counters:
+            changes[counters[old]] = models.F(counters[old]) - 1
+        if new in counters:
+            changes[counters[new]] = models.F(counters[new]) + 1
+        if changes:
+            BuildGroup.objects.filter(pk=group_id).update(**changes)
+
+    def lock_counters(self):
+        """
+        Lock this group until the end of transaction and returns its
+        current counters
+        """
+        return BuildGroup.objects.select_for_update().filter(
+            pk=self.pk).values(*self.COUNTERS)[0]
+
+    @classmethod
+    def count_builds(cls, groups=None):
+        """
+        Returns {pk: {counter: number}} counted from builds of `groups`,
+        which is a queryset, a list of pks or None for all
+        """
+        pks = cls.objects.all()
+        if groups is not None:
+            pks = pks.filter(pk__in=groups)
+        counts = {pk: dict.fromkeys(cls.COUNTERS, 0)
+                  for pk in pks.values_list('pk', flat=True)}
+        for model in (PackageBuild, ImageBuild):
+            builds = model.objects.all()
+            if groups is not None:
+                builds = builds.filter(group__in=groups)
+            for row in builds.values('group', 'status').annotate(
+                    num=models.Count('id')):
+                if row['status'] in model.COUNTERS:
+                    counts[row['group']][model.COUNTERS[row['status']]] = \
+                        row['num']
+        return counts
+
+    @classmethod
+    def update_counters(cls, groups=None):
+        """
+        Rebuild counters of `groups` (see count_builds()) which are wrong,
+        returns the number of updated groups
+        """
+        groups_ = cls.objects.all()
+        if groups is not None:
+            groups_ = groups_.filter(pk__in=groups)
+        current = {row.pop('pk'): row
+                   for row in groups_.values('pk', *cls.COUNTERS)}
+        changed = 0
+        for pk, counts in cls.count_builds(groups).items():
+            if current.get(pk) != counts:
+                cls.objects.filter(pk=pk).update(**counts)
+                changed += 1
+        return changed
+
     def check_packages_status(self, packagebuild):
         """
         Check all packages building status
         Argument `packagebuild` is the newest comming package build
-        """
-        sts = {pbuild.natural_key(): pbuild.status
-               for pbuild in self.packagebuild_set.select_related('package').all()}
-        sts[packagebuild.natural_key()] = packagebuild.status
 
-        if any([i == 'FAILURE' for i in sts.values()]):
+        It's decided by counters of the group, so it doesn't depend on the
+        number of package builds.
+        """
+        counters = self.lock_counters()
+        old = PackageBuild.objects.filter(
+            package=packagebuild.package_id, repo=packagebuild.repo,
+            arch=packagebuild.arch, group=self).values_list(
+                'status', flat=True).first()
+        failed = counters['packages_failed'] - (old == 'FAILURE') + (
+            packagebuild.status == 'FAILURE')
+
+        if failed:
             final = '15_PKGFAILED'
         else:
             final = '10_PKGBUILDING'
@@ -190,12 +322,17 @@ class BuildGroup(models.Model):
         """
         Check all images building status
         Argument `status` is the newest comming image status
-        """
-        sts = {ibuild.natural_key(): ibuild.status
-               for ibuild in self.imagebuild_set.all()}
-        sts[imagebuild.natural_key()] = imagebuild.status
 
-        if any([i == 'FAILURE' for i in sts.values()]):
+        It's decided by counters of the group like check_packages_status()
+        """
+        counters = self.lock_counters()
+        old = ImageBuild.objects.filter(
+            name=imagebuild.name, group=self).values_list(
+                'status', flat=True).first()
+        failed = counters['images_failed'] - (old == 'FAILURE') + (
+            imagebuild.status == 'FAILURE')
+
+        if failed:
             final = '25_IMGFAILED'
         else:
             final = '20_IMGBUILDING'
@@ -206,12 +343,21 @@ class BuildGroup(models.Model):
 
     def populate_status(self):
         """
-        Populate this BuildGroup's status to related Submissions
+        Populate this BuildGroup's status to related Submissions,
+        returns the number of submissions whose status is changed
+
+        Only submissions in a different status are updated, in one query
+        no matter how many submissions the group has. Their pks are read
+        first, MySQL runs UPDATE ... WHERE id IN (SELECT ...) as a
+        dependent subquery over the whole submission table.
         """
-        for sbuild in self.submissionbuild_set.all().order_by('id'):
-            if sbuild.submission.status != self.status:
-                sbuild.submission.status = self.status
-                sbuild.submission.save()
+        submissions = list(self.submissionbuild_set.values_list(
+            'submission', flat=True))
+        changed = Submission.objects.filter(pk__in=submissions).exclude(
+            status=self.status).update(status=self.status,
+                                       updated=timezone.now())
+        Submission.update_states(submissions)
+        return changed
 
     @property
     def product(self):
@@ -284,6 +430,10 @@ class Submission(models.Model):
     reason = models.TextField()
     # TODO: update "updated" field when package created and image created
 
+    # Display statuses derived from build groups and joined by comma, such as
+    # "opened,accepted". It's maintained by update_states()
+    state = models.CharField(max_length=32, db_index=True, default='opened')
+
     def __unicode__(self):
         return self.name
 
@@ -291,6 +441,77 @@ class Submission(models.Model):
     def display_status(self):
         return dict(self.STATUS, **BuildGroup.STATUS)[self.status]
 
+    @staticmethod
+    def derive_state(status, group_statuses):
+        """
+        Derive state from status of submission and its build groups, which
+        gives the same results as properties opened, accepted and rejected
+        """
+        final = ('33_ACCEPTED', '36_REJECTED')
+        flags = []
+        if group_statuses:
+            if any(i not in final for i in group_statuses):
+                flags.append(DISPLAY_STATUS['OPENED'])
+            if '33_ACCEPTED' in group_statuses:
+                flags.append(DISPLAY_STATUS['ACCEPTED'])
+            if '36_REJECTED' in group_statuses:
+                flags.append(DISPLAY_STATUS['REJECTED'])
+        elif status == 'SUBMITTED':
+            flags.append(DISPLAY_STATUS['OPENED'])
+        return ','.join(flags) or 'error'
+
+    @classmethod
+    def derive_states(cls, submissions=None):
+        """
+        Returns {pk: derived state} of `submissions`, which is a queryset,
+        a list of pks or None for all
+        """
+        subs = cls.objects.all()
+        sbuilds = SubmissionBuild.objects.all()
+        if submissions is not None:
+            subs = subs.filter(pk__in=submissions)
+            sbuilds = sbuilds.filter(submission__in=submissions)
+        groups = defaultdict(set)
+        for pk, status in sbuilds.values_list('submission', 'group__status'):
+            groups[pk].add(status)
+        return {pk: cls.derive_state(status, groups[pk])
+                for pk, status in subs.values_list('pk', 'status')}
+
+    @classmethod
+    def update_states(cls, submissions=None):
+        """
+        Update state of `submissions` (see derive_states()) which are
+        changed, returns the number of updated submissions
+        """
+        subs = cls.objects.all()
+        if submissions is not None:
+            subs = subs.filter(pk__in=submissions)
+        current = dict(subs.values_list('pk', 'state'))
+        changed = defaultdict(list)
+        for pk, state in cls.derive_states(submissions).items():
+            if current.get(pk) != state:
+                changed[state].append(pk)
+        for state, pks in changed.items():
+            # keep the number of sql variables under the limit of sqlite
+            for i in range(0, len(pks), 500):
+                cls.objects.filter(pk__in=pks[i:i + 500]).update(state=state)
+        return sum(len(i) for i in changed.values())
+
+    @staticmethod
+    def state_query(status):
+        """
+        Q object of submissions in display status `status` by the indexed
+        state field
+        """
+        names = [DISPLAY_STATUS[i] for i in ('OPENED', 'ACCEPTED', 'REJECTED')]
+        if status not in names:
+            raise ValueError('Unknown status: %s' % status)
+        return models.Q(state__in=[
+            ','.join(flags)
+            for num in range(1, len(names) + 1)
+            for flags in combinations(names, num)
+            if status in flags])
+
     @property
     def opened(self):
         groups = {
@@ -358,6 +579,138 @@ class SubmissionBuild(models.Model):
         unique_together = ('submission', 'product')
 
 
+class QueuedEvent(models.Model):
+    """
+    Class representing a submission event waiting to be applied by event
+    workers, see iris.submissions.queue.
+
+    Events with the same shard are applied one by one in the order of id.
+    """
+    STATUS = {
+        'PENDING': 'Pending',
+        'FAILED': 'Failed',
+        }
+
+    typ = models.CharField(max_length=64)
+    # event parameters as a JSON object
+    data = models.TextField()
+    # pre-release project name of build group events, empty for others
+    shard = models.CharField(max_length=255, db_index=True, blank=True)
+    status = models.CharField(max_length=16, db_index=True,
+                              choices=STATUS.items(), default='PENDING')
+
+    created = models.DateTimeField(auto_now_add=True)
+    # don't apply before this time, it's delayed when retrying
+    available = models.DateTimeField()
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.typ, self.shard)
+
+    @classmethod
+    def stats(cls):
+        """
+        Depth and latency metrics of the queue
+        """
+        pending = cls.objects.filter(status='PENDING')
+        oldest = pending.aggregate(oldest=models.Min('created'))['oldest']
+        return {
+            'pending': pending.count(),
+            'retrying': pending.filter(attempts__gt=0).count(),
+            'failed': cls.objects.filter(status='FAILED').count(),
+            'shards': pending.values('shard').distinct().count(),
+            'oldest_pending_seconds': (
+                timezone.now() - oldest).total_seconds() if oldest else 0,
+            }
+
+    class Meta:
+        app_label = APP_LABEL
+
+
+def trigrams(text):
+    """
+    Set of lower case trigrams of `text`
+    """
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SubmissionTrigram(models.Model):
+    """
+    Trigram index of searchable fields of submissions.
+
+    A row means `gram` occurs in `field` of `submission`. Submissions
+    containing a string have all trigrams of the string, so they are
+    looked up by the (gram, field) index instead of LIKE '%...%' scans
+    across User and GitTree. The index is maintained by the submitted
+    event, the SCM import and edits of users and git trees (see
+    iris.core.signals), and rebuilt by command index_submissions.
+    """
+    # field: columns of Submission.objects.values_list()
+    FIELDS = {
+        'name': ('name',),
+        'owner': ('owner__email', 'owner__first_name', 'owner__last_name'),
+        'gittree': ('gittree__gitpath',),
+        'commit': ('commit',),
+        }
+
+    submission = models.ForeignKey('Submission')
+    field = models.CharField(max_length=16)
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        app_label = APP_LABEL
+        index_together = (('gram', 'field'),)
+
+    @classmethod
+    def index(cls, submissions=None, fields=None, chunk=500):
+        """
+        (Re)build index of `fields` (all by default) of `submissions`,
+        which is a queryset, a list of pks or None for all
+        """
+        fields = fields or cls.FIELDS.keys()
+        columns = [col for field in fields for col in cls.FIELDS[field]]
+        subs = Submission.objects.order_by('pk')
+        if submissions is not None:
+            subs = subs.filter(pk__in=submissions)
+        pks = list(subs.values_list('pk', flat=True))
+        for i in range(0, len(pks), chunk):
+            page = pks[i:i + chunk]
+            cls.objects.filter(submission__in=page, field__in=fields).delete()
+            rows = []
+            for values in Submission.objects.filter(pk__in=page).values(
+                    'pk', *columns):
+                for field in fields:
+                    grams = set()
+                    for col in cls.FIELDS[field]:
+                        grams |= trigrams(values[col] or '')
+                    rows.extend(cls(submission_id=values['pk'], field=field,
+                                    gram=gram) for gram in grams)
+            cls.objects.bulk_create(rows)
+        return len(pks)
+
+    @classmethod
+    def candidates(cls, fields, value):
+        """
+        Returns list of pks of submissions of which any of `fields`
+        contains all trigrams of `value`, or None if `value` is too short to
+        be looked up by trigrams. Candidates still need to be checked by the
+        original conditions.
+
+        The pks are fetched rather than returned as a subquery, MySQL runs
+        IN (SELECT ... GROUP BY ... HAVING) again for every row it checks.
+        """
+        grams = trigrams(value)
+        if not grams:
+            return None
+        return sorted(set(cls.objects.filter(
+            field__in=fields, gram__in=grams).values(
+                'submission', 'field').annotate(
+                    num=models.Count('gram')).filter(
+                        num=len(grams)).values_list('submission', flat=True)))
+
+
 class SubmissionGroup(object):
     """
     Submissions with the same tag name are called SubmissionGroup.
@@ -386,7 +739,7 @@ class SubmissionGroup(object):
         for sub in submissions:
             groups[sub.name].append(sub)
         groups = [cls(i, filter_status) for i in groups.values()]
-        groups.sort(key=lambda g: g.updated, reverse=True)
+        groups.sort(key=lambda g: (g.updated, g.name), reverse=True)
         return groups
 
     def __unicode__(self):
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+"""
+This module contains helpers of keyset pagination.
+
+Items are ordered by (updated, name) descendingly and a page starts after
+the (updated, name) of the last item of the previous page, which is passed
+around as an opaque cursor string. Unlike offsets, the cost of a page
+doesn't depend on how deep it is.
+
+Example usage::
+
+    page, cursor = keyset_page(BuildGroup.objects.all(),
+                               request.GET.get('after'), 50)
+"""
+
+import json
+import base64
+from datetime import datetime
+
+from django.db.models import Q, Max
+from django.utils import timezone
+
+# pylint: disable=C0103
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def encode_cursor(updated, name):
+    """
+    Encode (updated, name) of an item to cursor string
+    """
+    if timezone.is_aware(updated):
+        updated = timezone.make_naive(updated, timezone.utc)
+    return base64.urlsafe_b64encode(json.dumps(
+        [updated.strftime(DATETIME_FORMAT), name]))
+
+
+def decode_cursor(cursor):
+    """
+    Decode cursor string to (updated, name), raise ValueError if the
+    cursor is invalid
+    """
+    try:
+        updated, name = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        updated = datetime.strptime(updated, DATETIME_FORMAT)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor: %s' % cursor)
+    return timezone.make_aware(updated, timezone.utc), name
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    """
+    Parse page size from request parameter, raise ValueError if it's not
+    a positive integer
+    """
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit <= 0:
+        raise ValueError('limit must be positive: %s' % value)
+    return min(limit, MAX_LIMIT)
+
+
+def keyset_page(queryset, cursor, limit, updated='updated', name='name'):
+    """
+    Returns (items, next cursor) of a page of `queryset` which is ordered
+    by fields `updated` and `name`. Next cursor is None for the last page.
+    """
+    queryset = queryset.order_by('-%s' % updated, '-%s' % name)
+    if cursor:
+        last_updated, last_name = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{'%s__lt' % updated: last_updated}) |
+            Q(**{updated: last_updated, '%s__lt' % name: last_name}))
+    items = list(queryset[:limit + 1])
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, updated), getattr(last, name))
+
+
+def keyset_group_page(queryset, cursor, limit, group='name',
+                      updated='updated'):
+    """
+    Returns (group values, next cursor) of a page of distinct `group`
+    values in `queryset`, which are ordered by (max of `updated`, `group`)
+    """
+    rows = queryset.values(group).annotate(last=Max(updated))
+
+    def _ordered(rows):
+        return rows.order_by('-last', '-%s' % group)
+
+    if cursor:
+        last_updated, last_name = decode_cursor(cursor)
+        # OR of conditions on aggregation and on group column can't be
+        # expressed in one HAVING clause, so query them separately
+        items = list(_ordered(rows.filter(
+            **{'%s__lt' % group: last_name}).filter(
+                last=last_updated))[:limit + 1])
+        if len(items) <= limit:
+            items.extend(_ordered(rows.filter(last__lt=last_updated))[
+                :limit + 1 - len(items)])
+    else:
+        items = list(_ordered(rows)[:limit + 1])
+
+    names = [i[group] for i in items[:limit]]
+    if len(items) <= limit:
+        return names, None
+    last = items[limit - 1]
+    return names, encode_cursor(last['last'], last[group])
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+"""
+Lightweight per-request query profiling, usable in production.
+
+QueryProfilingMiddleware wraps database cursors to count queries and time
+them while a request is handled. For each request it logs a line of
+key=value pairs to the "iris.core.profiling" logger, aggregates the
+numbers per URL name, see STATS and the query_stats view, and adds headers
+X-Query-Count, X-DB-Time and X-View-Time (in milliseconds) to responses
+for staff.
+
+STATS lives in the process, so with several server processes each one
+aggregates only the requests it handles, and /profiling/ shows those of
+the process serving it. The log lines cover all of them.
+
+Settings:
+
+QUERY_PROFILING_HEADERS -- add the headers to responses for everyone, not
+  only for staff
+QUERY_PROFILING_SLOWEST -- number of slowest statements logged per request
+QUERY_PROFILING_LOG_QUERIES -- log requests with at least this number of
+  queries at INFO level, others at DEBUG level
+"""
+import time
+import heapq
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.core.urlresolvers import resolve, Resolver404
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class QueryRecorder(object):
+    """
+    Number, time and slowest statements of queries in a request
+    """
+    def __init__(self, slowest=3):
+        self.count = 0
+        self.time = 0.0
+        self.slowest = []  # heap of (seconds, sql)
+        self.size = slowest
+
+    def record(self, sql, seconds):
+        self.count += 1
+        self.time += seconds
+        if self.size:
+            item = (seconds, sql)
+            if len(self.slowest) < self.size:
+                heapq.heappush(self.slowest, item)
+            else:
+                heapq.heappushpop(self.slowest, item)
+
+
+def recording():
+    """
+    QueryRecorder of the request handled in this thread, None if not
+    profiling
+    """
+    return getattr(_local, 'recorder', None)
+
+
+class ProfilingCursor(object):
+    """
+    Cursor wrapper timing execute() and executemany()
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def _timed(self, method, sql, *args):
+        recorder = recording()
+        if recorder is None:
+            return method(sql, *args)
+        start = time.time()
+        try:
+            return method(sql, *args)
+        finally:
+            recorder.record(sql, time.time() - start)
+
+    def execute(self, sql, params=None):
+        return self._timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(self.cursor.executemany, sql, param_list)
+
+
+def install(connection):
+    """
+    Make cursors of `connection` ProfilingCursor, connections are local
+    to threads so it's done in each thread
+    """
+    if getattr(connection, 'profiling_installed', False):
+        return
+    cursor = connection.cursor
+
+    def profiling_cursor():
+        return ProfilingCursor(cursor())
+
+    connection.cursor = profiling_cursor
+    connection.profiling_installed = True
+
+
+class QueryStats(object):
+    """
+    Requests, queries and time aggregated per URL name in this process,
+    other server processes have their own
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: defaultdict(float))
+
+    def add(self, name, queries, db_time, view_time):
+        with self.lock:
+            stat = self.stats[name]
+            stat['requests'] += 1
+            stat['queries'] += queries
+            stat['db_time'] += db_time
+            stat['view_time'] += view_time
+            stat['max_queries'] = max(stat['max_queries'], queries)
+
+    def snapshot(self, reset=False):
+        """
+        Returns {url name: stat} with means per request, times are in
+        milliseconds
+        """
+        with self.lock:
+            stats = {name: dict(stat) for name, stat in self.stats.items()}
+            if reset:
+                self.stats.clear()
+        result = {}
+        for name, stat in stats.items():
+            requests = stat['requests']
+            result[name] = {
+                'requests': int(requests),
+                'mean_queries': stat['queries'] / requests,
+                'max_queries': int(stat['max_queries']),
+                'mean_db_time': stat['db_time'] * 1000 / requests,
+                'mean_view_time': stat['view_time'] * 1000 / requests,
+                }
+        return result
+
+
+STATS = QueryStats()
+
+
+def url_name(path):
+    """
+    URL name of `path` for aggregation, or the view's module path if it's
+    not named
+    """
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return '<unresolved>'
+    if match.url_name:
+        return match.url_name
+    func = match.func
+    return '%s.%s' % (func.__module__, getattr(
+        func, '__name__', type(func).__name__))
+
+
+class QueryProfilingMiddleware(object):
+    """
+    Count and time queries of each request, see module docstring
+    """
+
+    def process_request(self, request):
+        for alias in connections:
+            install(connections[alias])
+        _local.recorder = QueryRecorder(
+            getattr(settings, 'QUERY_PROFILING_SLOWEST', 3))
+        request.profiling_start = time.time()
+
+    def process_response(self, request, response):
+        recorder = recording()
+        _local.recorder = None
+        start = getattr(request, 'profiling_start', None)
+        if recorder is None or start is None:
+            return response
+        view_time = time.time() - start
+
+        if getattr(settings, 'QUERY_PROFILING_HEADERS', False) or (
+                getattr(request, 'user', None) is not None and
+                request.user.is_staff):
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-DB-Time'] = '%.1f' % (recorder.time * 1000)
+            response['X-View-Time'] = '%.1f' % (view_time * 1000)
+
+        name = url_name(request.path_info)
+        STATS.add(name, recorder.count, recorder.time, view_time)
+
+        level = logging.DEBUG
+        if recorder.count >= getattr(
+                settings, 'QUERY_PROFILING_LOG_QUERIES', 50):
+            level = logging.INFO
+        if logger.isEnabledFor(level):
+            slowest = ' '.join(
+                'slow%d_ms=%.1f slow%d_sql=%r' % (
+                    i, seconds * 1000, i, sql[:200])
+                for i, (seconds, sql) in enumerate(
+                    sorted(recorder.slowest, reverse=True)))
+            logger.log(
+                level, 'url=%s method=%s path=%r status=%d queries=%d '
+                'db_ms=%.1f view_ms=%.1f %s', name, request.method,
+                request.path, response.status_code, recorder.count,
+                recorder.time * 1000, view_time * 1000, slowest)
+        return response
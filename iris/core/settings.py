@@ -80,6 +80,7 @@ STATICFILES_FINDERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'iris.core.profiling.QueryProfilingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -195,6 +196,47 @@ LOGGING = {
 UI_AVAILABLE = True
 REST_API_AVAILABLE = True
 
+# Setting EVENTS_QUEUED stores submission events posted to the REST API in a
+# queue and responds 202 at once. Events are then applied by workers of
+# "manage.py event_workers", which must be running in this mode.
+
+EVENTS_QUEUED = False
+
+# QueryProfilingMiddleware logs requests with at least
+# QUERY_PROFILING_LOG_QUERIES queries with their slowest statements, and
+# adds the number and time of queries to response headers for staff, or for
+# everyone if QUERY_PROFILING_HEADERS is set. Numbers aggregated per URL
+# name are shown by /profiling/ to staff, they are kept per process, so
+# with several server processes it only shows the one serving it.
+
+QUERY_PROFILING_HEADERS = False
+QUERY_PROFILING_SLOWEST = 3
+QUERY_PROFILING_LOG_QUERIES = 50
+
+# JSON of packagedb API lists are precomputed and rebuilt after scm and
+# snapshot data is imported. Changes made by the web UI or admin mark them
+# stale, then they are rebuilt by "manage.py rebuild_payloads", which is run
+# by bin/update_iris_data.sh and should also run more often by cron, such
+# as every 5 minutes. PACKAGEDB_PAYLOAD_MAX_AGE is the number of seconds
+# after which they are rebuilt anyway, to show changes made by other means.
+
+PACKAGEDB_PAYLOAD_MAX_AGE = 600
+
+# Changes served by /api/packagedb/changes/ are kept for this number of days
+# and deleted by "manage.py prune_changes", which is run by
+# bin/update_iris_data.sh.
+# Clients asking for older ones are told to sync all data again.
+
+PACKAGEDB_CHANGES_RETENTION_DAYS = 30
+
+# "import_scm.py --incremental" records the imported commit of scm/meta/git
+# in SCM_IMPORT_STATE and then only imports blocks changed since it, but
+# imports all of them again every SCM_FULL_IMPORT_HOURS. Uploads to
+# /api/packagedb/scm/update/ remove the file, so the next import is full.
+
+SCM_IMPORT_STATE = '/tmp/iris_scm/meta.last_commit'
+SCM_FULL_IMPORT_HOURS = 24
+
 # Secret key should be read from an external file for security reasons.
 # Please DO NOT expose this file to anybody after setting it in production.
 # Consult documentation for the proper secret key format.
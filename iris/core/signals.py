@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+"""
+Signal receivers keeping data derived from models, such as API payloads,
+the search index and the change log, up to date when models are changed by
+the web UI, admin or events.
+
+They are quiet while loaders write, see iris.etl.loader.quiet(), scm and
+snapshot imports update the derived data by themselves in bulk.
+"""
+
+# pylint: disable=W0613
+
+from django.contrib.auth.models import User, Group
+from collections import defaultdict
+
+from django.db.models.signals import (
+    pre_save, post_save, pre_delete, post_delete, m2m_changed)
+
+from iris.core.models import (
+    Domain, SubDomain, License, GitTree, Package, Product, ApiPayload,
+    DomainRole, SubDomainRole, GitTreeRole, Submission, SubmissionTrigram)
+from iris.etl.loader import quiet, mname, get_default_loader
+
+# models shown in the packagedb API lists
+PAYLOAD_MODELS = (Domain, SubDomain, License, GitTree, Package, Product,
+                  DomainRole, SubDomainRole, GitTreeRole)
+PAYLOAD_RELATIONS = (GitTree.packages.through, GitTree.licenses.through,
+                     Product.gittrees.through, User.groups.through)
+# user fields shown in the packagedb API lists
+PAYLOAD_USER_FIELDS = frozenset(['first_name', 'last_name', 'email'])
+# model: (field of SubmissionTrigram, its columns in model)
+INDEXED_MODELS = {
+    User: ('owner', ('email', 'first_name', 'last_name')),
+    GitTree: ('gittree', ('gitpath',)),
+    }
+# entities and relationships registered by it are recorded in ChangeLog
+CHANGELOG = get_default_loader()
+# through: [(model1, model2, field1, field2)] of registered relationships
+CHANGELOG_RELATIONS = defaultdict(list)
+for _model1, _model2, _through, _field1, _field2 in CHANGELOG.relations():
+    CHANGELOG_RELATIONS[_through].append((_model1, _model2, _field1, _field2))
+# saves of these models updating none of the fields are not recorded
+CHANGELOG_FIELDS = {User: PAYLOAD_USER_FIELDS}
+
+
+@quiet
+def invalidate_payloads(sender, **kwargs):
+    """
+    Mark the precomputed API lists stale, relationships only after they
+    are changed
+    """
+    action = kwargs.get('action')
+    if action is None or action.startswith('post_'):
+        ApiPayload.invalidate()
+
+
+@quiet
+def invalidate_payloads_of_user(sender, instance, created, update_fields,
+                                **kwargs):
+    """
+    Mark the precomputed API lists stale if users in roles change, but not
+    for logins, which only update last_login
+    """
+    if created or (update_fields is not None and
+                   not PAYLOAD_USER_FIELDS.intersection(update_fields)):
+        return
+    if Group.objects.filter(user=instance).exists():
+        ApiPayload.invalidate()
+
+
+@quiet
+def remember_indexed(sender, instance, update_fields, **kwargs):
+    """
+    Keep the indexed values of users and git trees before they are saved
+    """
+    _, columns = INDEXED_MODELS[sender]
+    if instance.pk is None or (update_fields is not None and
+                               not set(columns).intersection(update_fields)):
+        return
+    instance._indexed = sender.objects.filter(
+        pk=instance.pk).values_list(*columns).first()
+
+
+@quiet
+def index_submissions(sender, instance, **kwargs):
+    """
+    Reindex submissions of users and git trees whose indexed values changed
+    """
+    field, columns = INDEXED_MODELS[sender]
+    old = instance.__dict__.pop('_indexed', None)
+    if old is not None and old != tuple(getattr(instance, column)
+                                        for column in columns):
+        SubmissionTrigram.index(Submission.objects.filter(
+            **{field: instance}).values('pk'), fields=[field])
+
+
+def _logged(sender, update_fields):
+    """
+    True if a save of `sender` updating `update_fields` is recorded
+    """
+    fields = CHANGELOG_FIELDS.get(sender)
+    return (fields is None or update_fields is None or
+            bool(fields.intersection(update_fields)))
+
+
+@quiet
+def remember_key(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the candidate key of entities before they are saved or deleted
+    """
+    if instance.pk is not None and _logged(sender, update_fields):
+        instance._ckey = CHANGELOG.candidate_keys(
+            sender, [instance.pk]).get(instance.pk)
+
+
+@quiet
+def log_save(sender, instance, update_fields, **kwargs):
+    """
+    Record saves of entities like loaders do, a changed candidate key is
+    a delete and a create
+    """
+    if not _logged(sender, update_fields):
+        return
+    entity = mname(sender)
+    old = instance.__dict__.pop('_ckey', None)
+    new = CHANGELOG.candidate_keys(sender, [instance.pk])[instance.pk]
+    if old == new:
+        CHANGELOG.record(entity, 'update', [new])
+        return
+    if old is not None:
+        CHANGELOG.record(entity, 'delete', [old])
+    CHANGELOG.record(entity, 'create', [new])
+
+
+@quiet
+def log_delete(sender, instance, **kwargs):
+    """
+    Record deletes of entities, including cascaded ones
+    """
+    old = instance.__dict__.pop('_ckey', None)
+    if old is not None:
+        CHANGELOG.record(mname(sender), 'delete', [old])
+
+
+@quiet
+def log_relation(sender, instance, action, pk_set, **kwargs):
+    """
+    Record adds and removes of relationships, the other sides of clear()
+    are taken before they are removed
+    """
+    relations = CHANGELOG_RELATIONS[sender]
+    _, _, field1, field2 = relations[0]
+    if isinstance(instance, sender._meta.get_field(field1).rel.to):
+        this, other = field1, field2
+    else:
+        this, other = field2, field1
+    if action == 'pre_clear':
+        instance._cleared = set(sender.objects.filter(**{
+            this: instance.pk}).values_list(
+                sender._meta.get_field(other).attname, flat=True))
+        return
+    if action == 'post_clear':
+        pk_set, op = instance.__dict__.pop('_cleared', ()), 'remove'
+    elif action in ('post_add', 'post_remove'):
+        op = action[len('post_'):]
+    else:
+        return
+    for model1, model2, _, _ in relations:
+        pks1, pks2 = ([instance.pk], pk_set) if this == field1 else (
+            pk_set, [instance.pk])
+        keys1 = CHANGELOG.candidate_keys(model1, pks1)
+        keys2 = CHANGELOG.candidate_keys(model2, pks2)
+        CHANGELOG.record(
+            ','.join([mname(model1), mname(model2)]), op,
+            [[keys1[pk1], keys2[pk2]]
+             for pk1 in sorted(keys1) for pk2 in sorted(keys2)])
+
+
+for _model in PAYLOAD_MODELS:
+    post_save.connect(invalidate_payloads, sender=_model)
+    post_delete.connect(invalidate_payloads, sender=_model)
+for _through in PAYLOAD_RELATIONS:
+    m2m_changed.connect(invalidate_payloads, sender=_through)
+post_save.connect(invalidate_payloads_of_user, sender=User)
+post_delete.connect(invalidate_payloads, sender=User)
+for _model in INDEXED_MODELS:
+    pre_save.connect(remember_indexed, sender=_model)
+    post_save.connect(index_submissions, sender=_model)
+for _model in CHANGELOG.MODEL.values():
+    pre_save.connect(remember_key, sender=_model)
+    post_save.connect(log_save, sender=_model)
+    pre_delete.connect(remember_key, sender=_model)
+    post_delete.connect(log_delete, sender=_model)
+for _through in CHANGELOG_RELATIONS:
+    m2m_changed.connect(log_relation, sender=_through)
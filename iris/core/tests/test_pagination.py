@@ -0,0 +1,135 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+'''
+This module is used to test keyset pagination: iris/core/pagination.py
+'''
+#pylint: disable=missing-docstring,invalid-name,no-member
+
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+from iris.core.models import (
+    Submission, BuildGroup, Domain, SubDomain, GitTree)
+from iris.core.pagination import (
+    keyset_page, keyset_group_page, encode_cursor, decode_cursor,
+    parse_limit, MAX_LIMIT)
+
+
+BASE = timezone.make_aware(datetime(2015, 1, 1, 12), timezone.utc)
+
+
+def set_updated(model, when, **kwargs):
+    # auto_now can't be set by save()
+    model.objects.filter(**kwargs).update(updated=when)
+
+
+def pages(func, *args):
+    cursor, result = None, []
+    while True:
+        items, cursor = func(*args, cursor=cursor)
+        result.append(items)
+        if not cursor:
+            return result
+
+
+class KeysetPageTest(TestCase):
+
+    def setUp(self):
+        # several groups are updated at the same time
+        for i in range(7):
+            BuildGroup.objects.create(name='prj:%d' % i, status='33_ACCEPTED')
+            set_updated(BuildGroup, BASE + timedelta(seconds=i // 3),
+                        name='prj:%d' % i)
+
+    def page(self, limit, cursor):
+        items, cursor = keyset_page(BuildGroup.objects.all(), cursor, limit)
+        return [i.name for i in items], cursor
+
+    def test_pages(self):
+        self.assertEqual([['prj:6', 'prj:5', 'prj:4'],
+                          ['prj:3', 'prj:2', 'prj:1'],
+                          ['prj:0']], pages(self.page, 3))
+
+    def test_exact_pages(self):
+        self.assertEqual([['prj:6', 'prj:5', 'prj:4', 'prj:3', 'prj:2',
+                           'prj:1', 'prj:0']], pages(self.page, 7))
+
+    def test_page_is_stable_after_new_items(self):
+        first, cursor = self.page(2, None)
+        BuildGroup.objects.create(name='prj:new', status='10_PKGBUILDING')
+        self.assertEqual(['prj:6', 'prj:5'], first)
+        self.assertEqual(['prj:4', 'prj:3'], self.page(2, cursor)[0])
+
+
+class KeysetGroupPageTest(TestCase):
+
+    def setUp(self):
+        owner = User.objects.create(username='alice', email='alice@i.com')
+        domain = Domain.objects.create(name='System')
+        subdomain = SubDomain.objects.create(name='Alarm', domain=domain)
+        trees = [GitTree.objects.create(gitpath='tree/%d' % i,
+                                        subdomain=subdomain)
+                 for i in range(2)]
+        # submit/1 and submit/2 have the same max updated
+        for name, offsets in (('submit/0', (0, 1)), ('submit/1', (0, 2)),
+                              ('submit/2', (2,)), ('submit/3', (3, 0))):
+            for tree, offset in zip(trees, offsets):
+                Submission.objects.create(name=name, gittree=tree,
+                                          owner=owner, commit='sha1')
+                set_updated(Submission, BASE + timedelta(hours=offset),
+                            name=name, gittree=tree)
+
+    def page(self, limit, cursor, query=None):
+        return keyset_group_page(
+            Submission.objects.filter(**(query or {})), cursor, limit)
+
+    def test_pages(self):
+        self.assertEqual([['submit/3', 'submit/2'],
+                          ['submit/1', 'submit/0']], pages(self.page, 2))
+        self.assertEqual([['submit/3'], ['submit/2'], ['submit/1'],
+                          ['submit/0']], pages(self.page, 1))
+
+    def test_pages_of_filtered_submissions(self):
+        # submit/1 and submit/0 are updated at the same time in tree/0
+        self.assertEqual([['submit/3'], ['submit/2'], ['submit/1'],
+                          ['submit/0']], pages(
+                              lambda limit, cursor: self.page(
+                                  limit, cursor,
+                                  {'gittree__gitpath': 'tree/0'}), 1))
+
+
+def test_cursor():
+    when = BASE + timedelta(microseconds=123)
+    assert (when, u'submit/tizen/1') == decode_cursor(
+        encode_cursor(when, u'submit/tizen/1'))
+
+
+def test_invalid_cursor():
+    for cursor in ('', 'abc', encode_cursor(BASE, 'a')[:-4]):
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            pass
+        else:
+            assert False, 'invalid cursor %s' % cursor
+
+
+def test_limit():
+    assert parse_limit(None) == parse_limit('')
+    assert parse_limit('5') == 5
+    assert parse_limit(str(MAX_LIMIT + 1)) == MAX_LIMIT
+    for value in ('0', '-1', 'a'):
+        try:
+            parse_limit(value)
+        except ValueError:
+            pass
+        else:
+            assert False, 'invalid limit %s' % value
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+#pylint: disable=missing-docstring,invalid-name
+
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from iris.core import profiling
+
+
+class QueryProfilingTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees']
+
+    def setUp(self):
+        profiling.STATS.snapshot(reset=True)
+
+    @override_settings(QUERY_PROFILING_HEADERS=True)
+    def test_headers(self):
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get('/api/packagedb/domains/')
+        self.assertEquals(200, r.status_code)
+        self.assertEquals(len(queries), int(r['X-Query-Count']))
+        self.assertTrue(float(r['X-DB-Time']) >= 0)
+        self.assertTrue(float(r['X-View-Time']) >= float(r['X-DB-Time']))
+
+    def test_headers_only_for_staff(self):
+        self.assertFalse(self.client.get(
+            '/api/packagedb/domains/').has_header('X-Query-Count'))
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+        self.assertTrue(self.client.get(
+            '/api/packagedb/domains/').has_header('X-Query-Count'))
+
+    def test_aggregated_per_url_name(self):
+        for _ in range(2):
+            self.client.get('/api/packagedb/domains/')
+        self.client.get('/api/packagedb/gittrees/')
+
+        # admin login page for others
+        self.assertNotEqual('application/json',
+                            self.client.get('/profiling/')['Content-Type'])
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+        stats = {row['url']: row for row in json.loads(
+            self.client.get('/profiling/?reset').content)}
+        self.assertEquals(2, stats['domains_list']['requests'])
+        self.assertEquals(1, stats['gittrees_list']['requests'])
+        self.assertTrue(stats['gittrees_list']['max_queries'] > 0)
+
+        stats = json.loads(self.client.get('/profiling/').content)
+        self.assertEquals(['query_stats'], [row['url'] for row in stats])
+
+
+def test_slowest_statements():
+    recorder = profiling.QueryRecorder(slowest=2)
+    for seconds in (0.3, 0.1, 0.5, 0.2):
+        recorder.record('SELECT %s' % seconds, seconds)
+    assert recorder.count == 4
+    assert abs(recorder.time - 1.1) < 1e-9
+    assert sorted(recorder.slowest) == [(0.3, 'SELECT 0.3'),
+                                        (0.5, 'SELECT 0.5')]
@@ -37,6 +37,7 @@ urlpatterns += patterns(
     url(r'^logout/$', 'logout_view', name='logout_view'),
     url(r'^settings/$', 'settings_view', name='settings_view'),
     url(r'^users(?:/(?P<pkid>\d+))?/$', 'users', name='users'),
+    url(r'^profiling/$', 'query_stats', name='query_stats'),
 )
 
 urlpatterns += patterns(
@@ -12,16 +12,20 @@
 This is the root views module for the iris-core project.
 """
 
+import json
 import logging
 
+from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.utils.datastructures import MultiValueDictKeyError
 
 from iris.core.injectors import inject_user_getters
+from iris.core.profiling import STATS
 from iris.etl.scm import merge_users
 
 log = logging.getLogger(__name__)
@@ -129,3 +133,18 @@ def users(request, pkid=None):
     else:
         return render(request, 'core/users.html',
                 {'users': User.objects.all()})
+
+
+@staff_member_required
+def query_stats(request):
+    """
+    Returns queries and time of requests aggregated per URL name in this
+    process as JSON, most queries first. Resets them if "reset" is given.
+    Other server processes aggregate the requests they handle separately.
+    """
+    stats = STATS.snapshot(reset='reset' in request.GET)
+    rows = sorted(stats.items(), key=lambda item: (
+        -item[1]['mean_queries'] * item[1]['requests'], item[0]))
+    return HttpResponse(
+        json.dumps([dict(stat, url=name) for name, stat in rows], indent=2),
+        content_type='application/json')
@@ -13,19 +13,84 @@ many relationships into database.
 It will check if some entity or relationship exists in db, and
 call create/update/delete for entity and add/remove for relationship
 to make records in db are all the same as given data.
+
+Changes it applies are recorded in a change log model if one is given,
+see iris.core.models.ChangeLog. record() records changes made by others
+under the same lock.
+
+Signal receivers marked by quiet() do nothing while a loader is writing
+and don't stop it from writing in bulk, they are for data which loaders
+or their callers keep up to date by themselves.
 """
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from operator import itemgetter
+import threading
 import logging
+import json
 
-# pylint: disable=W0142,C0103,W0511,R0914,R0912
+from django.db import connection, transaction
+from django.db.models.signals import pre_save, post_save, m2m_changed
+
+# pylint: disable=W0142,C0103,W0511,R0914,R0912,W0212
 # W0142: Used * or ** magic
 # C0103: Invalid name "x"
 # W0511: FIXME: select_related
 # R0914: Loader.sync_nnr: Too many local variables (25/15)
 # R0912:138,4:Loader.sync_nnr: Too many branches (13/12)
+# W0212: Access to a protected member _meta of a client class
 
 log = logging.getLogger(__name__)
 
+# Max number of rows written by one statement in bulk mode
+BATCH_SIZE = 500
+
+# receivers marked by quiet()
+QUIET_RECEIVERS = set()
+
+_local = threading.local()
+
+
+def loading():
+    """
+    True while a loader is writing in this thread
+    """
+    return getattr(_local, 'depth', 0) > 0
+
+
+@contextmanager
+def _writing():
+    """
+    Mark the current thread as writing by a loader
+    """
+    _local.depth = getattr(_local, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+
+
+def quiet(receiver):
+    """
+    Decorator of signal receivers which are skipped while a loader is
+    writing, so loaders still write in bulk no matter they are connected
+    """
+    @wraps(receiver)
+    def wrapper(*args, **kwargs):
+        if not loading():
+            return receiver(*args, **kwargs)
+    QUIET_RECEIVERS.add(wrapper)
+    return wrapper
+
+
+def has_listeners(signal, sender):
+    """
+    True if `signal` of `sender` has receivers other than quiet ones
+    """
+    return any(receiver not in QUIET_RECEIVERS
+               for receiver in signal._live_receivers(sender))
+
 
 def mname(model_class):
     """
@@ -37,10 +102,34 @@ def mname(model_class):
 def getk(x, keys):
     """
     get string represent all `keys` of `item`
+
+    Only used by diff3(), the loader itself uses tuple keys from keyfunc()
     """
     return '|'.join([unicode(x[c]) for c in keys])
 
 
+def keyfunc(keys):
+    """
+    Returns a function to get tuple of all `keys` of an item.
+
+    Tuples are hashable and can't collide like joined strings do when
+    values contain the separator.
+    """
+    keys = tuple(keys)
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda x: (x[key],)
+    return itemgetter(*keys)
+
+
+def chunked(seq, size):
+    """
+    Split `seq` into lists with at most `size` items
+    """
+    seq = list(seq)
+    return [seq[i:i+size] for i in range(0, len(seq), size)]
+
+
 def diff3(left, right, ckey, ukey=None):
     '''
     Diff `left` and `right` returns 4 sets as following:
@@ -81,6 +170,48 @@ def diff3(left, right, ckey, ukey=None):
     return lonly, ronly, diff
 
 
+def hashdiff(left, right, ckey, ukey=None):
+    '''
+    Diff `left` and `right` returns the same 3 sets as diff3().
+
+    Instead of merging sorted lists, items of `right` are indexed by
+    their candidate keys in a dict, then each item of `left` is looked
+    up in it. So both sides needn't be sorted and keys of each item are
+    only computed once. Items with duplicated keys are paired in their
+    original order, as diff3() does after a stable sort.
+    '''
+    getc = keyfunc(ckey)
+    getu = keyfunc(ukey) if ukey else None
+
+    # most keys are unique, only keep a queue for duplicated ones
+    idx, dups = {}, {}
+    for i, that in enumerate(right):
+        key = getc(that)
+        if key in idx:
+            dups.setdefault(key, deque()).append(i)
+        else:
+            idx[key] = i
+
+    matched = bytearray(len(right))
+    lonly, diff = [], []
+    for this in left:
+        key = getc(this)
+        i = idx.pop(key, None)
+        if i is None:
+            rest = dups.get(key)
+            if not rest:
+                lonly.append(this)
+                continue
+            i = rest.popleft()
+        matched[i] = 1
+        that = right[i]
+        if getu and getu(this) != getu(that):
+            diff.append(dict(that, **this))
+
+    ronly = [that for i, that in enumerate(right) if not matched[i]]
+    return lonly, ronly, diff
+
+
 class Loader(object):
     """
     Smart loader to sync data into database
@@ -90,6 +221,21 @@ class Loader(object):
     CKEY = {}
     NNM = defaultdict(dict)
 
+    def __init__(self, bulk=False, batch_size=BATCH_SIZE, changelog=None):
+        """
+        If `bulk` is True, entities are written by set-based statements,
+        each of them touches at most `batch_size` rows. Otherwise every
+        row is saved by its own model.save() call.
+
+        If `changelog` model is given, every create, update and delete of
+        entities and add and remove of relationships is recorded in it.
+        Its lock() is called before writing, which should hold other
+        loaders off until the transaction ends.
+        """
+        self.bulk = bulk
+        self.batch_size = batch_size
+        self.changelog = changelog
+
     def register_entity(self, model, ckey, pk='id'):
         """
         Register a entity model
@@ -107,29 +253,105 @@ class Loader(object):
         """
         self.NNM[mname(model1)][mname(model2)] = manager
 
-    def sync_entity(self, left, model):
+    def _lock_changelog(self):
         """
-        Sync entity of `model`
+        Lock the change log before writing anything, so changes of loaders
+        in concurrent transactions are committed in the order of revisions
+        """
+        if self.changelog is not None:
+            self.changelog.lock()
+
+    def _log(self, entity, op, keys):
+        """
+        Record change `op` of `entity` for each of candidate `keys`
+        """
+        if self.changelog is None or not keys:
+            return
+        model = self.changelog
+        objs = [model(entity=entity, op=op,
+                      key=json.dumps(key, sort_keys=True)) for key in keys]
+        model.objects.bulk_create(objs, batch_size=self._batch_size(
+            model._meta.local_fields, objs))
+
+    def record(self, entity, op, keys):
+        """
+        Record changes made by others than loaders, such as the web UI, in
+        the change log, holding the same lock as loaders do
+        """
+        if self.changelog is None or not keys:
+            return
+        with transaction.atomic():
+            self._lock_changelog()
+            self._log(entity, op, keys)
+
+    def candidate_keys(self, model, pks):
+        """
+        Candidate keys of registered `model` rows of `pks`, as
+        {pk: {column: value}}
         """
         ckey = self.CKEY[mname(model)]
+        return {i.pop('pk'): i for i in model.objects.filter(
+            pk__in=pks).values('pk', *ckey)}
+
+    def relations(self):
+        """
+        Registered relationships as (model1, model2, through, field1,
+        field2), see _through()
+        """
+        return [(self.MODEL[name1], self.MODEL[name2]) +
+                self._through(self.MODEL[name1], self.MODEL[name2])[:3]
+                for name1, managers in self.NNM.items()
+                for name2 in managers]
+
+    def sync_entity(self, left, model, scope=None):
+        """
+        Sync entity of `model`
+
+        If `scope` (a Q object) is given, only rows of `model` matching it
+        are compared with `left`, others are left untouched.
+        """
+        with _writing():
+            return self._sync_entity(left, model, scope)
+
+    def _sync_entity(self, left, model, scope):
+        """
+        Sync entity of `model`, see sync_entity()
+        """
+        self._lock_changelog()
+        name = mname(model)
+        ckey = self.CKEY[name]
         cols = left[0].keys() if left else ckey
         ukey = tuple(set(cols) - set(ckey) - {'pk'})
 
-        left.sort(key=lambda x: getk(x, ckey))
+        query = model.objects.all()
+        if scope is not None:
+            query = query.filter(scope)
         # FIXME: select_related
-        right = list(model.objects.all().values('pk', *cols))
-        # must using python's sort not sql's order_by here, since order
-        # of UPPER and lower letters may be differnet in python and sql
-        right.sort(key=lambda x: getk(x, ckey))
+        right = list(query.values('pk', *cols))
 
-        lonly, ronly, diff = diff3(left, right, ckey, ukey)
+        lonly, ronly, diff = hashdiff(left, right, ckey, ukey)
         log.info('Sync {:>20} +{:<5} -{:<5} U{:<5}'.format(
                  model.__name__, len(lonly), len(ronly), len(diff)))
 
-        for i in self._shrink(lonly):
-            model(**i).save()
-        for i in self._shrink(diff):
-            model(**i).save()
+        # taken before shrinking, which replaces foreign keys by pks
+        def keys(items):
+            """candidate keys of `items`"""
+            return [{c: i[c] for c in ckey} for i in items]
+        created, updated = keys(lonly), keys(diff)
+
+        if self.bulk:
+            # lonly and diff share the same columns, so foreign keys
+            # of both are resolved by one lookup of each referenced table
+            self._shrink(lonly + diff)
+            self._bulk_insert(model, lonly)
+            self._bulk_update(model, diff)
+        else:
+            for i in self._shrink(lonly):
+                model(**i).save()
+            for i in self._shrink(diff):
+                model(**i).save()
+        self._log(name, 'create', created)
+        self._log(name, 'update', updated)
 
         def delete():
             """
@@ -140,66 +362,254 @@ class Loader(object):
             need to be deleted, just need to be updated. So we returns the
             delete function to caller to decide when to invoke.
             """
-            model.objects.filter(pk__in=[i['pk'] for i in ronly]).delete()
+            pks = [i['pk'] for i in ronly]
+            chunks = chunked(pks, self.batch_size) if self.bulk else [pks]
+            with _writing():
+                for chunk in chunks:
+                    model.objects.filter(pk__in=chunk).delete()
+                self._log(name, 'delete', keys(ronly))
         return delete
 
-    def sync_nnr(self, data, model1, model2, remove=True):
+    @staticmethod
+    def _has_save_signals(model):
+        """
+        True if someone listens to save signals of `model`. Bulk
+        statements don't send signals, so such rows have to be saved
+        one by one to keep the same side effects.
+        """
+        return (has_listeners(pre_save, model) or
+                has_listeners(post_save, model))
+
+    def _batch_size(self, fields, objs):
+        """
+        Number of rows per INSERT, which is limited by database as well
+        """
+        return max(min(self.batch_size,
+                       connection.ops.bulk_batch_size(fields, objs)), 1)
+
+    def _bulk_insert(self, model, data):
+        """
+        Insert shrunk `data` of `model` by bulk_create
+        """
+        objs = [model(**i) for i in data]
+        if not objs:
+            return
+        if self._has_save_signals(model):
+            for obj in objs:
+                obj.save()
+        elif model._meta.parents:
+            self._bulk_insert_inherited(model, objs)
+        else:
+            model.objects.bulk_create(
+                objs,
+                batch_size=self._batch_size(model._meta.local_fields, objs))
+
+    def _bulk_insert_inherited(self, model, objs):
+        """
+        Insert objects of a multi-table inherited model, such as roles
+        inherited from Group.
+
+        bulk_create() refuses them since pks of parent rows are unknown
+        after a bulk insert. So parent rows are inserted first, then their
+        pks are read back by a unique field of the parent, and at last
+        child rows are inserted into the child table.
+        """
+        parents = model._meta.parents
+        parent, link = parents.items()[0]
+        unique = [f.attname for f in parent._meta.local_fields
+                  if f.unique and not f.primary_key]
+        if len(parents) > 1 or parent._meta.parents or not unique:
+            for obj in objs:
+                obj.save()
+            return
+
+        key = unique[0]
+        pfields = [f for f in parent._meta.local_fields
+                   if not f.primary_key]
+        parent.objects.bulk_create(
+            [parent(**{f.attname: getattr(obj, f.attname) for f in pfields})
+             for obj in objs],
+            batch_size=self._batch_size(pfields, objs))
+
+        idx = {}
+        for chunk in chunked([getattr(obj, key) for obj in objs],
+                             self.batch_size):
+            idx.update(parent.objects.filter(
+                **{'%s__in' % key: chunk}).values_list(key, 'pk'))
+        for obj in objs:
+            pk = idx[getattr(obj, key)]
+            setattr(obj, parent._meta.pk.attname, pk)
+            setattr(obj, link.attname, pk)
+
+        fields = model._meta.local_concrete_fields
+        for chunk in chunked(objs, self._batch_size(fields, objs)):
+            model._base_manager._insert(chunk, fields=fields,
+                                        using=connection.alias)
+
+    def _bulk_update(self, model, data):
+        """
+        Update shrunk `data` of `model` by set-based UPDATEs.
+
+        Rows going to be set to the same values are updated together,
+        so only the columns being synced are written.
+        """
+        if not data:
+            return
+        if self._has_save_signals(model):
+            for i in data:
+                model(**i).save()
+            return
+
+        # update() only accepts field names, but shrunk data uses
+        # attnames for foreign keys, such as subdomain_id
+        names = {f.attname: f.name for f in model._meta.fields}
+        groups = defaultdict(list)
+        for item in data:
+            values = tuple(sorted((names.get(k, k), v)
+                                  for k, v in item.items() if k != 'pk'))
+            groups[values].append(item['pk'])
+
+        for values, pks in groups.items():
+            for chunk in chunked(pks, self.batch_size):
+                model.objects.filter(pk__in=chunk).update(**dict(values))
+
+    def sync_nnr(self, data, model1, model2, remove=True, scope=None):
         """
         Sync many to many relationship between `model1` and `model2`
+
+        If `scope` (a Q object on `model1`) is given, only relationships of
+        `model1` rows matching it are synced.
+        """
+        with _writing():
+            self._sync_nnr(data, model1, model2, remove, scope)
+
+    def _sync_nnr(self, data, model1, model2, remove, scope):
+        """
+        Sync many to many relationship, see sync_nnr()
         """
+        self._lock_changelog()
         ckey1, ckey2 = self.CKEY[mname(model1)], self.CKEY[mname(model2)]
         if data:
             cols1, cols2 = data[0][0].keys(), data[0][1].keys()
         else:
             cols1, cols2 = ckey1, ckey2
         ckey = ckey1 + ckey2
-        nnm_name = self.NNM[mname(model1)][mname(model2)]
+        through, field1, field2, path1, path2 = self._through(model1, model2)
 
         left = [dict(i, **j) for i, j in data]
-        left.sort(key=lambda x: getk(x, ckey))
-
-        right = [dict(i, **j)
-                 for i in model1.objects.all().values('pk', *cols1)
-                 for j in getattr(model1.objects.get(pk=i.pop('pk')),
-                                  nnm_name).all().values(*cols2)]
-        right.sort(key=lambda x: getk(x, ckey))
 
-        lonly, ronly = diff3(left, right, ckey)[:2]
+        # read all existing relationships by one query on the through
+        # table, which joins both sides to get their candidate keys
+        paths = dict(
+            [('%s__%s' % (path1, c), c) for c in cols1] +
+            [('%s__%s' % (path2, c), c) for c in cols2] +
+            [('pk', 'pk'), (field1, 'pk1'), (field2, 'pk2')])
+        query = through.objects.all()
+        query1 = model1.objects.all()
+        if scope is not None:
+            query1 = query1.filter(scope)
+            query = query.filter(
+                **{'%s__in' % field1: query1.values('pk')})
+        for field, path in ((field1, path1), (field2, path2)):
+            if path != field:
+                query = query.filter(**{'%s__isnull' % path: False})
+        right = [{paths[k]: v for k, v in i.items()}
+                 for i in query.values(*paths.keys())]
+
+        lonly, ronly = hashdiff(left, right, ckey)[:2]
         log.info('Sync {:>20} +{:<5} -{:<5}'.format(
                  ','.join([model1.__name__, model2.__name__]),
                  len(lonly), len(ronly)))
 
-        idx1 = {getk(x, ckey1): x['pk']
-                for x in model1.objects.all().values('pk', *ckey1)}
-        idx2 = {getk(x, ckey2): x['pk']
+        getk1, getk2 = keyfunc(ckey1), keyfunc(ckey2)
+        idx1 = {getk1(x): x['pk']
+                for x in query1.values('pk', *ckey1)}
+        idx2 = {getk2(x): x['pk']
                 for x in model2.objects.all().values('pk', *ckey2)}
 
-        toadd, todel = defaultdict(list), defaultdict(list)
+        toadd = set()
         for item in lonly:
-            key1, key2 = getk(item, ckey1), getk(item, ckey2)
+            key1, key2 = getk1(item), getk2(item)
             pk1, pk2 = idx1.get(key1), idx2.get(key2)
             if pk1 is None:
                 log.warn("%s(%s) doesn't exist", model1.__name__, key1)
             if pk2 is None:
                 log.warn("%s(%s) doesn't exist", model2.__name__, key2)
             if pk1 and pk2:
-                toadd[pk1].append(pk2)
+                toadd.add((pk1, pk2))
+        # duplicated items in data may leave existing pairs in lonly
+        toadd -= {(i['pk1'], i['pk2']) for i in right}
+        todel = [i['pk'] for i in ronly] if remove else []
+
+        entity = ','.join([mname(model1), mname(model2)])
+        keys1 = {pk: dict(zip(ckey1, key)) for key, pk in idx1.items()}
+        keys2 = {pk: dict(zip(ckey2, key)) for key, pk in idx2.items()}
+        self._log(entity, 'add', [[keys1[pk1], keys2[pk2]]
+                                  for pk1, pk2 in sorted(toadd)])
+        if remove:
+            self._log(entity, 'remove', [
+                [dict(zip(ckey1, getk1(i))), dict(zip(ckey2, getk2(i)))]
+                for i in ronly])
+
+        if self.bulk and not has_listeners(m2m_changed, through):
+            attname1 = through._meta.get_field(field1).attname
+            attname2 = through._meta.get_field(field2).attname
+            objs = [through(**{attname1: pk1, attname2: pk2})
+                    for pk1, pk2 in sorted(toadd)]
+            through.objects.bulk_create(objs, batch_size=self._batch_size(
+                through._meta.local_fields, objs))
+            for chunk in chunked(todel, self.batch_size):
+                through.objects.filter(pk__in=chunk).delete()
+            return
+
+        nnm_name = self.NNM[mname(model1)][mname(model2)]
+        toadd_by_pk1, todel_by_pk1 = defaultdict(list), defaultdict(list)
+        for pk1, pk2 in toadd:
+            toadd_by_pk1[pk1].append(pk2)
         for item in ronly:
-            key1, key2 = getk(item, ckey1), getk(item, ckey2)
-            pk1, pk2 = idx1.get(key1), idx2.get(key2)
-            if pk1 is None:
-                log.warn("%s(%s) doesn't exist", model1.__name__, key1)
-            if pk2 is None:
-                log.warn("%s(%s) doesn't exist", model2.__name__, key2)
-            if pk1 and pk2:
-                todel[pk1].append(pk2)
+            todel_by_pk1[item['pk1']].append(item['pk2'])
 
-        for pk1, pk2s in toadd.items():
+        for pk1, pk2s in toadd_by_pk1.items():
             getattr(model1(pk=pk1), nnm_name).add(*pk2s)
         if remove:
-            for pk1, pk2s in todel.items():
+            for pk1, pk2s in todel_by_pk1.items():
                 getattr(model1(pk=pk1), nnm_name).remove(*pk2s)
 
+    def _through(self, model1, model2):
+        """
+        Get the through model of relationship between `model1` and `model2`,
+        returns (through, field1, field2, path1, path2):
+
+        * field1/field2 are foreign key fields of through model refer to
+          each side
+        * path1/path2 are lookup paths from through model to each side,
+          which differ from field names if the side is inherited from the
+          referred model, such as DomainRole.user_set is defined by
+          User.groups, its path is group__domainrole.
+        """
+        nnm_name = self.NNM[mname(model1)][mname(model2)]
+        descriptor = getattr(model1, nnm_name)
+        if hasattr(descriptor, 'field'):
+            # forward relation defined on model1
+            field = descriptor.field
+            field1 = field.m2m_field_name()
+            field2 = field.m2m_reverse_field_name()
+        else:
+            # reverse relation defined on model2 or its parent
+            field = descriptor.related.field
+            field1 = field.m2m_reverse_field_name()
+            field2 = field.m2m_field_name()
+        through = field.rel.through
+
+        def path(name, model):
+            """lookup path from through model to `model`"""
+            refer = through._meta.get_field(name).rel.to
+            if refer is model:
+                return name
+            return '%s__%s' % (name, mname(model))
+        return (through, field1, field2,
+                path(field1, model1), path(field2, model2))
+
     def _shrink_to_pk(self, data, cgroup=None, model=None):
         '''
         Shrink given data column group(cgroup) to pk.
@@ -219,10 +629,11 @@ class Loader(object):
             prefix = None
             cols = data[0].keys()
 
-        idx = {getk(obj, cols): obj['pk']
+        getk_obj, getk_item = keyfunc(cols), keyfunc(cgroup)
+        idx = {getk_obj(obj): obj['pk']
                for obj in model.objects.all().values('pk', *cols)}
         for item in data:
-            key = getk(item, cgroup)
+            key = getk_item(item)
             if key not in idx:
                 raise ValueError('Can not shrink to pk for the bad '
                                  'reference: %s: %s' % (mname(model), item))
@@ -277,14 +688,20 @@ class Loader(object):
         return data
 
 
-def get_default_loader():
-    """Get a default loader instance for IRIS models"""
+def get_default_loader(**kwargs):
+    """
+    Get a default loader instance for IRIS models
+
+    `kwargs` are passed to Loader(), such as bulk=True. Changes are
+    recorded in ChangeLog unless changelog=None is given.
+    """
     from django.contrib.auth.models import User
     from iris.core.models import (
         Domain, SubDomain, GitTree, Package, Product, Image, License,
-        DomainRole, SubDomainRole, GitTreeRole,
+        DomainRole, SubDomainRole, GitTreeRole, ChangeLog,
         )
-    loader = Loader()
+    kwargs.setdefault('changelog', ChangeLog)
+    loader = Loader(**kwargs)
     loader.register_entity(User, 'email')
 
     loader.register_entity(Domain, 'name')
@@ -12,8 +12,10 @@ import re
 import os
 import glob
 import gzip
+from collections import OrderedDict
 
 from xml.dom import minidom
+from xml.etree.cElementTree import iterparse
 
 from django.core.validators import validate_email, ValidationError
 
@@ -22,61 +24,94 @@ ADDRESS = re.compile(r'((.*?)<(.*?)>)|(.*@.*)')
 
 
 class UserCache(object):
-    """Cache user string to merge duplication"""
+    """
+    Cache user string to merge duplication
+
+    Users are merged with union-find: each distinct parsed user is a node
+    and nodes sharing an email or a (first, last) name are in one group.
+    `by_email` and `by_name` index one node of each email and name, which
+    is enough because all nodes with the same email (or name) are always
+    merged into the same group.
+    """
     def __init__(self):
-        self.groups = []
-        self.index = {}
+        self.parent = {}
+        # root -> set of parsed users in the group, ordered by last update
+        self.groups = OrderedDict()
+        self.by_email = {}
+        self.by_name = {}
+        self.users = {}
+
+    def _find(self, node):
+        """Find root of node, compressing the path on the way"""
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def _union(self, root1, root2):
+        """Merge two groups, the smaller one goes into the bigger one"""
+        if root1 == root2:
+            return root1
+        if len(self.groups[root1]) < len(self.groups[root2]):
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.groups[root1] |= self.groups.pop(root2)
+        self.users.pop(root2, None)
+        return root1
 
     def update(self, ustring):
         """Update user string into cache"""
-        def _eq(user1, user2):
-            """
-            True if two users are equal.
-
-            If they both have email, then compare emails;
-            Else if they have name, then compare names.
-            """
-            email1, first1, last1 = user1
-            email2, first2, last2 = user2
-            return (email1 and email1 == email2) or \
-                (first1 or last1) and (first1, last1) == (first2, last2)
-
-        def _is_group_match(group, name):
-            """is there any user equals in a group"""
-            return any((_eq(name, i) for i in group))
-
         name = parse_user(ustring)
-        newg = set()
-        ngs = []
-        for group in self.groups:
-            if _is_group_match(group, name):
-                newg |= group
+        email, first, last = name
+        if name in self.parent:
+            root = self._find(name)
+        else:
+            self.parent[name] = root = name
+            self.groups[name] = set([name])
+
+        if email:
+            if email in self.by_email:
+                root = self._union(root, self._find(self.by_email[email]))
+            else:
+                self.by_email[email] = name
+        if first or last:
+            if (first, last) in self.by_name:
+                root = self._union(
+                    root, self._find(self.by_name[(first, last)]))
             else:
-                ngs.append(group)
-        newg.add(name)
-        ngs.append(newg)
-        self.groups = ngs
+                self.by_name[(first, last)] = name
 
-        user = self._make_user(newg)
-        for name in newg:
-            self.index[name] = user
+        # the updated group moves to the end as a fresh group
+        self.groups[root] = self.groups.pop(root)
+        self.groups[root].add(name)
+        self.users.pop(root, None)
 
     @staticmethod
     def is_user_valid(user):
         """Only consider users with email"""
-        return 'email' in user and user['email']
+        return user is not None and 'email' in user and user['email']
+
+    def _user_of(self, root):
+        """Get merged user of a group"""
+        if root not in self.users:
+            self.users[root] = self._make_user(self.groups[root])
+        return self.users[root]
 
     def all(self):
         """Returns all users"""
-        return [j for j in
-                [self._make_user(i) for i in self.groups]
+        return [dict(j) for j in
+                [self._user_of(i) for i in self.groups]
                 if self.is_user_valid(j)]
 
     def get(self, ustring):
         """Get a user by a given user string"""
-        user = self.index.get(parse_user(ustring))
-        if self.is_user_valid(user):
-            return user
+        name = parse_user(ustring)
+        if name in self.parent:
+            user = self._user_of(self._find(name))
+            if self.is_user_valid(user):
+                return user
 
     @staticmethod
     def _make_user(group):
@@ -213,21 +248,41 @@ def parse_buildxml(file_path):
     return targets
 
 
+def _localname(tag):
+    """strip namespace from tag name of ElementTree"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iterparse_packages(fileobj):
+    """
+    Iterate (package, gitpath) pairs of a primary.xml stream.
+
+    Elements are cleared when their package is done, so memory usage
+    doesn't grow with the size of the repo.
+    """
+    context = iterparse(fileobj, events=('start', 'end'))
+    _event, root = next(context)
+    for event, elem in context:
+        if event != 'end' or _localname(elem.tag) != 'package':
+            continue
+        name, version = None, None
+        for child in elem:
+            tag = _localname(child.tag)
+            if tag == 'name' and name is None:
+                name = child.text
+            elif tag == 'version' and version is None:
+                version = child
+        yield name, version.attrib['vcs'].split('#')[0]
+        root.clear()
+
+
 def parse_packages(file_path):
     """parse packages from xml.
     """
-    packages = []
-
     for pkg_file in glob.glob(os.path.join(file_path, '*-primary.xml.gz')):
         with gzip.open(pkg_file) as pdata:
-            content = pdata.read()
-        for item in parse_str_xml(content, 'package'):
-            pkg = item.getElementsByTagName('name')[0].firstChild.data
-            tree = item.getElementsByTagName('version')[0]. \
-                attributes['vcs'].value.split('#')[0]
-            packages.append((pkg, tree))
-
-    return packages
+            for pair in iterparse_packages(pdata):
+                yield pair
 
 
 def parse_images(file_path, target):
@@ -247,6 +302,13 @@ def parse_images(file_path, target):
     return images
 
 
+def parse_manifest(file_path):
+    """get trees from a manifest xml.
+    """
+    return [item.attributes['path'].value
+            for item in parse_xml(file_path, 'project')]
+
+
 def parse_trees_of_prod(tree_dir):
     """get trees of products from xml.
     """
@@ -256,8 +318,6 @@ def parse_trees_of_prod(tree_dir):
 
     for t_file in files:
         file_path = os.path.join(tree_dir, t_file)
-        for item in parse_xml(file_path, 'project'):
-            tree = item.attributes['path'].value
-            trees.append(tree)
+        trees.extend(parse_manifest(file_path))
 
     return list(set(trees))
@@ -20,11 +20,18 @@ Data is available from:
 # C0103: Invalid name "uc"
 # W0142: Used * or ** magic
 import os
+import time
+import errno
+import logging
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Q
 from django.contrib.auth.models import User
 
 from iris.core.models import (
     Domain, SubDomain, GitTree, License,
-    DomainRole, SubDomainRole, GitTreeRole)
+    DomainRole, SubDomainRole, GitTreeRole, Submission, SubmissionTrigram)
 from iris.core.models.user import roles as role_choices
 from iris.core.injectors import inject_user_getters
 
@@ -51,6 +58,11 @@ ROLES = {i for i, _ in role_choices()}
 
 NONAME = 'Uncategorized'
 
+# Incremental import falls back to full sync if more blocks changed
+MAX_CHANGED_BLOCKS = 200
+
+log = logging.getLogger(__name__)
+
 
 def parse_name(name):
     """parse domain name and subdomain name from the given name
@@ -189,7 +201,31 @@ def transform_users(ucusers):
     return [dict(username=i['email'], **i) for i in ucusers]
 
 
-def from_string(scm_str, coding='utf8'):
+def user_names(emails=None):
+    """
+    Returns {email: (first_name, last_name)} of users
+    """
+    users = User.objects.all()
+    if emails is not None:
+        users = users.filter(email__in=emails)
+    return {email: (first, last) for email, first, last in users.values_list(
+        'email', 'first_name', 'last_name')}
+
+
+def index_renamed_owners(names, emails=None):
+    """
+    Update search index of submissions whose owners are renamed since
+    `names` were taken by user_names(emails)
+    """
+    current = user_names(emails)
+    renamed = [email for email, name in names.items()
+               if current.get(email, name) != name]
+    if renamed:
+        SubmissionTrigram.index(Submission.objects.filter(
+            owner__email__in=renamed).values('pk'), fields=['owner'])
+
+
+def from_string(scm_str, coding='utf8', base=None):
     """
     Import scm data from string.
 
@@ -197,21 +233,46 @@ def from_string(scm_str, coding='utf8'):
     """
     if isinstance(scm_str, str):
         scm_str = scm_str.decode(coding)
-    return from_unicode(scm_str)
+    if isinstance(base, str):
+        base = base.decode(coding)
+    return from_unicode(scm_str, base)
 
 
-def from_unicode(scm_unicode):
+def from_unicode(scm_unicode, base=None):
     """
     Import scm data from unicode string.
 
     Strings return from Django model are all unicode. So it will be much
     easier to only deal with unicode string.
+
+    `base` is the scm data imported last time. If it's given, only blocks
+    changed since then are synced, unless the change is too big or the
+    block structure can't be compared, then it falls back to full sync.
     """
     # 1.parse
     rawdata = parse_blocks(scm_unicode, MAPPING)
+    uc = build_user_cache(rawdata)
+
+    if base is not None:
+        base_rawdata = parse_blocks(base, MAPPING)
+        changed = changed_blocks(
+            base_rawdata, rawdata, build_user_cache(base_rawdata), uc)
+        if changed is None:
+            log.info('Block structure changed, fall back to full sync')
+        elif len(changed) > MAX_CHANGED_BLOCKS:
+            log.info('%d blocks changed, fall back to full sync',
+                     len(changed))
+        else:
+            log.info('%d blocks changed', len(changed))
+            return sync_changed(rawdata, uc, changed)
+    return sync_all(rawdata, uc)
 
+
+def sync_all(rawdata, uc):
+    """
+    Sync all scm data into database
+    """
     # 2.extract and transform
-    uc = build_user_cache(rawdata)
     users = transform_users(uc.all())
 
     (domains, subdomains,
@@ -225,8 +286,10 @@ def from_unicode(scm_unicode):
 
 
     # 3.load
-    loader = get_default_loader()
+    loader = get_default_loader(bulk=True)
+    names = user_names()
     loader.sync_entity(users, User)
+    index_renamed_owners(names)
     delete_domains = loader.sync_entity(domains, Domain)
     delete_subdomains = loader.sync_entity(subdomains, SubDomain)
     delete_domainroles = loader.sync_entity(domainroles, DomainRole)
@@ -247,14 +310,182 @@ def from_unicode(scm_unicode):
     delete_domains()
 
 
-def from_file(dfile, tfile):
+def block_key(typ, data):
+    """
+    Identity of a block: (typ, name) of DOMAIN or TREE block.
+    Returns None if the block can't be identified.
+    """
+    if typ not in ('DOMAIN', 'TREE'):
+        return
+    names = data.get(typ)
+    if not names or len(names) != 1:
+        return
+    return typ, names[0]
+
+
+def changed_blocks(base, rawdata, base_uc, uc):
+    """
+    Returns keys of blocks which are added, removed or modified from
+    `base` to `rawdata`.
+
+    Blocks referring users which are merged differently are also changed,
+    since the same user string may be resolved to another user.
+
+    Returns None if blocks can't be compared one by one: some block can't
+    be identified or is duplicated, or domains are added, removed or moved,
+    which changes the hierarchy of domains and subdomains.
+    """
+    def _index(blocks):
+        """index blocks by their keys"""
+        idx = {}
+        for typ, data in blocks:
+            key = block_key(typ, data)
+            if key is None or key in idx:
+                return
+            idx[key] = data
+        return idx
+
+    def _domains(idx):
+        """domain structure"""
+        return {(key, 'PARENT' in data) for key, data in idx.items()
+                if key[0] == 'DOMAIN'}
+
+    old, new = _index(base), _index(rawdata)
+    if old is None or new is None or _domains(old) != _domains(new):
+        return
+
+    changed = set()
+    for key in set(old) | set(new):
+        if old.get(key) != new.get(key):
+            changed.add(key)
+            continue
+        data = new[key]
+        if any(base_uc.get(ustring) != uc.get(ustring)
+               for role in ROLES & set(data.keys())
+               for ustring in data[role]):
+            changed.add(key)
+    return changed
+
+
+def sync_changed(rawdata, uc, changed):
+    """
+    Only sync blocks in `changed` into database.
+
+    Domain structure is the same, so only roles of changed domains and
+    subdomains, and changed trees with their licenses and roles are synced.
+    """
+    blocks = [(typ, data) for typ, data in rawdata
+              if block_key(typ, data) in changed]
+
+    dnames, snames = set(), set()
+    for typ, data in blocks:
+        if typ == 'TREE':
+            continue
+        if 'PARENT' in data:
+            snames.add(tuple(parse_name(data['DOMAIN'][0])))
+        else:
+            dnames.add(data['DOMAIN'][0])
+    # removed trees are only in base
+    paths = {name for typ, name in changed if typ == 'TREE'}
+
+    (_domains, _subdomains,
+     domainroles, subdomainroles,
+     domainrole_users, subdomainrole_users,
+     ) = transform_domains(blocks, uc)
+
+    (trees, tree_licenses,
+     treeroles, treerole_users,
+     ) = transform_trees(blocks, uc)
+
+    emails = {user['email'] for _role, user in
+              domainrole_users + subdomainrole_users + treerole_users}
+    users = transform_users([i for i in uc.all() if i['email'] in emails])
+
+    loader = get_default_loader(bulk=True)
+    names = user_names(emails)
+    loader.sync_entity(users, User, Q(email__in=emails))
+    index_renamed_owners(names, emails)
+
+    delete_roles = []
+    if dnames:
+        scope = Q(domain__name__in=dnames)
+        delete_roles.append(
+            loader.sync_entity(domainroles, DomainRole, scope))
+        loader.sync_nnr(domainrole_users, DomainRole, User, scope=scope)
+    if snames:
+        scope = reduce(or_, [Q(subdomain__domain__name=dname,
+                               subdomain__name=sname)
+                             for dname, sname in snames])
+        delete_roles.append(
+            loader.sync_entity(subdomainroles, SubDomainRole, scope))
+        loader.sync_nnr(subdomainrole_users, SubDomainRole, User,
+                        scope=scope)
+    if paths:
+        tree_scope = Q(gitpath__in=paths)
+        scope = Q(gittree__gitpath__in=paths)
+        delete_trees = loader.sync_entity(trees, GitTree, tree_scope)
+        delete_roles.append(
+            loader.sync_entity(treeroles, GitTreeRole, scope))
+        loader.sync_nnr(tree_licenses, GitTree, License, scope=tree_scope)
+        loader.sync_nnr(treerole_users, GitTreeRole, User, scope=scope)
+
+    for delete in delete_roles:
+        delete()
+    if paths:
+        delete_trees()
+
+
+def from_file(dfile, tfile, base=None):
     """
     import scm data from file.
     `dfile` and `tfile` should be file objects not file names.
+
+    `base` is a (domains, git-trees) pair of strings imported last time,
+    see from_unicode().
     """
+    if base is not None:
+        base = ''.join([base[0], os.linesep, os.linesep, base[1]])
     return from_string(''.join([dfile.read(),
                                 os.linesep, os.linesep,
-                                tfile.read()]))
+                                tfile.read()]), base=base)
+
+
+def read_state(filename):
+    """
+    Returns the commit and the time of the last full import recorded by
+    save_state(), None for the missing ones
+    """
+    try:
+        with open(filename) as reader:
+            fields = reader.read().split()
+    except IOError:
+        return None, None
+    commit = fields[0] if fields else None
+    full_time = float(fields[1]) if len(fields) > 1 else None
+    return commit, full_time
+
+
+def save_state(filename, commit, full_time=None):
+    """
+    Record the imported commit and the time of the last full import,
+    which is now if not given
+    """
+    if full_time is None:
+        full_time = time.time()
+    with open(filename, 'w') as writer:
+        writer.write('%s %d' % (commit, full_time))
+
+
+def reset_state(filename=None):
+    """
+    Remove the incremental import state, so the next import is full.
+    It's needed once data is imported by other means than import_scm.py
+    """
+    try:
+        os.remove(filename or settings.SCM_IMPORT_STATE)
+    except OSError as err:
+        if err.errno != errno.ENOENT:
+            raise
 
 
 def merge_users(email):
@@ -288,5 +519,8 @@ def merge_users(email):
             for role in ogetter.get_gittreeroles():
                 updata_role(role, ur, user)
             # merge submissions to ladp user
+            submissions = list(ur.submission_set.values_list(
+                'pk', flat=True))
             ur.submission_set.update(owner=user)
+            SubmissionTrigram.index(submissions, fields=['owner'])
             ur.delete()
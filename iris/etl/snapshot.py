@@ -10,13 +10,15 @@
 Module for importing Product, Package, Image data into IRIS.
 """
 import os
+import glob
+import hashlib
 import logging
+from multiprocessing import Pool
 
 from iris.core.models import GitTree, Product, Package, Image
 from iris.etl.loader import get_default_loader
 from iris.etl.parser import (
-    parse_buildxml, parse_trees_of_prod, parse_packages, parse_images
-    )
+    parse_buildxml, parse_manifest, parse_packages, parse_images)
 
 # pylint: disable=E0611,E1101,F0401,R0914,C0103
 #E0611: No name 'manage' in module 'iris'
@@ -28,10 +30,10 @@ from iris.etl.parser import (
 logger = logging.getLogger(__name__)
 
 
-def transform(prod, prod_path):
+def transform(prod, prod_path, jobs=1, fingerprints=None):
     """transform data
     """
-    trees, pkgs, imgs = get_prod_data(prod_path)
+    trees, pkgs, imgs = get_prod_data(prod_path, jobs, fingerprints)
 
     product_trees = [({'name': prod}, {'gitpath': gitpath})
                      for gitpath in trees]
@@ -51,40 +53,162 @@ def transform(prod, prod_path):
     return product_trees, packages, trees_packages, images
 
 
-def get_prod_data(prod_path):
+def _parse_target(repo_path, image_path, target):
+    """parse packages and images of a build target
+    """
+    return list(parse_packages(repo_path)), parse_images(image_path, target)
+
+
+def _call(args):
+    """run a parsing task in a worker process
+    """
+    func, fargs = args[0], args[1:]
+    return func(*fargs)
+
+
+def file_hash(path):
+    """md5 of file content, or None if the file doesn't exist
+    """
+    if not os.path.isfile(path):
+        return None
+    md5 = hashlib.md5()
+    with open(path, 'rb') as reader:
+        for chunk in iter(lambda: reader.read(64 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def fingerprint(*paths):
+    """fingerprint of a group of files
+    """
+    md5 = hashlib.md5()
+    for path in sorted(paths):
+        md5.update('%s:%s\n' % (os.path.basename(path), file_hash(path)))
+    return md5.hexdigest()
+
+
+def select_changed(inputs, fingerprints):
+    """
+    Returns (changed, cached): keys of `inputs` whose fingerprints differ
+    from `fingerprints`, and {key: result} of the others, which are parsed
+    results stored by store_parsed() last time.
+
+    `inputs` is a list of (key, paths) and all of them are considered as
+    changed if `fingerprints` is None. Otherwise `fingerprints` is updated
+    in place to the current files, keys which no longer exist are removed.
+    """
+    if fingerprints is None:
+        return [key for key, _paths in inputs], {}
+    changed, cached = [], {}
+    current = set()
+    for key, paths in inputs:
+        current.add(key)
+        fprint = fingerprint(*paths)
+        entry = fingerprints.get(key)
+        # fingerprints of old versions are strings without results
+        if isinstance(entry, list) and entry[0] == fprint:
+            cached[key] = entry[1]
+        else:
+            changed.append(key)
+            fingerprints[key] = [fprint, None]
+    for key in set(fingerprints) - current:
+        del fingerprints[key]
+    return changed, cached
+
+
+def store_parsed(fingerprints, results):
+    """
+    Store parsed `results` ({key: result}) with their fingerprints
+    """
+    if fingerprints is not None:
+        for key, result in results.items():
+            fingerprints[key][1] = result
+
+
+def get_prod_data(prod_path, jobs=1, fingerprints=None):
     """get all prod data, include trees, images, packages
+
+    If `jobs` is more than 1, build targets and manifest files are parsed
+    concurrently in a pool of `jobs` processes. Results are merged in the
+    same order as the serial mode.
+
+    If `fingerprints` of the last import is given, only targets and
+    manifest files which changed since then are parsed, results of others
+    are taken from `fingerprints`, which is updated to the current files.
     """
-    packages = []
-    images = []
     build_file = os.path.join(prod_path, 'build.xml')
     repo_file = os.path.join(prod_path, 'repos/%s/packages/repodata/')
     image_file = os.path.join(prod_path, 'builddata/images/%s/images.xml')
     tree_dir = os.path.join(prod_path, 'builddata/manifest')
 
-    targets = parse_buildxml(build_file)
-    trees = parse_trees_of_prod(tree_dir)
-
-    for target in targets:
-        packages.extend(parse_packages(repo_file % target))
-        images.extend(parse_images(image_file % target, target))
-
+    all_targets = parse_buildxml(build_file)
+    all_manifests = sorted(os.listdir(tree_dir))
+    target_keys = ['target:%s' % target for target in all_targets]
+    manifest_keys = ['manifest:%s' % name for name in all_manifests]
+    changed, results = select_changed(
+        [(key, glob.glob(os.path.join(repo_file % target,
+                                      '*-primary.xml.gz')) +
+          [image_file % target])
+         for key, target in zip(target_keys, all_targets)] +
+        [(key, [os.path.join(tree_dir, name)])
+         for key, name in zip(manifest_keys, all_manifests)], fingerprints)
+    targets = [i.split(':', 1)[1] for i in changed if i.startswith('target:')]
+    manifests = [i.split(':', 1)[1] for i in changed
+                 if i.startswith('manifest:')]
+
+    if fingerprints is not None:
+        logger.info('%d/%d targets changed: %s, %d/%d manifests changed',
+                    len(targets), len(all_targets), ', '.join(targets),
+                    len(manifests), len(all_manifests))
+
+    tasks = [(_parse_target, repo_file % target, image_file % target, target)
+             for target in targets]
+    tasks.extend((parse_manifest, os.path.join(tree_dir, name))
+                 for name in manifests)
+    if jobs <= 1:
+        parsed = [_call(task) for task in tasks]
+    else:
+        pool = Pool(jobs)
+        try:
+            parsed = pool.map(_call, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    parsed = dict(zip(['target:%s' % i for i in targets] +
+                      ['manifest:%s' % i for i in manifests],
+                      [list(i) for i in parsed]))
+    store_parsed(fingerprints, parsed)
+    results.update(parsed)
+
+    # results read from fingerprints have lists instead of tuples
+    packages = [tuple(i) for key in target_keys for i in results[key][0]]
+    images = [tuple(i) for key in target_keys for i in results[key][1]]
+    trees = list({tree for key in manifest_keys for tree in results[key]})
     return trees, packages, images
 
 
-def from_dir(prod, prod_path):
+def from_dir(prod, prod_path, jobs=1, fingerprints=None):
     """
     Load snapshot related data into database, which includes project-trees
     relationship, trees-packages relationship and images.
+
+    `jobs` is the number of processes to parse snapshot files.
+    `fingerprints` is the dict of the last import to skip parsing unchanged
+    files, see get_prod_data().
     """
     # 1.transform
     (products_trees,
      packages, trees_packages,
-     images) = transform(prod, prod_path)
+     images) = transform(prod, prod_path, jobs, fingerprints)
 
     # 2.load
-    loader = get_default_loader()
-    loader.sync_entity(packages, Package)
-    loader.sync_entity(images, Image)
+    # relations of unchanged files are synced as well, they may have been
+    # removed with their gittrees by the scm import since the last time
+    loader = get_default_loader(bulk=True)
+    if packages:
+        loader.sync_entity(packages, Package)
+    if images:
+        loader.sync_entity(images, Image)
 
     loader.sync_nnr(products_trees, Product, GitTree, remove=False)
     loader.sync_nnr(trees_packages, GitTree, Package, remove=False)
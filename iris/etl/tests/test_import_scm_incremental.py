@@ -0,0 +1,205 @@
+# -*- encoding: utf-8 -*-
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+'''
+This module is used to test incremental import of scm data:
+iris/etl/scm.py
+'''
+#pylint: disable=missing-docstring,no-member,invalid-name
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.contrib.auth.models import User
+
+from iris.core.models import (
+    Domain, SubDomain, GitTree, License,
+    DomainRole, SubDomainRole, GitTreeRole)
+from iris.etl.scm import (
+    from_string, from_unicode, changed_blocks, build_user_cache, MAPPING,
+    read_state, save_state, reset_state)
+from iris.etl.parser import parse_blocks
+
+
+BASE = '''
+D: System
+M: Alice <alice@i.com>
+
+D: System / Alarm
+N: System
+M: Bob <bob@i.com>
+
+D: Base
+
+T: adaptation/alsa
+D: System / Alarm
+M: Bob <bob@i.com>
+L: BSD-2-Clause
+
+T: base/glib
+D: Base
+M: Carl
+'''
+
+
+def dump():
+    def roles(model):
+        return sorted((role.name, user.email)
+                      for role in model.objects.all()
+                      for user in role.user_set.all())
+    return (
+        sorted(Domain.objects.values_list('name')),
+        sorted(SubDomain.objects.values_list('name', 'domain__name')),
+        sorted(GitTree.objects.values_list(
+            'gitpath', 'subdomain__name', 'subdomain__domain__name')),
+        sorted((tree.gitpath, licen.shortname)
+               for tree in GitTree.objects.all()
+               for licen in tree.licenses.all()),
+        sorted(DomainRole.objects.values_list('name')),
+        sorted(SubDomainRole.objects.values_list('name')),
+        sorted(GitTreeRole.objects.values_list('name')),
+        roles(DomainRole), roles(SubDomainRole), roles(GitTreeRole),
+        )
+
+
+def changed(base, new):
+    base, new = parse_blocks(base, MAPPING), parse_blocks(new, MAPPING)
+    return changed_blocks(base, new,
+                          build_user_cache(base), build_user_cache(new))
+
+
+class IncrementalImportTest(unittest.TestCase):
+
+    def setUp(self):
+        License.objects.create(shortname='BSD-2-Clause')
+        License.objects.create(shortname='MIT')
+
+    def tearDown(self):
+        GitTree.objects.all().delete()
+        SubDomain.objects.all().delete()
+        Domain.objects.all().delete()
+        License.objects.all().delete()
+        User.objects.all().delete()
+
+    def assert_same_as_full(self, new):
+        from_string(BASE)
+        from_string(new, base=BASE)
+        incremental = dump()
+
+        self.tearDown()
+        self.setUp()
+        from_string(new)
+        self.assertEqual(dump(), incremental)
+
+    def test_change_tree_role(self):
+        new = BASE.replace('''T: adaptation/alsa
+D: System / Alarm
+M: Bob <bob@i.com>''', '''T: adaptation/alsa
+D: System / Alarm
+R: Bob <bob@i.com>
+M: Dan <dan@i.com>''')
+        self.assertEqual(
+            {('TREE', 'adaptation/alsa')}, changed(BASE, new))
+        self.assert_same_as_full(new)
+
+    def test_add_and_remove_trees(self):
+        new = BASE.replace('''T: base/glib
+D: Base
+M: Carl
+''', '''T: base/zlib
+D: Base
+M: Eve <eve@i.com>
+L: MIT
+''')
+        self.assertEqual(
+            {('TREE', 'base/glib'), ('TREE', 'base/zlib')},
+            changed(BASE, new))
+        self.assert_same_as_full(new)
+
+    def test_move_tree_to_another_subdomain(self):
+        new = BASE.replace('D: System / Alarm\nM: Bob',
+                           'D: Base\nM: Bob')
+        self.assert_same_as_full(new)
+
+    def test_change_domain_and_subdomain_roles(self):
+        new = BASE.replace(
+            'M: Alice <alice@i.com>', 'A: Alice <alice@i.com>').replace(
+                'N: System\nM: Bob <bob@i.com>',
+                'N: System\nM: Carl <carl@i.com>')
+        # Carl <carl@i.com> also gives an email to Carl of base/glib
+        self.assertEqual(
+            {('DOMAIN', 'System'), ('DOMAIN', 'System / Alarm'),
+             ('TREE', 'base/glib')},
+            changed(BASE, new))
+        self.assert_same_as_full(new)
+
+    def test_merged_user_changes_unchanged_block(self):
+        # Carl of base/glib gets email by a new block
+        new = BASE + '''
+T: base/zlib
+D: Base
+M: Carl <carl@i.com>
+'''
+        self.assertEqual(
+            {('TREE', 'base/glib'), ('TREE', 'base/zlib')},
+            changed(BASE, new))
+        self.assert_same_as_full(new)
+
+    def test_domain_structure_changed(self):
+        new = BASE + '''
+D: Graphics
+M: Alice <alice@i.com>
+'''
+        self.assertIsNone(changed(BASE, new))
+        self.assert_same_as_full(new)
+
+    def test_duplicated_blocks(self):
+        new = BASE + '''
+T: base/glib
+D: Base
+'''
+        self.assertIsNone(changed(BASE, new))
+
+    def test_unicode_base(self):
+        from_string(BASE)
+        from_unicode(BASE.decode('utf8'), BASE.decode('utf8'))
+        self.assertEqual(2, GitTree.objects.count())
+
+
+class ImportStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.workdir, 'meta.last_commit')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_save_and_read(self):
+        self.assertEqual((None, None), read_state(self.filename))
+        save_state(self.filename, 'abc', 100)
+        self.assertEqual(('abc', 100), read_state(self.filename))
+
+    def test_full_time_is_now_by_default(self):
+        save_state(self.filename, 'abc')
+        _commit, full_time = read_state(self.filename)
+        self.assertTrue(full_time > 0)
+
+    def test_commit_only(self):
+        with open(self.filename, 'w') as writer:
+            writer.write('abc\n')
+        self.assertEqual(('abc', None), read_state(self.filename))
+
+    def test_reset(self):
+        save_state(self.filename, 'abc')
+        reset_state(self.filename)
+        self.assertEqual((None, None), read_state(self.filename))
+        # nothing to remove
+        reset_state(self.filename)
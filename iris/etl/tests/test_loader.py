@@ -0,0 +1,391 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+'''
+This module is used to test the data loader: iris/etl/loader.py
+'''
+#pylint: disable=missing-docstring,no-member,invalid-name
+
+import copy
+
+from django.db.models import Q
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+
+from iris.core.models import (
+    Domain, SubDomain, GitTree, GitTreeRole, Package, UserProfile, ChangeLog)
+from iris.etl.loader import (
+    get_default_loader, diff3, hashdiff, getk, keyfunc, quiet, loading,
+    has_listeners)
+
+
+def _domains(names):
+    return [{'name': name} for name in names]
+
+
+def _subdomains(pairs):
+    return [{'name': sname, 'domain__name': dname} for dname, sname in pairs]
+
+
+def _trees(items):
+    return [{'gitpath': path,
+             'subdomain__name': sname,
+             'subdomain__domain__name': dname}
+            for path, dname, sname in items]
+
+
+def _treeroles(items):
+    return [{'role': role,
+             'gittree__gitpath': path,
+             'name': '%s: %s' % (role, path)}
+            for path, role in items]
+
+
+FIRST = (
+    _domains(['System', 'Base']),
+    _subdomains([('System', 'Alarm'), ('System', 'Audio'),
+                 ('Base', 'Libs')]),
+    _trees([('adaptation/alsa', 'System', 'Alarm'),
+            ('adaptation/pulse', 'System', 'Audio'),
+            ('base/glib', 'Base', 'Libs'),
+            ('base/zlib', 'Base', 'Libs')]),
+    _treeroles([('adaptation/alsa', 'MAINTAINER'),
+                ('adaptation/pulse', 'REVIEWER'),
+                ('base/glib', 'MAINTAINER')]),
+    )
+
+SECOND = (
+    _domains(['System', 'Base', 'Graphics']),
+    _subdomains([('System', 'Audio'), ('Base', 'Libs'),
+                 ('Graphics', 'Wayland')]),
+    _trees([('adaptation/alsa', 'System', 'Audio'),
+            ('adaptation/pulse', 'System', 'Audio'),
+            ('base/glib', 'Graphics', 'Wayland'),
+            ('graphics/weston', 'Graphics', 'Wayland')]),
+    _treeroles([('adaptation/alsa', 'MAINTAINER'),
+                ('adaptation/alsa', 'REVIEWER'),
+                ('graphics/weston', 'INTEGRATOR')]),
+    )
+
+
+def sync(loader, data):
+    # loader shrinks the given rows in place
+    domains, subdomains, trees, treeroles = copy.deepcopy(data)
+    delete_domains = loader.sync_entity(domains, Domain)
+    delete_subdomains = loader.sync_entity(subdomains, SubDomain)
+    delete_trees = loader.sync_entity(trees, GitTree)
+    delete_treeroles = loader.sync_entity(treeroles, GitTreeRole)
+    delete_treeroles()
+    delete_trees()
+    delete_subdomains()
+    delete_domains()
+
+
+def dump():
+    return (
+        sorted(Domain.objects.values_list('name')),
+        sorted(SubDomain.objects.values_list('name', 'domain__name')),
+        sorted(GitTree.objects.values_list(
+            'gitpath', 'subdomain__name', 'subdomain__domain__name')),
+        sorted(GitTreeRole.objects.values_list(
+            'name', 'role', 'gittree__gitpath')),
+        )
+
+
+USERS = [{'email': email, 'username': email,
+          'first_name': '', 'last_name': ''}
+         for email in ('alice@i.com', 'bob@i.com')]
+
+
+def _treerole_users(items):
+    return [({'role': role, 'gittree__gitpath': path}, {'email': email})
+            for path, role, email in items]
+
+
+def _tree_packages(items):
+    return [({'gitpath': path}, {'name': name}) for path, name in items]
+
+
+def sync_nnr(loader, treerole_users, tree_packages, remove=True):
+    loader.sync_nnr(copy.deepcopy(treerole_users), GitTreeRole, User,
+                    remove=remove)
+    loader.sync_nnr(copy.deepcopy(tree_packages), GitTree, Package,
+                    remove=remove)
+
+
+def dump_nnr():
+    return (
+        sorted((role.role, role.gittree.gitpath, user.email)
+               for role in GitTreeRole.objects.all()
+               for user in role.user_set.all()),
+        sorted((tree.gitpath, package.name)
+               for tree in GitTree.objects.all()
+               for package in tree.packages.all()),
+        )
+
+
+def last_revision():
+    return ChangeLog.objects.order_by('-revision').values_list(
+        'revision', flat=True).first() or 0
+
+
+def dump_changes(since):
+    return sorted(ChangeLog.objects.filter(revision__gt=since).values_list(
+        'entity', 'op', 'key'))
+
+
+class LoaderTest(TestCase):
+
+    def check_same_state(self, *steps):
+        results = []
+        for bulk in (False, True):
+            GitTree.objects.all().delete()
+            SubDomain.objects.all().delete()
+            Domain.objects.all().delete()
+            # small batch to make sure rows are split into chunks
+            loader = get_default_loader(bulk=bulk, batch_size=2)
+            for data in steps:
+                sync(loader, data)
+            results.append(dump())
+        self.assertEqual(results[0], results[1])
+        return results[1]
+
+    def test_bulk_insert(self):
+        state = self.check_same_state(FIRST)
+        self.assertEqual(4, len(state[2]))
+        self.assertEqual(3, len(state[3]))
+
+    def test_bulk_update_and_delete(self):
+        state = self.check_same_state(FIRST, SECOND)
+        self.assertIn(('base/glib', 'Wayland', 'Graphics'), state[2])
+        self.assertNotIn(('base/zlib', 'Libs', 'Base'), state[2])
+
+    def test_bulk_sync_is_idempotent(self):
+        self.check_same_state(FIRST, SECOND, SECOND)
+
+    def test_bulk_insert_users_with_profile(self):
+        loader = get_default_loader(bulk=True, batch_size=2)
+        loader.sync_entity([
+            {'email': 'alice@i.com', 'username': 'alice@i.com',
+             'first_name': 'Alice', 'last_name': ''},
+            {'email': 'bob@i.com', 'username': 'bob@i.com',
+             'first_name': 'Bob', 'last_name': ''},
+            {'email': 'carl@i.com', 'username': 'carl@i.com',
+             'first_name': 'Carl', 'last_name': ''},
+            ], User)
+        self.assertEqual(3, User.objects.count())
+        self.assertEqual(3, UserProfile.objects.count())
+
+    def check_same_nnr(self, *steps):
+        results = []
+        for bulk in (False, True):
+            GitTree.objects.all().delete()
+            User.objects.all().delete()
+            Package.objects.all().delete()
+            loader = get_default_loader(bulk=bulk, batch_size=2)
+            sync(loader, FIRST)
+            loader.sync_entity(copy.deepcopy(USERS), User)
+            loader.sync_entity([{'name': 'alsa-utils'}, {'name': 'glib2'},
+                                {'name': 'libglib'}], Package)
+            for step in steps:
+                sync_nnr(loader, *step)
+            results.append(dump_nnr())
+        self.assertEqual(results[0], results[1])
+        return results[1]
+
+    def test_bulk_nnr_add(self):
+        roles, packs = self.check_same_nnr((
+            _treerole_users([('adaptation/alsa', 'MAINTAINER', 'alice@i.com'),
+                             ('base/glib', 'MAINTAINER', 'bob@i.com')]),
+            # duplicated pairs come from different build targets
+            _tree_packages([('base/glib', 'glib2'), ('base/glib', 'glib2'),
+                            ('base/glib', 'libglib')])))
+        self.assertEqual(2, len(roles))
+        self.assertEqual(
+            [('base/glib', 'glib2'), ('base/glib', 'libglib')], packs)
+
+    def test_bulk_nnr_remove(self):
+        roles, packs = self.check_same_nnr(
+            (_treerole_users([('base/glib', 'MAINTAINER', 'alice@i.com'),
+                              ('base/glib', 'MAINTAINER', 'bob@i.com')]),
+             _tree_packages([('base/glib', 'glib2')])),
+            (_treerole_users([('base/glib', 'MAINTAINER', 'bob@i.com')]),
+             _tree_packages([('adaptation/alsa', 'alsa-utils')])))
+        self.assertEqual([('MAINTAINER', 'base/glib', 'bob@i.com')], roles)
+        self.assertEqual([('adaptation/alsa', 'alsa-utils')], packs)
+
+    def test_bulk_nnr_without_remove(self):
+        _roles, packs = self.check_same_nnr(
+            ([], _tree_packages([('base/glib', 'glib2')])),
+            ([], _tree_packages([('base/glib', 'libglib')]), False))
+        self.assertEqual(
+            [('base/glib', 'glib2'), ('base/glib', 'libglib')], packs)
+
+    def test_changelog(self):
+        results = []
+        for bulk in (False, True):
+            GitTree.objects.all().delete()
+            SubDomain.objects.all().delete()
+            Domain.objects.all().delete()
+            loader = get_default_loader(bulk=bulk, batch_size=2)
+            sync(loader, FIRST)
+            since = last_revision()
+            sync(loader, SECOND)
+            results.append(dump_changes(since))
+        self.assertEqual(results[0], results[1])
+        changes = results[1]
+        self.assertIn(('domain', 'create', '{"name": "Graphics"}'), changes)
+        self.assertIn(('subdomain', 'delete',
+                       '{"domain__name": "System", "name": "Alarm"}'),
+                      changes)
+        self.assertIn(('gittree', 'create', '{"gitpath": "graphics/weston"}'),
+                      changes)
+        self.assertIn(('gittree', 'update', '{"gitpath": "base/glib"}'),
+                      changes)
+        self.assertIn(('gittree', 'delete', '{"gitpath": "base/zlib"}'),
+                      changes)
+        self.assertNotIn(('gittree', 'update',
+                          '{"gitpath": "adaptation/pulse"}'), changes)
+
+    def test_changelog_nnr(self):
+        for bulk in (False, True):
+            GitTree.objects.all().delete()
+            User.objects.all().delete()
+            Package.objects.all().delete()
+            loader = get_default_loader(bulk=bulk, batch_size=2)
+            sync(loader, FIRST)
+            loader.sync_entity(copy.deepcopy(USERS), User)
+            loader.sync_entity([{'name': 'glib2'}, {'name': 'libglib'}],
+                               Package)
+            since = last_revision()
+            sync_nnr(loader,
+                     _treerole_users([('base/glib', 'MAINTAINER',
+                                       'alice@i.com')]),
+                     _tree_packages([('base/glib', 'glib2')]))
+            sync_nnr(loader, [], _tree_packages([('base/glib', 'libglib')]))
+
+            role = '[{"gittree__gitpath": "base/glib", "role": "MAINTAINER"}, '
+            self.assertEqual([
+                ('gittree,package', 'add',
+                 '[{"gitpath": "base/glib"}, {"name": "glib2"}]'),
+                ('gittree,package', 'add',
+                 '[{"gitpath": "base/glib"}, {"name": "libglib"}]'),
+                ('gittree,package', 'remove',
+                 '[{"gitpath": "base/glib"}, {"name": "glib2"}]'),
+                ('gittreerole,user', 'add',
+                 role + '{"email": "alice@i.com"}]'),
+                ('gittreerole,user', 'remove',
+                 role + '{"email": "alice@i.com"}]'),
+                ], dump_changes(since))
+
+    def test_without_changelog(self):
+        loader = get_default_loader(bulk=True, changelog=None)
+        sync(loader, FIRST)
+        self.assertEqual(0, ChangeLog.objects.count())
+
+    def test_quiet_receivers(self):
+        calls = []
+
+        @quiet
+        def receiver(sender, instance, **kwargs):
+            calls.append((instance.name, loading()))
+
+        post_save.connect(receiver, sender=Domain)
+        try:
+            self.assertFalse(has_listeners(post_save, Domain))
+            loader = get_default_loader(bulk=True, changelog=None)
+            with self.assertNumQueries(2):
+                # select and insert, not saved one by one
+                loader.sync_entity(_domains(['A', 'B']), Domain,
+                                   scope=Q(name__in=['A', 'B']))
+            Domain.objects.create(name='C')
+        finally:
+            post_save.disconnect(receiver, sender=Domain)
+        self.assertEqual([('C', False)], calls)
+
+
+def _sorted_keys(items, keys):
+    getter = keyfunc(keys)
+    return sorted(getter(i) for i in items)
+
+
+def _check_same_diff(left, right, ckey, ukey):
+    """hashdiff() returns the same sets as diff3() on sorted input"""
+    sleft = sorted(left, key=lambda x: getk(x, ckey))
+    sright = sorted(right, key=lambda x: getk(x, ckey))
+    cols = ckey + ukey
+    for res1, res2 in zip(diff3(sleft, sright, ckey, ukey),
+                          hashdiff(left, right, ckey, ukey)):
+        assert _sorted_keys(res1, cols) == _sorted_keys(res2, cols)
+
+
+def test_hashdiff():
+    left = [{'name': 'a', 'arch': 'x86'},
+            {'name': 'b', 'arch': 'arm'},
+            {'name': 'c', 'arch': 'x86'}]
+    right = [{'pk': 1, 'name': 'b', 'arch': 'x86'},
+             {'pk': 2, 'name': 'c', 'arch': 'x86'},
+             {'pk': 3, 'name': 'd', 'arch': 'arm'}]
+    lonly, ronly, diff = hashdiff(left, right, ('name',), ('arch',))
+    assert lonly == [{'name': 'a', 'arch': 'x86'}]
+    assert ronly == [{'pk': 3, 'name': 'd', 'arch': 'arm'}]
+    assert diff == [{'pk': 1, 'name': 'b', 'arch': 'arm'}]
+    _check_same_diff(left, right, ('name',), ('arch',))
+
+
+def test_hashdiff_duplicated_keys():
+    left = [{'gitpath': 'a', 'name': 'p'}, {'gitpath': 'a', 'name': 'p'}]
+    right = [{'gitpath': 'a', 'name': 'p'}]
+    lonly, ronly, _diff = hashdiff(left, right, ('gitpath', 'name'))
+    assert lonly == [{'gitpath': 'a', 'name': 'p'}]
+    assert ronly == []
+
+
+def test_hashdiff_separator_in_values():
+    # 'a|b' + 'c' and 'a' + 'b|c' are the same joined string
+    left = [{'name': 'a|b', 'domain': 'c'}]
+    right = [{'name': 'a', 'domain': 'b|c'}]
+    lonly, ronly, _diff = hashdiff(left, right, ('name', 'domain'))
+    assert lonly == left and ronly == right
+
+
+class CountingDict(dict):
+    "Dict counting reads of values of all its instances in class's reads"
+    reads = 0
+
+    def __getitem__(self, key):
+        type(self).reads += 1
+        return dict.__getitem__(self, key)
+
+
+def test_hashdiff_many_rows():
+    """
+    hashdiff() reads keys of each row once and agrees with diff3() on 20k
+    rows
+    """
+    total = 20000
+    ckey, ukey = ('name', 'domain__name'), ('arch',)
+
+    def row(i, arch='x86'):
+        return CountingDict(name=u'tree%d' % i,
+                            domain__name=u'domain%d' % (i % 50), arch=arch)
+    # 10% are added, 10% are deleted and 5% are changed
+    left = [row(i, 'arm' if i % 20 == 0 else 'x86')
+            for i in range(total // 10, total + total // 10)]
+    right = [row(i) for i in range(total)]
+
+    CountingDict.reads = 0
+    result = hashdiff(left, right, ckey, ukey)
+    # candidate keys of all rows and unique keys of the matched pairs
+    assert CountingDict.reads == 2 * (total * 2) + 2 * (total - total // 10)
+    assert [len(i) for i in result] == [total // 10, total // 10, 900]
+
+    sleft = sorted(left, key=lambda x: getk(x, ckey))
+    sright = sorted(right, key=lambda x: getk(x, ckey))
+    for res1, res2 in zip(diff3(sleft, sright, ckey, ukey), result):
+        assert _sorted_keys(res1, ckey) == _sorted_keys(res2, ckey)
@@ -0,0 +1,89 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+'''
+This module is used to test parsing packages from repodata:
+iris/etl/parser.py
+'''
+#pylint: disable=missing-docstring,invalid-name
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from iris.etl.parser import parse_packages, parse_str_xml
+
+
+PACKAGE = '''
+<package type="rpm">
+  <name>%(name)s</name>
+  <arch>armv7l</arch>
+  <version epoch="0" ver="1.0" rel="1" vcs="%(vcs)s"/>
+  <summary>Summary of %(name)s</summary>
+  <format>
+    <rpm:license>MIT</rpm:license>
+    <rpm:provides>
+      <rpm:entry name="lib%(name)s.so"/>
+    </rpm:provides>
+  </format>
+</package>'''
+
+PRIMARY = '''<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common"
+ xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="%d">%s
+</metadata>
+'''
+
+
+def _parse_dom(file_path):
+    """the original parser based on minidom, used as the reference"""
+    packages = []
+    for name in sorted(os.listdir(file_path)):
+        with gzip.open(os.path.join(file_path, name)) as pdata:
+            content = pdata.read()
+        for item in parse_str_xml(content, 'package'):
+            pkg = item.getElementsByTagName('name')[0].firstChild.data
+            tree = item.getElementsByTagName('version')[0]. \
+                attributes['vcs'].value.split('#')[0]
+            packages.append((pkg, tree))
+    return packages
+
+
+class ParsePackagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='repodata.')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, filename, packages):
+        content = PRIMARY % (len(packages), ''.join(
+            PACKAGE % {'name': name, 'vcs': vcs} for name, vcs in packages))
+        with gzip.open(os.path.join(self.path, filename), 'wb') as writer:
+            writer.write(content)
+
+    def test_parse_packages(self):
+        self.write('abc-primary.xml.gz', [
+            ('glib2', 'base/glib#6a1f0c'),
+            ('alsa-utils', 'adaptation/alsa#master'),
+            ])
+        self.write('abc-other.xml.gz', [('other', 'other/tree#1')])
+
+        self.assertEqual([('glib2', 'base/glib'),
+                          ('alsa-utils', 'adaptation/alsa')],
+                         list(parse_packages(self.path)))
+
+    def test_same_as_dom_parser(self):
+        self.write('a-primary.xml.gz', [
+            ('pkg%d' % i, 'tree/%d#%x' % (i % 7, i)) for i in range(200)])
+        self.write('b-primary.xml.gz', [('pkg-b', 'tree/b')])
+
+        self.assertEqual(sorted(_parse_dom(self.path)),
+                         sorted(parse_packages(self.path)))
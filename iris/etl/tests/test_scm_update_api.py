@@ -10,9 +10,12 @@
 iris/packagedb/views/scm.py
 '''
 #pylint: disable=missing-docstring,invalid-name
+import os
 import StringIO
+import tempfile
 
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.core.urlresolvers import reverse
 
 
@@ -96,6 +99,8 @@ class EventHandlerTest(TestCase):
 
     def test_with_no_error_file(self):
         self.login()
+        gittrees_url = reverse('gittrees_list')
+        self.assertEquals([], self.client.get(gittrees_url).data)
         domains = '''
         D: System
         '''
@@ -111,3 +116,22 @@ class EventHandlerTest(TestCase):
         r = self.client.post(reverse('scm.update'), {
             'domains': domains_si, 'gittrees': gittrees_si})
         self.assertEquals(200, r.status_code)
+        # precomputed lists are rebuilt
+        self.assertEquals(['adaptation/face-engine'], [
+            i['gitpath'] for i in self.client.get(gittrees_url).data])
+
+    def test_reset_incremental_import(self):
+        self.login()
+        fd, state = tempfile.mkstemp()
+        os.close(fd)
+        domains_si = StringIO.StringIO('D: System\n')
+        domains_si.name = 'domains'
+        gittrees_si = StringIO.StringIO('T: adaptation/face-engine\n'
+                                        'D: System\n')
+        gittrees_si.name = 'gittrees'
+
+        with override_settings(SCM_IMPORT_STATE=state):
+            r = self.client.post(reverse('scm.update'), {
+                'domains': domains_si, 'gittrees': gittrees_si})
+        self.assertEquals(200, r.status_code)
+        self.assertFalse(os.path.exists(state))
@@ -0,0 +1,159 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+'''
+This module is used to test parsing snapshot files: iris/etl/snapshot.py
+'''
+#pylint: disable=missing-docstring,invalid-name
+
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+from django.test import TestCase
+
+from iris.core.models import Domain, SubDomain, GitTree, Product
+from iris.etl.snapshot import get_prod_data, from_dir
+
+
+BUILD = '''<build><id>tizen_20150101.1</id>%s</build>'''
+
+PRIMARY = '''<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common">%s</metadata>'''
+
+PACKAGE = '''<package type="rpm"><name>%s</name>
+<version epoch="0" ver="1.0" rel="1" vcs="%s#master"/></package>'''
+
+IMAGES = '''<images>%s</images>'''
+
+IMAGE = '''<config><name>%s.ks</name><arch>%s</arch></config>'''
+
+MANIFEST = '''<manifest>%s</manifest>'''
+
+PROJECT = '''<project name="%s" path="%s"/>'''
+
+
+def write(path, content, zipped=False):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with (gzip.open(path, 'wb') if zipped else open(path, 'w')) as writer:
+        writer.write(content)
+
+
+class GetProdDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='snapshot.')
+        targets = ['standard', 'emulator', 'arm-wayland']
+        write(os.path.join(self.path, 'build.xml'), BUILD % ''.join(
+            '<buildtarget name="%s"/>' % i for i in targets))
+        for i, target in enumerate(targets):
+            write(os.path.join(
+                self.path, 'repos', target, 'packages', 'repodata',
+                'abc-primary.xml.gz'), PRIMARY % ''.join(
+                    PACKAGE % ('pkg%d' % j, 'tree/%d' % (j % 5))
+                    for j in range(i * 10, i * 10 + 20)), True)
+            write(os.path.join(
+                self.path, 'builddata', 'images', target, 'images.xml'),
+                  IMAGES % (IMAGE % ('%s-image' % target, 'armv7l')))
+            write(os.path.join(
+                self.path, 'builddata', 'manifest', '%s.xml' % target),
+                  MANIFEST % ''.join(PROJECT % (('tree/%d' % j,) * 2)
+                                     for j in range(i, i + 4)))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_serial(self):
+        trees, packages, images = get_prod_data(self.path)
+        self.assertEqual(['tree/%d' % i for i in range(6)], sorted(trees))
+        self.assertEqual(60, len(packages))
+        self.assertEqual(('standard', 'armv7l', 'standard-image'), images[0])
+
+    def test_parallel_same_as_serial(self):
+        trees, packages, images = get_prod_data(self.path)
+        ptrees, ppackages, pimages = get_prod_data(self.path, jobs=3)
+        self.assertEqual(sorted(trees), sorted(ptrees))
+        self.assertEqual(packages, ppackages)
+        self.assertEqual(images, pimages)
+
+    def test_skip_unchanged_files(self):
+        fingerprints = {}
+        trees, packages, images = get_prod_data(
+            self.path, fingerprints=fingerprints)
+        self.assertEqual(6, len(trees))
+        self.assertEqual(60, len(packages))
+        self.assertEqual(6, len(fingerprints))
+        # stored as JSON between imports
+        fingerprints = json.loads(json.dumps(fingerprints))
+
+        trees2, packages2, images2 = get_prod_data(
+            self.path, fingerprints=fingerprints)
+        self.assertEqual(sorted(trees), sorted(trees2))
+        self.assertEqual((packages, images), (packages2, images2))
+        # unchanged files are not parsed again
+        fingerprints['manifest:emulator.xml'][1] = ['cached/tree']
+        self.assertIn('cached/tree', get_prod_data(
+            self.path, fingerprints=fingerprints)[0])
+
+        write(os.path.join(
+            self.path, 'builddata', 'images', 'emulator', 'images.xml'),
+              IMAGES % (IMAGE % ('new-image', 'i586')))
+        write(os.path.join(
+            self.path, 'builddata', 'manifest', 'standard.xml'),
+              MANIFEST % (PROJECT % ('tree/9', 'tree/9')))
+        trees, packages, images = get_prod_data(
+            self.path, jobs=2, fingerprints=fingerprints)
+        self.assertIn('tree/9', trees)
+        self.assertIn('cached/tree', trees)
+        self.assertEqual(60, len(packages))
+        self.assertIn(('emulator', 'i586', 'new-image'), images)
+        self.assertNotIn(('emulator', 'armv7l', 'emulator-image'), images)
+
+
+class FromDirTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='snapshot.')
+        write(os.path.join(self.path, 'build.xml'),
+              BUILD % '<buildtarget name="standard"/>')
+        write(os.path.join(self.path, 'repos', 'standard', 'packages',
+                           'repodata', 'abc-primary.xml.gz'),
+              PRIMARY % PACKAGE % ('pkg', 'tree/0'), True)
+        write(os.path.join(self.path, 'builddata', 'images', 'standard',
+                           'images.xml'),
+              IMAGES % (IMAGE % ('standard-image', 'armv7l')))
+        write(os.path.join(self.path, 'builddata', 'manifest',
+                           'standard.xml'),
+              MANIFEST % (PROJECT % ('tree/0', 'tree/0')))
+        subdomain = SubDomain.objects.create(
+            name='Sub', domain=Domain.objects.create(name='Domain'))
+        GitTree.objects.create(gitpath='tree/0', subdomain=subdomain)
+        Product.objects.create(name='Tizen:IVI')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_relations_restored_when_unchanged(self):
+        fingerprints = {}
+        from_dir('Tizen:IVI', self.path, fingerprints=fingerprints)
+        tree = GitTree.objects.get(gitpath='tree/0')
+        self.assertEqual(['pkg'], [i.name for i in tree.packages.all()])
+
+        # the scm import deletes and creates the tree again
+        subdomain = tree.subdomain
+        tree.delete()
+        GitTree.objects.create(gitpath='tree/0', subdomain=subdomain)
+
+        from_dir('Tizen:IVI', self.path, fingerprints=fingerprints)
+        tree = GitTree.objects.get(gitpath='tree/0')
+        self.assertEqual(['pkg'], [i.name for i in tree.packages.all()])
+        self.assertEqual(['tree/0'], [i.gitpath for i in Product.objects.get(
+            name='Tizen:IVI').gittrees.all()])
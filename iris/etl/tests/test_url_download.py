@@ -0,0 +1,255 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+'''
+This module is used to test downloading files: iris/etl/url.py
+'''
+#pylint: disable=missing-docstring,invalid-name,no-member
+
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from iris.etl.url import URL, Downloader, PAGES, get_session
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves server.files with ETag, conditional and Range requests
+    """
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start = 0
+        rng = self.headers.get('Range')
+        if rng and self.headers.get('If-Range') == etag:
+            start = int(rng.split('=')[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+                start, len(body) - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedDownloader(Downloader):
+    """Stops downloading after the first chunk"""
+    def _count(self, **kwargs):
+        if 'bytes' in kwargs:
+            raise Interrupted()
+        super(InterruptedDownloader, self)._count(**kwargs)
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.files = {
+            '/snapshot/build.xml': '<build/>',
+            '/snapshot/repodata/a-primary.xml.gz': 'a' * 100000,
+            '/snapshot/manifest/m1.xml': '<manifest/>',
+            '/snapshot/manifest/m2.xml': '<manifest></manifest>',
+            }
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.base = URL('http://127.0.0.1:%d/snapshot/' %
+                        self.server.server_address[1])
+        self.workdir = tempfile.mkdtemp(prefix='download.')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.workdir)
+
+
+
+class DownloaderTest(ServerTestCase):
+
+    def urls(self):
+        return [self.base.join(path[len('/snapshot/'):])
+                for path in sorted(self.server.files)]
+
+    def local(self, path):
+        return os.path.join(self.workdir, self.base.netloc, path.lstrip('/'))
+
+    def assert_downloaded(self, *paths):
+        for path in paths or self.server.files:
+            with open(self.local(path)) as reader:
+                self.assertEqual(self.server.files[path], reader.read())
+
+    def test_download_all_in_wget_layout(self):
+        downloader = Downloader(workers=3, chunk_size=1024)
+        paths = downloader.download_all(self.urls(), self.workdir)
+
+        self.assertEqual([self.local(i) for i in sorted(self.server.files)],
+                         paths)
+        self.assert_downloaded()
+        self.assertEqual(4, downloader.stats['downloaded'])
+        self.assertEqual(
+            sum(len(i) for i in self.server.files.values()),
+            downloader.stats['bytes'])
+
+    def test_skip_not_modified(self):
+        Downloader().download_all(self.urls(), self.workdir)
+        self.server.files['/snapshot/build.xml'] = '<build>2</build>'
+
+        downloader = Downloader()
+        downloader.download_all(self.urls(), self.workdir)
+
+        self.assert_downloaded()
+        self.assertEqual(3, downloader.stats['skipped'])
+        self.assertEqual(1, downloader.stats['downloaded'])
+
+    def test_download_again_if_local_file_changed(self):
+        Downloader().download_all(self.urls(), self.workdir)
+        with open(self.local('/snapshot/manifest/m1.xml'), 'w') as writer:
+            writer.write('broken')
+
+        downloader = Downloader()
+        downloader.download_all(self.urls(), self.workdir)
+
+        self.assert_downloaded()
+        self.assertEqual(1, downloader.stats['downloaded'])
+
+    def test_resume_partial_download(self):
+        path = '/snapshot/repodata/a-primary.xml.gz'
+        url = self.base.join('repodata/a-primary.xml.gz')
+        self.assertRaises(Interrupted,
+                          InterruptedDownloader(chunk_size=1000).download,
+                          url, self.workdir)
+
+        partial = os.path.join(self.workdir, Downloader.PARTIAL,
+                               self.base.netloc, path.lstrip('/'))
+        self.assertEqual(1000, os.path.getsize(partial))
+
+        downloader = Downloader()
+        downloader.download(url, self.workdir)
+
+        self.assert_downloaded(path)
+        self.assertEqual(1, downloader.stats['resumed'])
+        self.assertEqual(99000, downloader.stats['bytes'])
+        self.assertEqual('bytes=1000-', self.server.requests[-1][1]['range'])
+        self.assertFalse(os.path.exists(partial))
+
+    def test_prune_metas_of_removed_files(self):
+        Downloader().download_all(self.urls(), self.workdir)
+        os.remove(self.local('/snapshot/build.xml'))
+
+        downloader = Downloader()
+        downloader.save(self.workdir)
+        self.assertEqual(
+            ['/snapshot/manifest/m1.xml', '/snapshot/manifest/m2.xml',
+             '/snapshot/repodata/a-primary.xml.gz'],
+            sorted('/' + i.split('/', 1)[1]
+                   for i in downloader.metas[self.workdir]))
+
+    def test_not_found(self):
+        self.assertRaises(Exception, Downloader().download,
+                          self.base.join('missing.xml'), self.workdir)
+
+
+LISTING = """<html><body><h1>Index of /snapshot/manifest/</h1>
+<a href="../">../</a>
+%s</body></html>"""
+
+
+class PageCacheTest(ServerTestCase):
+
+    def setUp(self):
+        super(PageCacheTest, self).setUp()
+        self.set_listing('m1.xml', 'm2.xml')
+        PAGES.pages.clear()
+        PAGES.used.clear()
+
+    def tearDown(self):
+        PAGES.pages.clear()
+        PAGES.used.clear()
+        super(PageCacheTest, self).tearDown()
+
+    def set_listing(self, *names):
+        self.server.files['/snapshot/manifest/'] = LISTING % ''.join(
+            '<a href="%s">%s</a>\n' % (i, i) for i in names)
+
+    def listdir(self):
+        return [i.basename for i in self.base.join('manifest').listdir()]
+
+    def test_revalidate_listing(self):
+        self.assertEqual(['m1.xml', 'm2.xml'], self.listdir())
+        self.assertEqual(['m1.xml', 'm2.xml'], self.listdir())
+
+        path, headers = self.server.requests[-1]
+        self.assertEqual('/snapshot/manifest/', path)
+        self.assertIn('if-none-match', headers)
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_listing_changed(self):
+        self.assertEqual(['m1.xml', 'm2.xml'], self.listdir())
+        self.set_listing('m1.xml', 'm3.xml')
+        self.assertEqual(['m1.xml', 'm3.xml'], self.listdir())
+
+    def test_fetch_missing_page_is_not_cached(self):
+        url = self.base.join('missing.xml')
+        url.fetch()
+        url.fetch()
+        self.assertNotIn('if-none-match', self.server.requests[-1][1])
+
+    def test_save_and_load(self):
+        self.listdir()
+        filename = os.path.join(self.workdir, 'pages.json')
+        PAGES.save(filename)
+        PAGES.pages.clear()
+
+        PAGES.load(filename)
+        self.assertEqual(['m1.xml', 'm2.xml'], self.listdir())
+        self.assertIn('if-none-match', self.server.requests[-1][1])
+
+    def test_save_only_used_pages(self):
+        self.server.files['/snapshot/build.xml'] = '<build/>'
+        self.listdir()
+        self.base.join('build.xml').fetch()
+        filename = os.path.join(self.workdir, 'pages.json')
+        PAGES.save(filename)
+        PAGES.used.clear()
+
+        self.listdir()
+        PAGES.save(filename)
+        self.assertEqual([self.base.join('manifest').asdir().href],
+                         PAGES.pages.keys())
+
+    def test_shared_session(self):
+        self.assertIs(get_session(), get_session())
@@ -7,7 +7,11 @@
 # version 2.0 as published by the Free Software Foundation.
 #pylint: disable=missing-docstring,invalid-name
 
-from iris.etl.parser import UserCache
+import random
+
+from iris.etl.parser import UserCache, parse_user, parse_blocks
+from iris.etl.scm import build_user_cache, MAPPING
+from iris.etl.tests.test_loader import CountingDict
 
 
 def test_merge_name_and_full():
@@ -131,3 +135,86 @@ def test_user_without_email_will_be_ignored():
          'last_name': 'Mercury',
          'email': 'freddie@queen.com'}
         ]
+
+
+def _linear_merge(ustrings):
+    """The original quadratic merging, used as the reference"""
+    groups = []
+    for ustring in ustrings:
+        email, first, last = name = parse_user(ustring)
+        newg, ngs = set([name]), []
+        for group in groups:
+            if any((email and email == i[0]) or
+                   (first or last) and (first, last) == i[1:]
+                   for i in group):
+                newg |= group
+            else:
+                ngs.append(group)
+        ngs.append(newg)
+        groups = ngs
+    return [sorted(group) for group in groups]
+
+
+def _synthetic_ustrings(total, seed=0):
+    """
+    User strings of `total` people, written in all the three forms and
+    sometimes sharing names or emails with others
+    """
+    rand = random.Random(seed)
+    ustrings = []
+    for i in range(total):
+        first, last = 'First%d' % rand.randint(0, total), 'Last%d' % i
+        email = 'user%d@i.com' % rand.randint(0, total * 2)
+        ustrings.extend(['%s %s <%s>' % (first, last, email),
+                         '%s %s' % (first, last), email])
+    rand.shuffle(ustrings)
+    return ustrings
+
+
+def test_same_groups_as_linear_merge():
+    ustrings = _synthetic_ustrings(300)
+    uc = UserCache()
+    for ustring in ustrings:
+        uc.update(ustring)
+
+    groups = sorted(sorted(group) for group in uc.groups.values())
+    assert groups == sorted(_linear_merge(ustrings))
+    for ustring in ustrings:
+        user = uc.get(ustring)
+        assert user is None or user in uc.all()
+
+
+def test_usercache_operations():
+    """
+    Merging 20k users takes near linear parent lookups
+    """
+    ustrings = _synthetic_ustrings(20000)
+    uc = UserCache()
+    CountingDict.reads = 0
+    uc.parent = CountingDict()
+    for ustring in ustrings:
+        uc.update(ustring)
+
+    nodes = set(parse_user(ustring) for ustring in ustrings)
+    assert len(uc.parent) == len(nodes)
+    assert sum(len(group) for group in uc.groups.values()) == len(nodes)
+    # union by size and path compression keep every find short
+    assert CountingDict.reads < 5 * len(ustrings)
+    users = uc.all()
+    assert len(users) == len(uc.groups)
+    assert len(set(i['email'] for i in users)) == len(users)
+
+
+def test_build_user_cache():
+    ustrings = _synthetic_ustrings(1000)
+    lines = []
+    for i, ustring in enumerate(ustrings):
+        lines.extend(['T: tree%d' % i, 'M: %s' % ustring, ''])
+    uc = build_user_cache(parse_blocks('\n'.join(lines), MAPPING))
+
+    groups = sorted(sorted(group) for group in uc.groups.values())
+    expected = UserCache()
+    for ustring in ustrings:
+        expected.update(ustring)
+    assert groups == sorted(sorted(group)
+                            for group in expected.groups.values())
@@ -9,21 +9,29 @@
 
 import os
 import re
+import json
+import errno
 import urllib
 import fnmatch
-from subprocess import check_call, CalledProcessError
+import logging
+import threading
 from urlparse import urlsplit, urlunsplit
 from collections import namedtuple
+from multiprocessing.pool import ThreadPool
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
-# pylint: disable=E1101,W0232,E1002
+# pylint: disable=E1101,W0232,E1002,W0212
 # E1101: Instance of 'URL' has no 'href' member
 # W0232: 22,0:URL: Class has no __init__ method
 # E1002: 25,4:URL.__new__: Use of super on an old style class
+# W0212: Access to a protected member _make_auth of a client class
 
-__ALL__ = ('URL', )
+__ALL__ = ('URL', 'Downloader', 'PAGES')
+
+log = logging.getLogger(__name__)
 
 
 class URL(namedtuple("URL", "href user passwd full netloc path basename")):
@@ -62,13 +70,17 @@ class URL(namedtuple("URL", "href user passwd full netloc path basename")):
 
     def listdir(self):
         "Generator yields all children as URL classes"
-        for path in self._parse_dir(self.asdir().fetch()):
+        url = self.asdir()
+        page = PAGES.fetch(url.href, url._make_auth())
+        if 'children' not in page:
+            page['children'] = list(self._parse_dir(page['text']))
+        for path in page['children']:
             if path not in ('..', '../'):
                 yield self.join(path)
 
     def fetch(self):
         "Returns HTTP response body"
-        return requests.get(self.href, auth=self._make_auth()).text
+        return PAGES.fetch(self.href, self._make_auth())['text']
 
     def glob(self, pattern):
         "find files matching a specify pattern"
@@ -78,24 +90,12 @@ class URL(namedtuple("URL", "href user passwd full netloc path basename")):
                 paths.append(path)
         return paths
 
-    def download(self, localpath, verbosity=1):
-        "Download this to local file"
-        vopt = {0: '-q', 1: '-nv', 2: '-v'}.get(verbosity, 1)
-        cmd = ['wget', vopt, '-P', localpath, '-x', '--no-check-certificate']
-        if self.user:
-            cmd.extend(['--user', self.user])
-        if self.passwd:
-            cmd.extend(['--password', self.passwd])
-        cmd.append(self.href)
-        try:
-            return check_call(cmd)
-        except CalledProcessError as err:
-            # remove password from command line
-            if '--password' in err.cmd:
-                idx = err.cmd.index('--password')
-                err.cmd[idx+1] = 'xxx'
-                raise err
-            raise
+    def download(self, localpath, downloader=None):
+        """
+        Download this to local file under `localpath` in the same layout
+        as `wget -x`, i.e. localpath/netloc/path
+        """
+        return (downloader or Downloader()).download(self, localpath)
 
     def _replace_path(self, path):
         "Clone self and update path"
@@ -120,6 +120,266 @@ class URL(namedtuple("URL", "href user passwd full netloc path basename")):
             return HTTPBasicAuth(self.user, self.passwd)
 
 
+
+
+def get_session():
+    "Returns the HTTP session shared by all URL instances"
+    global _SESSION  # pylint: disable=W0603
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+        return _SESSION
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+class PageCache(object):
+    """
+    Cache of fetched pages keyed by URL.
+
+    A cached page is revalidated by If-None-Match/If-Modified-Since, so an
+    unchanged page costs a 304 without body. Pages can be saved to and
+    loaded from a file to keep them between runs, only pages fetched in
+    this run are saved.
+    """
+    def __init__(self):
+        self.pages = {}
+        self.used = set()
+        self.lock = threading.Lock()
+
+    def fetch(self, href, auth=None):
+        "Returns cached page dict which has key 'text'"
+        with self.lock:
+            page = self.pages.get(href)
+            self.used.add(href)
+        headers = {}
+        if page:
+            if page.get('etag'):
+                headers['If-None-Match'] = page['etag']
+            if page.get('last_modified'):
+                headers['If-Modified-Since'] = page['last_modified']
+
+        resp = get_session().get(href, auth=auth, headers=headers)
+        if page and resp.status_code == 304:
+            return page
+
+        page = {'text': resp.text,
+                'etag': resp.headers.get('etag'),
+                'last_modified': resp.headers.get('last-modified')}
+        if resp.status_code == 200 and (page['etag'] or
+                                        page['last_modified']):
+            with self.lock:
+                self.pages[href] = page
+        return page
+
+    def load(self, filename):
+        "Load cached pages from file"
+        try:
+            with open(filename) as reader:
+                pages = json.load(reader)
+        except (IOError, ValueError):
+            return
+        with self.lock:
+            self.pages.update(pages)
+
+    def save(self, filename):
+        "Save cached pages fetched in this run to file"
+        with self.lock:
+            for href in set(self.pages) - self.used:
+                del self.pages[href]
+            with open(filename + '.tmp', 'w') as writer:
+                json.dump(self.pages, writer)
+            os.rename(filename + '.tmp', filename)
+
+PAGES = PageCache()
+
+
+class Downloader(object):
+    """
+    Download URLs with a pooled HTTP session and a bounded thread pool.
+
+    Bodies are streamed to a partial file under `localpath/.partial`, which
+    is resumed by Range request next time if the download is interrupted.
+    ETag, Last-Modified and size of downloads are kept in memory and saved
+    to `localpath/.downloads.json` once downloads are finished or
+    interrupted, and files whose validators still match are skipped by
+    conditional requests.
+
+    TLS certificates are verified unless `verify` is False, the same as
+    `wget --no-check-certificate`.
+    """
+    META = '.downloads.json'
+    PARTIAL = '.partial'
+
+    def __init__(self, workers=4, chunk_size=64 * 1024, session=None,
+                 verify=True):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers,
+                                  pool_maxsize=workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        session.verify = verify
+        self.session = session
+        self.lock = threading.Lock()
+        self.metas = {}
+        self.stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        "Clear download statistics"
+        self.stats = dict(files=0, downloaded=0, resumed=0, skipped=0,
+                          bytes=0)
+
+    def download_all(self, urls, localpath):
+        "Download URLs concurrently, returns local paths in the same order"
+        urls = list(urls)
+        try:
+            if self.workers <= 1 or len(urls) <= 1:
+                return [self._download(url, localpath) for url in urls]
+            pool = ThreadPool(min(self.workers, len(urls)))
+            try:
+                return pool.map(lambda url: self._download(url, localpath),
+                                urls)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            self.save(localpath)
+
+    def download(self, url, localpath):
+        "Download an URL to localpath/netloc/path, returns the local path"
+        try:
+            return self._download(url, localpath)
+        finally:
+            self.save(localpath)
+
+    def _download(self, url, localpath):
+        "Download an URL without saving metas"
+        relpath = os.path.join(url.netloc, url.path.lstrip('/'))
+        target = os.path.join(localpath, relpath)
+        partial = os.path.join(localpath, self.PARTIAL, relpath)
+        meta = self._get_meta(localpath, relpath)
+
+        headers = {}
+        offset = 0
+        if meta and self._is_complete(target, meta):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        elif meta and os.path.exists(partial) and meta.get('partial'):
+            validator = meta.get('etag') or meta.get('last_modified')
+            if validator:
+                offset = os.path.getsize(partial)
+                headers['Range'] = 'bytes=%d-' % offset
+                headers['If-Range'] = validator
+
+        resp = self.session.get(url.href, auth=url._make_auth(),
+                                headers=headers, stream=True)
+        try:
+            if resp.status_code == 304:
+                log.debug('%s is not modified', url.href)
+                self._count(files=1, skipped=1)
+                return target
+            if resp.status_code == 416:
+                # partial file is broken, download it from the beginning
+                os.remove(partial)
+                self._set_meta(localpath, relpath, None)
+                return self._download(url, localpath)
+            resp.raise_for_status()
+            meta = {'etag': resp.headers.get('etag'),
+                    'last_modified': resp.headers.get('last-modified'),
+                    'partial': True}
+            self._set_meta(localpath, relpath, meta)
+
+            if resp.status_code == 206:
+                log.debug('resume %s from %d', url.href, offset)
+                mode, resumed = 'ab', 1
+            else:
+                mode, resumed = 'wb', 0
+            makedirs(os.path.dirname(partial))
+            with open(partial, mode) as writer:
+                for chunk in resp.iter_content(self.chunk_size):
+                    writer.write(chunk)
+                    self._count(bytes=len(chunk))
+        finally:
+            resp.close()
+
+        makedirs(os.path.dirname(target))
+        os.rename(partial, target)
+        meta = dict(meta, partial=False, size=os.path.getsize(target))
+        self._set_meta(localpath, relpath, meta)
+        self._count(files=1, downloaded=1 - resumed, resumed=resumed)
+        return target
+
+    @staticmethod
+    def _is_complete(target, meta):
+        "True if the file on disk is what we downloaded last time"
+        return (not meta.get('partial') and os.path.exists(target) and
+                os.path.getsize(target) == meta.get('size'))
+
+    def _count(self, **kwargs):
+        "Update statistics"
+        with self.lock:
+            for key, val in kwargs.items():
+                self.stats[key] += val
+
+    def _load_metas(self, localpath):
+        "Load metas of downloaded files under localpath"
+        if localpath not in self.metas:
+            try:
+                with open(os.path.join(localpath, self.META)) as reader:
+                    self.metas[localpath] = json.load(reader)
+            except (IOError, ValueError):
+                self.metas[localpath] = {}
+        return self.metas[localpath]
+
+    def _get_meta(self, localpath, relpath):
+        "Get meta of a local file"
+        with self.lock:
+            return self._load_metas(localpath).get(relpath)
+
+    def _set_meta(self, localpath, relpath, meta):
+        "Set meta of a local file, which is saved by save()"
+        with self.lock:
+            metas = self._load_metas(localpath)
+            if meta is None:
+                metas.pop(relpath, None)
+            else:
+                metas[relpath] = meta
+
+    def save(self, localpath):
+        """
+        Save metas of files under localpath, those of files which don't
+        exist any more are dropped
+        """
+        with self.lock:
+            metas = self._load_metas(localpath)
+            for relpath in metas.keys():
+                if not (os.path.exists(os.path.join(localpath, relpath)) or
+                        os.path.exists(os.path.join(
+                            localpath, self.PARTIAL, relpath))):
+                    del metas[relpath]
+            makedirs(localpath)
+            tmpfile = os.path.join(localpath, self.META + '.tmp')
+            with open(tmpfile, 'w') as writer:
+                json.dump(metas, writer)
+            os.rename(tmpfile, os.path.join(localpath, self.META))
+
+
+def makedirs(path):
+    "Make directories if they don't exist"
+    try:
+        os.makedirs(path)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+
+
 def join_userpass(href, user, passwd):
     "Return authenticated URL with user and passwd embeded"
     if not user and not passwd:
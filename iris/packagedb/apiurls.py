@@ -19,7 +19,8 @@ Permittable URLs and views accessible through REST API are defined here.
 from django.conf.urls import patterns, url, include
 
 from iris.packagedb.apiviews import (
-    DomainViewSet, GitTreeViewSet, PackageViewSet, ProductViewSet)
+    DomainViewSet, GitTreeViewSet, PackageViewSet, ProductViewSet,
+    list_changes)
 
 
 list_domains = DomainViewSet.as_view({
@@ -61,6 +62,7 @@ urlpatterns = patterns(
     url(r'^packages/(?P<name>[\w.-]+)/$', get_package, name='package_detail'),
     url(r'^products/$', list_products, name='products_list'),
     url(r'^products/(?P<name>[\w:]+)/$', get_product, name='product_detail'),
+    url(r'^changes/$', list_changes, name='changes_list'),
     url(r'^api-auth/', include('rest_framework.urls',
         namespace='rest_framework')),
 )
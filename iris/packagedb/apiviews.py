@@ -17,38 +17,64 @@ Views shown by REST Framework under API URLs are defined here.
 # pylint: disable=E1101,W0232,C0111,R0901,R0904,W0613
 #W0613: Unused argument %r(here it is request)
 
+import json
+
+from rest_framework import status
+from rest_framework.decorators import api_view
 from rest_framework.viewsets import ReadOnlyModelViewSet, ViewSet
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 
-from iris.core.models import (SubDomain, GitTree, Package, Product)
+from iris.core.models import (SubDomain, GitTree, Package, Product, ChangeLog)
+from iris.packagedb import payloads
 from iris.packagedb.serializers import (
     DomainSerializer, GitTreeSerializer, PackageSerializer, ProductSerializer)
 
 
-class DomainViewSet(ViewSet):
+class PrecomputedListMixin(object):
+    """
+    Serve JSON of list from iris.packagedb.payloads, other formats such as
+    the browsable API are rendered by list_live()
+    """
+
+    payload = None
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'json':
+            self.headers['Vary'] = 'Accept, Accept-Encoding'
+            return payloads.serve(request, self.payload)
+        return self.list_live(request, *args, **kwargs)
+
+    def list_live(self, request, *args, **kwargs):
+        return super(PrecomputedListMixin, self).list(
+            request, *args, **kwargs)
+
+
+class DomainViewSet(PrecomputedListMixin, ViewSet):
     """
     View to the Domains provided by the API.
     """
 
-    def list(self, request):
-        queryset = SubDomain.objects.prefetch_related(
-            'domain__role_set__user_set',
-            'subdomainrole_set__user_set'
-            ).order_by('domain__name', 'name')
-        serializer = DomainSerializer(queryset, many=True)
+    # users of roles are resolved by the serializer
+    queryset = SubDomain.objects.select_related(
+        'domain').order_by('domain__name', 'name')
+    serializer_class = DomainSerializer
+    payload = 'domains'
+
+    def list_live(self, request, *args, **kwargs):
+        serializer = self.serializer_class(self.queryset.all(), many=True)
         return Response(serializer.data)
 
     def retrieve(self, request, name=None):
         domain, subdomain = name.split('/')
-        obj = get_object_or_404(SubDomain,
+        obj = get_object_or_404(self.queryset,
                                 name=subdomain.strip(),
                                 domain__name=domain.strip())
-        serializer = DomainSerializer(obj)
+        serializer = self.serializer_class(obj)
         return Response(serializer.data)
 
 
-class GitTreeViewSet(ReadOnlyModelViewSet):
+class GitTreeViewSet(PrecomputedListMixin, ReadOnlyModelViewSet):
     """
     View to the GitTrees provided by the API.
     """
@@ -58,13 +84,13 @@ class GitTreeViewSet(ReadOnlyModelViewSet):
         ).prefetch_related(
             'packages',
             'licenses',
-            'role_set__user_set'
         ).order_by('gitpath')
     serializer_class = GitTreeSerializer
     lookup_field = 'gitpath'
+    payload = 'gittrees'
 
 
-class PackageViewSet(ReadOnlyModelViewSet):
+class PackageViewSet(PrecomputedListMixin, ReadOnlyModelViewSet):
     """
     View to the Packages provided by the API.
     """
@@ -72,9 +98,10 @@ class PackageViewSet(ReadOnlyModelViewSet):
     queryset = Package.objects.prefetch_related('gittree_set').order_by('name')
     serializer_class = PackageSerializer
     lookup_field = 'name'
+    payload = 'packages'
 
 
-class ProductViewSet(ReadOnlyModelViewSet):
+class ProductViewSet(PrecomputedListMixin, ReadOnlyModelViewSet):
     """
     View to the Products provided by the API.
     """
@@ -82,3 +109,57 @@ class ProductViewSet(ReadOnlyModelViewSet):
     queryset = Product.objects.prefetch_related('gittrees').order_by('name')
     serializer_class = ProductSerializer
     lookup_field = 'name'
+    payload = 'products'
+
+
+# max number of changes returned by one request
+CHANGES_LIMIT = 1000
+
+
+@api_view(['GET'])
+def list_changes(request):
+    """
+    Changes applied by imports, the web UI and admin after revision
+    `since`, oldest first.
+
+    At most `limit` changes are returned, "more" tells if there are others
+    left. "revision" is the last revision returned, which is `since` of
+    the next request.
+
+    If changes after `since` were pruned, it responds 410 with the latest
+    "revision". Clients should then sync all data from the lists and ask
+    for changes after that revision.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(int(request.GET.get('limit', CHANGES_LIMIT)),
+                    CHANGES_LIMIT)
+    except ValueError:
+        return Response({'detail': 'since and limit must be integers'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({'detail': 'limit must be positive'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    if since < ChangeLog.pruned():
+        latest = ChangeLog.objects.order_by('-revision').values_list(
+            'revision', flat=True).first()
+        return Response(
+            {'detail': 'Changes after revision %d are pruned, sync all '
+                       'data again' % since,
+             'revision': latest or since},
+            status=status.HTTP_410_GONE)
+
+    rows = list(ChangeLog.objects.filter(revision__gt=since).order_by(
+        'revision').values_list('revision', 'entity', 'op', 'key')[
+            :limit + 1])
+    changes = [{'revision': revision,
+                'entity': entity,
+                'op': op,
+                'key': json.loads(key)}
+               for revision, entity, op, key in rows[:limit]]
+    return Response({
+        'revision': changes[-1]['revision'] if changes else since,
+        'more': len(rows) > limit,
+        'changes': changes,
+        })
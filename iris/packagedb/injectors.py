@@ -12,10 +12,14 @@
 This module contains helpers such as property injectors for models.
 """
 
-# pylint: disable=E1101,C0111
+# pylint: disable=E1101,C0111,W0212
 
 from iris.core.models import SubDomain, Package, GitTree, Product
 from iris.core.models import (DomainRole, SubDomainRole, GitTreeRole)
+from iris.core.models import bulk_role_users
+
+# number of objects whose children are queried at a time
+BATCH_SIZE = 500
 
 
 def inject_base_getters(obj, user_resolver):
@@ -67,103 +71,138 @@ def inject_base_getters(obj, user_resolver):
 
     return obj
 
-def inject_domain(domain):
+
+def _load_children(model, parent, pks):
     """
-    An injector for setting Domain object's user getter methods for templates.
+    Returns {pk: [children]} of objects in `pks`, which `model` refers to
+    by field `parent`
+    """
+    result = {pk: [] for pk in pks}
+    for i in range(0, len(pks), BATCH_SIZE):
+        for child in model.objects.filter(
+                **{'%s__in' % parent: pks[i:i + BATCH_SIZE]}):
+            result[getattr(child, '%s_id' % parent)].append(child)
+    return result
+
+
+def _inject_bulk(objs, role_model, owner):
+    """
+    Injects user getters into all `objs`, which are resolved from
+    in-memory lists loaded by bulk_role_users()
+    """
+    objs = list(objs)
+    role_users = bulk_role_users(role_model, owner, [obj.pk for obj in objs])
+    # getters are called with roles, users are keyed by their display
+    display = dict(role_model._meta.get_field('role').choices)
+    for obj in objs:
+        roles = role_users[obj.pk]
+
+        def _get_users(role, roles=roles):
+            return list(roles.get(display.get(role, role), ()))
+
+        inject_base_getters(obj, _get_users)
+    return objs
+
+def inject_domains(domains):
+    """
+    An injector for setting Domain objects' user getter methods for templates.
     These are split into a separate injectors to avoid bloating
     Django ORM objects by moving rendering related functionality
     out of the model classes to be added when needed.
 
+    Roles, users and subdomains of all domains are loaded at once by a
+    constant number of queries, the getters return them from memory.
+
+    :param  domains:    Domains to inject the getter methods into
+    :type   domains:    Iterable of Domain model objects
+
+    Example usage::
+
+        domains = inject_domains(Domain.objects.all())
+    """
+
+    domains = _inject_bulk(domains, DomainRole, 'domain')
+    subdomains = _load_children(SubDomain, 'domain', [d.pk for d in domains])
+    for domain in domains:
+        domain.get_subdomains = (
+            lambda children=subdomains[domain.pk]: list(children))
+    return domains
+
+
+def inject_domain(domain):
+    """
+    An injector for setting Domain object's user getter methods for templates.
+
+    For additional documentation see inject_domains from same module.
+
     :param  domain:     Domain to inject the getter methods into
     :type   domain:     Domain model object
+    """
+
+    return inject_domains([domain])[0]
 
-    Example usage::
 
-        domains = [inject_subdomain(d) for d in Domain.objects.all()]
+def inject_subdomains(subdomains):
     """
+    An injector for setting SubDomain objects' getter methods for templates.
 
-    def _get_users(role):
-        """
-        Returns a list of users with given role for the Domain object.
+    Roles, users and gittrees of all subdomains are loaded at once by a
+    constant number of queries, the getters return them from memory.
 
-        Queries for matching roles, which returns a queryset of groups.
-        Constructs a list of users in queryset's role groups in-place
-        """
+    For additional documentation see inject_domains from same module.
 
-        roles = DomainRole.objects.filter(role=role, domain=domain)
-        return [user for group in roles for user in group.user_set.all()]
+    :param  subdomains:     SubDomains to inject the getter methods into
+    :type   subdomains:     Iterable of SubDomain model objects
 
-    def _get_subdomains():
-        """
-        Returns SubDomains belonging to this Domain object.
+    Example usage::
 
-        Follows a backward relation from SubDomain model's domain
-        field into the Domain object the subdomain belongs to, then
-        back to the Domain the SubDomain belongs to.
-        """
+        subdomains = inject_subdomains(SubDomain.objects.all())
+    """
 
-        return SubDomain.objects.filter(domain=domain)
+    subdomains = _inject_bulk(subdomains, SubDomainRole, 'subdomain')
+    gittrees = _load_children(GitTree, 'subdomain',
+                              [s.pk for s in subdomains])
+    for subdomain in subdomains:
+        subdomain.get_gittrees = (
+            lambda children=gittrees[subdomain.pk]: list(children))
+    return subdomains
 
-    domain.get_subdomains = _get_subdomains
-    return inject_base_getters(domain, _get_users)
 
 def inject_subdomain(subdomain):
     """
     An injector for setting SubDomain object's getter methods for templates.
-    These are split into a separate injectors to avoid bloating
-    Django ORM objects by moving rendering related functionality
-    out of the model classes to be added when needed.
+
+    For additional documentation see inject_subdomains from same module.
 
     :param  subdomain:     SubDomain to inject the getter methods into
     :type   subdomain:     SubDomain model object
-
-    Example usage::
-
-        subdomains = [inject_subdomain(d) for d in SubDomain.objects.all()]
     """
 
-    def _get_users(role):
-        """
-        Returns a list of users with given role for the SubDomain object.
+    return inject_subdomains([subdomain])[0]
 
-        Queries for matching roles, which returns a queryset of groups.
-        Constructs a list of users in queryset's role groups in-place
-        """
 
-        roles = SubDomainRole.objects.filter(role=role, subdomain=subdomain)
-        return [user for group in roles for user in group.user_set.all()]
-
-    def _get_gittrees():
-        """
-        Returns Gittrees belonging to this SubDomain object.
+def inject_gittrees(gittrees):
+    """
+    An injector for setting GitTree objects' user getter methods for
+    templates, roles and users of all gittrees are loaded at once.
 
-        Follows a backward relation from Gittree model's subdomain
-        field into the GitTree object the belongs to, then
-        back to the SubDomain the GitTree belongs to.
-        """
+    For additional documentation see inject_domains from same module.
 
-        return GitTree.objects.filter(subdomain=subdomain)
+    :param  gittrees:   GitTrees to inject the getter methods into
+    :type   gittrees:   Iterable of GitTree model objects
+    """
 
-    subdomain.get_gittrees = _get_gittrees
+    return _inject_bulk(gittrees, GitTreeRole, 'gittree')
 
-    return inject_base_getters(subdomain, _get_users)
 
 def inject_gittree(gittree):
     """
     An injector for setting GitTree object's user getter methods for templates.
 
-    For additional documentation see inject_domain from same module.
+    For additional documentation see inject_domains from same module.
 
     :param  gittree:    GitTree to inject the getter methods into
     :type   gittree:    GitTree model object
     """
 
-    def _get_users(role):
-        """
-        Returns a list of users with given role for the GitTree object.
-        """
-
-        roles = GitTreeRole.objects.filter(role=role, gittree=gittree)
-        return [user for group in roles for user in group.user_set.all()]
-
-    return inject_base_getters(gittree, _get_users)
+    return inject_gittrees([gittree])[0]
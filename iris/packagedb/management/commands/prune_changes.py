@@ -0,0 +1,37 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Delete old changes served by the packagedb changes API
+"""
+from datetime import timedelta
+from optparse import make_option
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+
+from iris.core.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = ('Delete changes older than PACKAGEDB_CHANGES_RETENTION_DAYS '
+            'days. Run it periodically, such as by cron.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--days', type='int',
+                    help='Keep changes of this number of days instead'),
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = settings.PACKAGEDB_CHANGES_RETENTION_DAYS
+        with transaction.atomic():
+            count = ChangeLog.prune(timezone.now() - timedelta(days=days))
+        self.stdout.write('%d changes deleted' % count)
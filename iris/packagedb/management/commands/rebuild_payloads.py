@@ -0,0 +1,35 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Rebuild precomputed JSON of the packagedb API lists
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from iris.packagedb import payloads
+
+
+class Command(BaseCommand):
+    help = ('Rebuild precomputed lists of the packagedb API which are stale '
+            'or older than PACKAGEDB_PAYLOAD_MAX_AGE, or all of them by '
+            '--all. Run it periodically, such as by cron.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--all', action='store_true', default=False,
+                    help='Rebuild all lists'),
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            payloads.rebuild()
+            names = sorted(payloads.viewsets())
+        else:
+            names = payloads.rebuild_expired()
+        self.stdout.write('%d lists rebuilt: %s' % (
+            len(names), ', '.join(names)))
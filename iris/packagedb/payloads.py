@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+"""
+Precomputed JSON of the packagedb API lists.
+
+Lists of domains, gittrees, packages and products are serialized once and
+stored gzip compressed in ApiPayload with an ETag, then streamed as they
+are. They are serialized and served in chunks, so memory of workers stays
+flat no matter how many objects there are.
+They are rebuilt after scm and snapshot data is imported. Changes made by
+other means such as the web UI and admin mark them stale by invalidate().
+Those stale or older than settings.PACKAGEDB_PAYLOAD_MAX_AGE seconds are
+rebuilt by command rebuild_payloads run periodically. Requests always serve the
+stored payloads, so they never wait for a list to be built, except the
+first time.
+"""
+
+# pylint: disable=E1101
+
+import gzip
+import json
+import hashlib
+from datetime import timedelta
+from StringIO import StringIO
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from iris.core.models import ApiPayload
+
+# number of objects serialized at a time
+CHUNK_SIZE = 500
+# bytes of each piece of streamed responses
+STREAM_SIZE = 64 * 1024
+
+
+def viewsets():
+    """
+    Returns {name: viewset} of lists which are precomputed
+    """
+    # apiviews imports this module
+    from iris.packagedb.apiviews import (
+        DomainViewSet, GitTreeViewSet, PackageViewSet, ProductViewSet)
+    return {
+        'domains': DomainViewSet,
+        'gittrees': GitTreeViewSet,
+        'packages': PackageViewSet,
+        'products': ProductViewSet,
+        }
+
+
+def iter_json(name, chunk_size=CHUNK_SIZE):
+    """
+    Yields JSON of list `name` in pieces, the same as rendered by its
+    viewset. Objects are serialized `chunk_size` at a time, so memory
+    doesn't grow with the number of objects.
+    """
+    viewset = viewsets()[name]
+    queryset = viewset.queryset.all()
+    pks = list(queryset.prefetch_related(None).values_list('pk', flat=True))
+    renderer = JSONRenderer()
+    yield '['
+    for i in range(0, len(pks), chunk_size):
+        data = viewset.serializer_class(
+            queryset.filter(pk__in=pks[i:i + chunk_size]), many=True).data
+        # items of the list without brackets
+        items = renderer.render(data)[1:-1]
+        yield items if i == 0 else ', ' + items
+    yield ']'
+
+
+def render(name):
+    """
+    JSON of list `name`
+    """
+    return ''.join(iter_json(name))
+
+
+def build(name):
+    """
+    Build and store list `name`, returns its ApiPayload
+    """
+    sha1 = hashlib.sha1()
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as writer:
+        for piece in iter_json(name):
+            sha1.update(piece)
+            writer.write(piece)
+    etag = '"%s"' % sha1.hexdigest()
+    payload = ApiPayload.objects.filter(name=name).first() or ApiPayload(
+        name=name)
+    if payload.etag != etag:
+        payload.version += 1
+        payload.etag = etag
+        payload.data = buf.getvalue()
+    payload.built = timezone.now()
+    payload.stale = False
+    try:
+        with transaction.atomic():
+            payload.save()
+    except IntegrityError:
+        # built by another request at the same time
+        pass
+    return payload
+
+
+def rebuild():
+    """
+    Build all lists, called after scm data is imported
+    """
+    for name in viewsets():
+        build(name)
+
+
+def invalidate():
+    """
+    Mark all lists to be rebuilt by rebuild_expired(), which is done by
+    iris.core.signals when models are changed by other means than imports
+    """
+    ApiPayload.invalidate()
+
+
+def rebuild_expired():
+    """
+    Build lists which are missing, stale or expired, returns their names
+    """
+    expired = timezone.now() - timedelta(
+        seconds=settings.PACKAGEDB_PAYLOAD_MAX_AGE)
+    fresh = set(ApiPayload.objects.filter(
+        stale=False, built__gte=expired).values_list('name', flat=True))
+    names = sorted(set(viewsets()) - fresh)
+    for name in names:
+        build(name)
+    return names
+
+
+def get(name):
+    """
+    ApiPayload of list `name`, even if it's stale or expired, which is
+    rebuilt by rebuild_expired() outside requests. It's only built here if
+    it's missing.
+    """
+    payload = ApiPayload.objects.filter(name=name).first()
+    if payload is None:
+        payload = build(name)
+    return payload
+
+
+def iter_gunzip(data):
+    """
+    Yields decompressed `data` in pieces
+    """
+    reader = gzip.GzipFile(fileobj=StringIO(data))
+    while True:
+        piece = reader.read(STREAM_SIZE)
+        if not piece:
+            return
+        yield piece
+
+
+class PayloadResponse(StreamingHttpResponse):
+    """
+    Streaming response of a precomputed list, its data is parsed only when
+    it's asked for, like data of REST framework responses
+    """
+
+    _data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            content = ''.join(self.streaming_content)
+            if self.get('Content-Encoding') == 'gzip':
+                content = ''.join(iter_gunzip(content))
+            self._data = json.loads(content)
+        return self._data
+
+
+def serve(request, name):
+    """
+    Response of list `name`: 304 if the client has the same version,
+    otherwise its JSON, gzip compressed if the client accepts it. It's
+    streamed, so clients get the first bytes at once and memory doesn't
+    grow with the size of list.
+    """
+    payload = get(name)
+    matches = [i.strip() for i in request.META.get(
+        'HTTP_IF_NONE_MATCH', '').split(',')]
+    if payload.etag in matches or '*' in matches:
+        response = HttpResponseNotModified()
+    else:
+        data = bytes(payload.data)
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = PayloadResponse(
+                (data[i:i + STREAM_SIZE]
+                 for i in range(0, len(data), STREAM_SIZE)),
+                content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = str(len(data))
+        else:
+            response = PayloadResponse(
+                iter_gunzip(data), content_type='application/json')
+    response['ETag'] = payload.etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -19,7 +19,36 @@ Permittable fields and serializer validation behaviour is defined here.
 from rest_framework.serializers import (
     ModelSerializer, RelatedField, SlugRelatedField, Serializer, CharField)
 
-from iris.core.models import (GitTree, Package, Product, role_users)
+from iris.core.models import (
+    GitTree, Package, Product, DomainRole, SubDomainRole, GitTreeRole,
+    bulk_role_users)
+
+USER_FIELDS = ('first_name', 'last_name', 'email')
+
+
+class BulkRolesMixin(object):
+    """
+    Serializer resolving users of roles of all its objects at once, by
+    bulk_role_users(), instead of querying them for each object
+    """
+
+    _roles = None
+
+    def objects(self):
+        return self.object if self.many else [self.object]
+
+    def bulk_roles(self, role_model, owner, get_pks):
+        """
+        Returns {pk: roles} of pks returned by `get_pks()`, which is only
+        called once, then they are cached for the serializer
+        """
+        if self._roles is None:
+            self._roles = {}
+        key = (role_model, owner)
+        if key not in self._roles:
+            self._roles[key] = bulk_role_users(
+                role_model, owner, list(get_pks()), *USER_FIELDS)
+        return self._roles[key]
 
 
 class DomainField(RelatedField):
@@ -30,13 +59,18 @@ class DomainField(RelatedField):
 
 
 class RoleSetField(RelatedField):
-    """ Refine roleset GitTree """
+    """
+    Refine roleset GitTree, users of roles are resolved by the parent
+    serializer, see BulkRolesMixin
+    """
 
-    def to_native(self, value):
-        return role_users(value.all(), 'first_name', 'last_name', 'email')
+    def field_to_native(self, obj, field_name):
+        parent = self.parent
+        return parent.bulk_roles(GitTreeRole, 'gittree', lambda: {
+            i.pk for i in parent.objects()})[obj.pk]
 
 
-class DomainSerializer(Serializer):
+class DomainSerializer(BulkRolesMixin, Serializer):
     """ Serializer class for the Domain model. """
 
     name = CharField(max_length=200)
@@ -45,15 +79,18 @@ class DomainSerializer(Serializer):
     def to_native(self, obj):
         if obj.name.lower() == 'uncategorized':
             # get roles by domain
-            ins = obj.domain
+            roles = self.bulk_roles(DomainRole, 'domain', lambda: {
+                i.domain_id for i in self.objects()
+                if i.name.lower() == 'uncategorized'})[obj.domain_id]
         else:
             # get roles by subdomain
-            ins = obj
-        return {'name': obj.fullname,
-                'roles': ins.roles('first_name', 'last_name', 'email')}
+            roles = self.bulk_roles(SubDomainRole, 'subdomain', lambda: {
+                i.pk for i in self.objects()
+                if i.name.lower() != 'uncategorized'})[obj.pk]
+        return {'name': obj.fullname, 'roles': roles}
 
 
-class GitTreeSerializer(ModelSerializer):
+class GitTreeSerializer(BulkRolesMixin, ModelSerializer):
     """
     Serializer class for the GitTree model.
     """
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Tests of the packagedb changes API
+"""
+
+#pylint: disable=no-member,missing-docstring,invalid-name
+
+import json
+from datetime import timedelta
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.utils import timezone
+from django.core.management import call_command
+from django.contrib.auth.models import User
+
+from iris.core.models import (
+    Domain, SubDomain, GitTree, Package, DomainRole, ChangeLog)
+from iris.etl.loader import get_default_loader
+
+
+class ChangesTest(TestCase):
+
+    url = '/api/packagedb/changes/'
+
+    def get(self, **params):
+        r = self.client.get(self.url, params)
+        self.assertEquals(200, r.status_code)
+        return json.loads(r.content)
+
+    def sync(self, *names):
+        loader = get_default_loader(bulk=True)
+        loader.sync_entity([{'name': name} for name in names], Domain)()
+
+    def test_deltas_since_revision(self):
+        self.sync('System', 'Base')
+        first = self.get()
+        self.assertEquals(
+            [('domain', 'create', {'name': 'Base'}),
+             ('domain', 'create', {'name': 'System'})],
+            sorted((c['entity'], c['op'], c['key'])
+                   for c in first['changes']))
+        self.assertFalse(first['more'])
+
+        self.sync('System', 'Graphics')
+        second = self.get(since=first['revision'])
+        self.assertEquals(
+            [('domain', 'create', {'name': 'Graphics'}),
+             ('domain', 'delete', {'name': 'Base'})],
+            sorted((c['entity'], c['op'], c['key'])
+                   for c in second['changes']))
+        self.assertTrue(second['revision'] > first['revision'])
+
+        third = self.get(since=second['revision'])
+        self.assertEquals([], third['changes'])
+        self.assertEquals(second['revision'], third['revision'])
+
+    def changes(self):
+        return [(c['entity'], c['op'], c['key'])
+                for c in self.get()['changes']]
+
+    def test_edits_of_entities(self):
+        domain = Domain.objects.create(name='System')
+        SubDomain.objects.create(name='Clock', domain=domain)
+        domain.name = 'Base'
+        domain.save()
+        domain.save()
+        domain.delete()
+        self.assertEquals(
+            [('domain', 'create', {'name': 'System'}),
+             ('subdomain', 'create',
+              {'name': 'Clock', 'domain__name': 'System'}),
+             ('domain', 'delete', {'name': 'System'}),
+             ('domain', 'create', {'name': 'Base'}),
+             ('domain', 'update', {'name': 'Base'}),
+             ('subdomain', 'delete',
+              {'name': 'Clock', 'domain__name': 'Base'}),
+             ('domain', 'delete', {'name': 'Base'})],
+            self.changes())
+
+    def test_edits_of_relationships(self):
+        domain = Domain.objects.create(name='D')
+        subdomain = SubDomain.objects.create(name='S', domain=domain)
+        tree = GitTree.objects.create(gitpath='a/b', subdomain=subdomain)
+        package = Package.objects.create(name='p')
+        user = User.objects.create(username='u', email='u@i.com')
+        role = DomainRole.objects.create(
+            role='MAINTAINER', domain=domain, name='D: MAINTAINER')
+        ChangeLog.objects.all().delete()
+
+        tree.packages.add(package)
+        tree.packages.clear()
+        role.user_set.add(user)
+        user.groups.remove(role)
+        user.save(update_fields=['last_login'])
+        self.assertEquals(
+            [('gittree,package', 'add', [{'gitpath': 'a/b'}, {'name': 'p'}]),
+             ('gittree,package', 'remove',
+              [{'gitpath': 'a/b'}, {'name': 'p'}]),
+             ('domainrole,user', 'add',
+              [{'role': 'MAINTAINER', 'domain__name': 'D'},
+               {'email': 'u@i.com'}]),
+             ('domainrole,user', 'remove',
+              [{'role': 'MAINTAINER', 'domain__name': 'D'},
+               {'email': 'u@i.com'}])],
+            self.changes())
+
+    def test_limit(self):
+        self.sync('A', 'B', 'C')
+        page = self.get(limit=2)
+        self.assertEquals(2, len(page['changes']))
+        self.assertTrue(page['more'])
+        revisions = [c['revision'] for c in page['changes']]
+        self.assertEquals(sorted(revisions), revisions)
+        self.assertEquals(revisions[-1], page['revision'])
+
+        page = self.get(since=page['revision'], limit=2)
+        self.assertEquals(1, len(page['changes']))
+        self.assertFalse(page['more'])
+
+    def test_pruned(self):
+        self.sync('A', 'B')
+        first = self.get()
+        self.sync('A', 'B', 'C')
+        ChangeLog.objects.filter(revision__lte=first['revision']).update(
+            created=timezone.now() - timedelta(days=60))
+
+        out = StringIO()
+        call_command('prune_changes', days=30, stdout=out)
+        self.assertIn('2 changes deleted', out.getvalue())
+        self.assertEquals(first['revision'], ChangeLog.pruned())
+
+        r = self.client.get(self.url, {'since': 0})
+        self.assertEquals(410, r.status_code)
+        latest = json.loads(r.content)['revision']
+        self.assertTrue(latest > first['revision'])
+        self.assertEquals([], self.get(since=latest)['changes'])
+        self.assertEquals(
+            [{'name': 'C'}],
+            [c['key'] for c in self.get(since=first['revision'])['changes']])
+
+        # nothing older is left
+        call_command('prune_changes', days=30, stdout=out)
+        self.assertEquals(first['revision'], ChangeLog.pruned())
+
+    def test_bad_since(self):
+        self.assertEquals(400, self.client.get(self.url,
+                                               {'since': 'x'}).status_code)
+        self.assertEquals(400, self.client.get(self.url,
+                                               {'limit': '0'}).status_code)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Tests of the packagedb injectors
+"""
+
+#pylint: disable=no-member,missing-docstring,invalid-name
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from iris.core.models import (
+    Domain, SubDomain, GitTree, DomainRole, SubDomainRole, GitTreeRole)
+from iris.packagedb.injectors import (
+    inject_domain, inject_subdomain, inject_subdomains, inject_gittree)
+
+
+class InjectorsTest(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(
+            username='user%d' % i, email='user%d@a.com' % i)
+                      for i in range(3)]
+
+    def add_subdomains(self, num):
+        domain = Domain.objects.create(
+            name='domain%d' % Domain.objects.count())
+        for i in range(num):
+            subdomain = SubDomain.objects.create(
+                name='sub%d' % i, domain=domain)
+            SubDomainRole.objects.create(
+                name='%s%d ARCHITECT' % (domain.name, i), role='ARCHITECT',
+                subdomain=subdomain).user_set.add(*self.users[:2])
+            SubDomainRole.objects.create(
+                name='%s%d REVIEWER' % (domain.name, i), role='REVIEWER',
+                subdomain=subdomain).user_set.add(self.users[2])
+            GitTree.objects.create(gitpath='%s/tree%d' % (domain.name, i),
+                                   subdomain=subdomain)
+        return domain
+
+    def test_subdomains_in_constant_queries(self):
+        for num in (1, 5):
+            self.add_subdomains(num)
+            subdomains = SubDomain.objects.all()
+            # subdomains, roles with memberships, users and gittrees
+            with self.assertNumQueries(4):
+                subdomains = inject_subdomains(subdomains)
+                for subdomain in subdomains:
+                    subdomain.get_architects()
+                    subdomain.get_maintainers()
+                    subdomain.get_developers()
+                    subdomain.get_reviewers()
+                    subdomain.get_integrators()
+                    subdomain.get_gittrees()
+
+    def test_same_getters(self):
+        domain = self.add_subdomains(2)
+        DomainRole.objects.create(
+            name='d MAINTAINER', role='MAINTAINER',
+            domain=domain).user_set.add(self.users[0])
+        subdomain = SubDomain.objects.get(name='sub1', domain=domain)
+        GitTreeRole.objects.create(
+            name='t DEVELOPER', role='DEVELOPER',
+            gittree=subdomain.gittree_set.get()).user_set.add(*self.users)
+
+        domain = inject_domain(domain)
+        self.assertEquals([self.users[0]], domain.get_maintainers())
+        self.assertEquals([], domain.get_architects())
+        self.assertEquals(['sub0', 'sub1'],
+                          sorted(s.name for s in domain.get_subdomains()))
+
+        subdomain = inject_subdomain(subdomain)
+        self.assertEquals(self.users[:2], subdomain.get_architects())
+        self.assertEquals([self.users[2]], subdomain.get_reviewers())
+        self.assertEquals(['%s/tree1' % domain.name],
+                          [t.gitpath for t in subdomain.get_gittrees()])
+
+        gittree = inject_gittree(GitTree.objects.get(subdomain=subdomain))
+        self.assertEquals(self.users, gittree.get_developers())
+        self.assertEquals([], gittree.get_maintainers())
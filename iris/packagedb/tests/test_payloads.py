@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Tests of precomputed JSON of the packagedb API lists
+"""
+
+#pylint: disable=no-member,missing-docstring,invalid-name
+
+import gzip
+from datetime import timedelta
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+
+from rest_framework.renderers import JSONRenderer
+
+from iris.core.models import ApiPayload, Package, GitTree, DomainRole
+from iris.etl.loader import get_default_loader
+from iris.packagedb import payloads
+
+
+def content(response):
+    return ''.join(response.streaming_content)
+
+
+class PayloadsTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees', 'products']
+
+    url = '/api/packagedb/%s/'
+
+    def get(self, name, **extra):
+        return self.client.get(self.url % name, **extra)
+
+    def test_same_as_rendered(self):
+        for name in payloads.viewsets():
+            r = self.get(name)
+            self.assertEquals(200, r.status_code)
+            self.assertEquals('application/json', r['Content-Type'])
+            self.assertEquals(payloads.render(name), content(r))
+        self.assertEquals(4, ApiPayload.objects.count())
+
+    def test_rendered_in_chunks(self):
+        for name, viewset in payloads.viewsets().items():
+            serializer = viewset.serializer_class(
+                viewset.queryset.all(), many=True)
+            self.assertEquals(
+                JSONRenderer().render(serializer.data),
+                ''.join(payloads.iter_json(name, chunk_size=1)))
+
+    def test_not_modified(self):
+        etag = self.get('gittrees')['ETag']
+        r = self.get('gittrees', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(304, r.status_code)
+        self.assertEquals(etag, r['ETag'])
+        self.assertEquals(200, self.get(
+            'gittrees', HTTP_IF_NONE_MATCH='"old"').status_code)
+
+    def test_gzip(self):
+        r = self.get('packages', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEquals('gzip', r['Content-Encoding'])
+        self.assertIn('Accept-Encoding', r['Vary'])
+        self.assertEquals(payloads.render('packages'), gzip.GzipFile(
+            fileobj=StringIO(content(r))).read())
+
+    def test_browsable_api_is_live(self):
+        self.get('packages')
+        Package.objects.create(name='live-package')
+        r = self.get('packages', HTTP_ACCEPT='text/html')
+        self.assertIn('live-package', r.content)
+        self.assertNotIn('live-package', content(self.get('packages')))
+
+    def test_rebuilt(self):
+        payload = payloads.build('packages')
+        self.assertEquals(1, payloads.build('packages').version)
+
+        Package.objects.create(name='new-package')
+        payloads.invalidate()
+        # requests serve the stale list instead of building it
+        self.assertNotIn('new-package', content(self.get('packages')))
+
+        out = StringIO()
+        call_command('rebuild_payloads', stdout=out)
+        self.assertIn('4 lists rebuilt', out.getvalue())
+        self.assertIn('new-package', content(self.get('packages')))
+        rebuilt = ApiPayload.objects.get(name='packages')
+        self.assertEquals(2, rebuilt.version)
+        self.assertNotEqual(payload.etag, rebuilt.etag)
+
+    def test_expired(self):
+        self.get('packages')
+        # missing lists are built as well
+        self.assertEquals(['domains', 'gittrees', 'products'],
+                          payloads.rebuild_expired())
+        # not by models, so nothing marks them stale
+        Package.objects.bulk_create([Package(name='new-package')])
+        ApiPayload.objects.filter(name='packages').update(
+            built=timezone.now() - timedelta(days=1))
+        self.assertNotIn('new-package', [
+            i['name'] for i in self.get('packages').data])
+
+        self.assertEquals(['packages'], payloads.rebuild_expired())
+        self.assertIn('new-package', [
+            i['name'] for i in self.get('packages').data])
+        self.assertEquals([], payloads.rebuild_expired())
+
+    def stale(self):
+        return sorted(ApiPayload.objects.filter(stale=True).values_list(
+            'name', flat=True))
+
+    def test_web_ui_edits_mark_stale(self):
+        payloads.rebuild()
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+        self.assertEquals([], self.stale())
+
+        package = Package.objects.create(name='ui-package')
+        payloads.rebuild()
+        self.client.get(reverse('package.delete', args=(package.pk,)))
+        self.assertFalse(Package.objects.filter(name='ui-package').exists())
+        self.assertEquals(4, len(self.stale()))
+        self.assertIn('ui-package', content(self.get('packages')))
+
+        call_command('rebuild_payloads', stdout=StringIO())
+        self.assertNotIn('ui-package', content(self.get('packages')))
+
+    def test_relations_and_users_mark_stale(self):
+        payloads.rebuild()
+        GitTree.objects.get(pk=1).packages.add(
+            Package.objects.create(name='p'))
+        self.assertEquals(4, len(self.stale()))
+
+        payloads.rebuild()
+        user = User.objects.get(username='alice')
+        user.save(update_fields=['last_login'])
+        self.assertEquals([], self.stale())
+        DomainRole.objects.create(name='d', role='ARCHITECT',
+                                  domain_id=1).user_set.add(user)
+        payloads.rebuild()
+        user.first_name = 'Alicia'
+        user.save()
+        self.assertEquals(4, len(self.stale()))
+
+    def test_loader_does_not_mark_stale(self):
+        payloads.rebuild()
+        get_default_loader(bulk=True).sync_entity(
+            [{'name': 'loaded'}], Package)()
+        self.assertEquals(['loaded'], list(
+            Package.objects.values_list('name', flat=True)))
+        self.assertEquals([], self.stale())
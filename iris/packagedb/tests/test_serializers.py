@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Tests of number of queries of the packagedb serializers
+"""
+
+#pylint: disable=no-member,missing-docstring,invalid-name
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from iris.core.models import (
+    Domain, SubDomain, GitTree, DomainRole, SubDomainRole, GitTreeRole)
+from iris.packagedb.apiviews import DomainViewSet, GitTreeViewSet
+from iris.packagedb.serializers import DomainSerializer, GitTreeSerializer
+
+
+class SerializerQueriesTest(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(
+            username='user%d' % i, email='user%d@a.com' % i)
+                      for i in range(3)]
+
+    def add_objects(self, num):
+        """
+        Add `num` domains with a subdomain and a git tree, which have roles
+        """
+        for i in range(Domain.objects.count(), Domain.objects.count() + num):
+            domain = Domain.objects.create(name='domain%d' % i)
+            uncategorized = SubDomain.objects.create(
+                name='Uncategorized', domain=domain)
+            subdomain = SubDomain.objects.create(name='sub', domain=domain)
+            for role in ('ARCHITECT', 'MAINTAINER'):
+                DomainRole.objects.create(
+                    name='d%d%s' % (i, role), role=role,
+                    domain=domain).user_set.add(*self.users)
+                SubDomainRole.objects.create(
+                    name='s%d%s' % (i, role), role=role,
+                    subdomain=subdomain).user_set.add(*self.users[:2])
+            for subdomain in (uncategorized, subdomain):
+                tree = GitTree.objects.create(
+                    gitpath='tree/%d/%s' % (i, subdomain.name),
+                    subdomain=subdomain)
+                GitTreeRole.objects.create(
+                    name='%s:DEVELOPER' % tree.gitpath, role='DEVELOPER',
+                    gittree=tree).user_set.add(self.users[0])
+
+    def assert_fixed_queries(self, viewset, num):
+        for _ in range(2):
+            self.add_objects(3)
+            with self.assertNumQueries(num):
+                data = viewset.serializer_class(
+                    viewset.queryset.all(), many=True).data
+        return data
+
+    def test_gittrees(self):
+        # gittrees, packages, licenses and users of roles
+        data = self.assert_fixed_queries(GitTreeViewSet, 4)
+        self.assertEquals(12, len(data))
+        self.assertEquals({'Developer': [{
+            'first_name': '', 'last_name': '', 'email': 'user0@a.com'}]},
+                          data[0]['roles'])
+
+    def test_domains(self):
+        # subdomains and users of domain and subdomain roles
+        data = self.assert_fixed_queries(DomainViewSet, 3)
+        self.assertEquals(12, len(data))
+        roles = {i['name']: i['roles'] for i in data}
+        self.assertEquals(
+            ['user0@a.com', 'user1@a.com', 'user2@a.com'],
+            [i['email'] for i in roles['domain0 / Uncategorized']['Architect']])
+        self.assertEquals(
+            ['user0@a.com', 'user1@a.com'],
+            [i['email'] for i in roles['domain0 / sub']['Maintainer']])
+
+    def test_same_as_model_roles(self):
+        self.add_objects(2)
+        fields = ('first_name', 'last_name', 'email')
+        for tree in GitTree.objects.all():
+            self.assertEquals(tree.roles(*fields),
+                              GitTreeSerializer(tree).data['roles'])
+        for subdomain in SubDomain.objects.all():
+            owner = subdomain.domain if subdomain.name == 'Uncategorized' \
+                else subdomain
+            self.assertEquals(owner.roles(*fields),
+                              DomainSerializer(subdomain).data['roles'])
+
+    def test_objects_iterated_once_per_role_model(self):
+        self.add_objects(3)
+        for viewset, num in ((GitTreeViewSet, 1), (DomainViewSet, 2)):
+            calls = []
+
+            class Counting(viewset.serializer_class):
+                def objects(self):
+                    calls.append(1)
+                    return super(Counting, self).objects()
+
+            data = Counting(viewset.queryset.all(), many=True).data
+            self.assertEquals(6, len(data))
+            self.assertEquals(num, len(calls))
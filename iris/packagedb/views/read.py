@@ -22,7 +22,7 @@ from django.conf import settings
 from iris.core.models import (Domain, SubDomain, License, GitTree, Package,
         Product, Image)
 from iris.packagedb.injectors import (inject_domain, inject_subdomain,
-        inject_gittree)
+        inject_subdomains, inject_gittree)
 
 
 def domain(request, pkid=None):
@@ -42,7 +42,7 @@ def subdomain(request, pkid=None):
         return render(request, 'packagedb/read/single/subdomain.html',
                 {'subdomain': _subdomain})
     else:
-        _subdomains = [inject_subdomain(d) for d in SubDomain.objects.all()]
+        _subdomains = inject_subdomains(SubDomain.objects.all())
         return render(request, 'packagedb/read/multiple/subdomains.html',
                 {'subdomains': _subdomains})
 
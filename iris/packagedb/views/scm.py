@@ -21,13 +21,13 @@ import logging
 
 from django.contrib.auth.decorators import login_required, permission_required
 from django.db.transaction import atomic
-from django.core.cache import cache
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 
 from iris.etl import scm
 from iris.etl.check import check_scm
+from iris.packagedb import payloads
 
 log = logging.getLogger(__name__)
 
@@ -50,7 +50,9 @@ def update(request):
             scm_str = ''.join([domains_str, os.linesep, os.linesep,
                                gittrees_str])
             scm.from_string(scm_str)
-            cache.clear()
+            # the next incremental import can't diff with the last one
+            scm.reset_state()
+            payloads.rebuild()
             detail = 'Successful!'
             code = status.HTTP_200_OK
         else:
@@ -20,6 +20,9 @@ from django.conf.urls import patterns, url, include
 
 urlpatterns = patterns(
     'iris.submissions.views.events',
+    url(r'events/batch/$', 'batch_events_handler',
+        name='submissions_events_batch'),
+    url(r'events/queue/$', 'queue_stats', name='submissions_events_queue'),
     url(r'events/(.*?)/', 'events_handler', name='submissions_events'),
     )
 
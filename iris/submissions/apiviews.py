@@ -20,9 +20,11 @@ import json
 
 from rest_framework.decorators import api_view
 from django.db.models import Q
-from django.http import HttpResponse, HttpResponseNotFound
+from django.http import (
+    HttpResponse, HttpResponseNotFound, HttpResponseBadRequest)
 
 from iris.core.models import (BuildGroup, SubmissionGroup, Submission)
+from iris.core.pagination import keyset_page, parse_limit
 
 
 def get_query(product_name=None, status=None):
@@ -45,11 +47,14 @@ def get_query(product_name=None, status=None):
 
 def get_active_submissions(request, product_name=None):
     '''
-    return active Submission list
+    return (active Submission list, cursor of the next page)
 
     active means: submission related with pre-release project, and also
     the project has not been accepted or rejected.
 
+    If `limit` or `after` is in request parameters, only a page of build
+    groups ordered by (updated, name) descendingly is returned, otherwise
+    all of them sorted by submission name and cursor is None.
     '''
     if 'status' in request.GET:
         status = request.GET['status']
@@ -57,12 +62,18 @@ def get_active_submissions(request, product_name=None):
         status = None
     bgs = BuildGroup.objects.filter(
         get_query(product_name, status)
-        ).prefetch_related(
+        ).distinct().prefetch_related(
             'submissionbuild_set__submission__gittree',
             'submissionbuild_set__product')
 
+    paged = 'limit' in request.GET or 'after' in request.GET
+    cursor = None
+    if paged:
+        bgs, cursor = keyset_page(bgs, request.GET.get('after'),
+                                  parse_limit(request.GET.get('limit')))
+
     sub_list = []
-    for bdg in set(bgs):
+    for bdg in bgs if paged else set(bgs):
         sub_dict = dict()
         if bdg.submissions:
             # becuase submissions are deleted by merging user, then now some
@@ -73,21 +84,39 @@ def get_active_submissions(request, product_name=None):
             if product_name is None:
                 sub_dict['product'] = bdg.product.name
             sub_list.append(sub_dict)
-    sub_list = sorted(sub_list, key=lambda dict: dict['submission'])
-    return sub_list
+    if not paged:
+        sub_list = sorted(sub_list, key=lambda dict: dict['submission'])
+    return sub_list, cursor
+
+
+def list_response(request, product_name=None):
+    """
+    Response of active submissions with a Link header to the next page
+    """
+    try:
+        sub_list, cursor = get_active_submissions(request, product_name)
+    except ValueError as err:
+        return HttpResponseBadRequest(
+            json.dumps({'detail': str(err)}),
+            content_type="application/json")
+    response = HttpResponse(json.dumps(sub_list),
+                            content_type="application/json")
+    if cursor:
+        params = request.GET.copy()
+        params['after'] = cursor
+        response['Link'] = '<%s>; rel="next"' % request.build_absolute_uri(
+            '?%s' % params.urlencode())
+    return response
 
 
 @api_view(['GET'])
 def list_submissions(request):
-    return HttpResponse(json.dumps(get_active_submissions(request)),
-                        content_type="application/json")
+    return list_response(request)
 
 
 @api_view(['GET'])
 def list_submissions_by_product(request, project):
-    return HttpResponse(
-        json.dumps(get_active_submissions(request, project)),
-        content_type="application/json")
+    return list_response(request, project)
 
 
 @api_view(['GET'])
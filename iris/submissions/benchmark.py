@@ -0,0 +1,341 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Replay submission events and measure how fast they are handled.
+
+Events are read from an events log (the lines printed by events_handler)
+or synthesized, then sent in order at a target rate, by one or more
+worker threads. Events of the same submission are always sent by the same
+worker, so they are handled in the order they were generated.
+
+Events can be sent to the handlers in this process (LocalSender), which
+writes to the configured database and counts queries and deadlock
+retries, so it's only for test databases, or to a running instance by HTTP
+(HttpSender).
+
+See "manage.py replay_events --help".
+"""
+# pylint: disable=E1101
+import ast
+import math
+import time
+import random
+import logging
+import threading
+from datetime import datetime
+from collections import defaultdict
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from iris.submissions.queue import shard_worker
+
+EVENTS_PATH = '/api/submissions/events/%s/'
+
+
+def parse_events_log(stream):
+    """
+    Yields (type, data) of events from lines of events log like:
+
+      [time] [:error] [pid 1] events|/api/submissions/events/submitted/|[...]
+    """
+    for line in stream:
+        _, path, param = line.rstrip().split('|')
+        typ = path.rstrip('/').split('/')[-1]
+        data = dict(ast.literal_eval(param))
+        yield typ, data
+
+
+def submission_events(tag, gitpath, products, repos, arches, packages,
+                      images, failures, rand):
+    """
+    Events of one submission: submitted, then for each product its
+    pre-release project is created, packages and images are built and it's
+    accepted at last
+    """
+    yield 'submitted', {
+        'tag': tag, 'gitpath': gitpath,
+        'commit_id': '%040x' % rand.getrandbits(160),
+        'submitter_email': 'benchmark@localhost',
+        }
+    server = 'http://build.localhost'
+    for product in products:
+        project = 'home:prerelease:%s:%s' % (product, tag.replace('/', ':'))
+        yield 'pre_created', {
+            'tag': tag, 'gitpath': gitpath, 'product': product,
+            'project': project,
+            }
+        for i in range(packages):
+            for repo in repos:
+                for arch in arches:
+                    built = {'project': project, 'name': 'package%d' % i,
+                             'repo': repo, 'arch': arch,
+                             'repo_server': server,
+                             'status': 'OBS_BUILD_SUCCESS'}
+                    if rand.random() < failures:
+                        # failed and rebuilt
+                        yield 'package_built', dict(
+                            built, status='OBS_BUILD_FAIL')
+                    yield 'package_built', built
+        for i in range(images):
+            for repo in repos:
+                name = 'image%d-%s' % (i, repo)
+                yield 'image_building', {
+                    'project': project, 'name': name, 'repo': repo}
+                yield 'image_created', {
+                    'project': project, 'name': name, 'status': 'success',
+                    'url': '%s/images/%s/%s' % (server, repo, name)}
+        yield 'repa_action', {
+            'project': project, 'status': 'accepted',
+            'who': 'benchmark@localhost', 'reason': 'benchmark'}
+
+
+def synthesize(submissions=10, gitpath='platform/upstream/bluez',
+               products=('Tizen:IVI', 'Tizen:Common'),
+               repos=('standard',), arches=('i586', 'x86_64'),
+               packages=1, images=1, failures=0.0, seed=0):
+    """
+    Yields (type, data) of events of `submissions` submissions, which are
+    built for each of `products`, with `packages` packages built for each
+    of `repos` and `arches` and `images` images built for each of `repos`.
+    A fraction `failures` of package builds fails before it succeeds.
+
+    Events of submissions are interleaved like they are in production.
+    """
+    rand = random.Random(seed)
+    prefix = datetime.now().strftime('submit/benchmark/%Y%m%d.%H%M%S')
+    streams = [submission_events(
+        '%s.%d' % (prefix, i), gitpath, products, repos, arches, packages,
+        images, failures, rand) for i in range(submissions)]
+    while streams:
+        for stream in list(streams):
+            try:
+                yield next(stream)
+            except StopIteration:
+                streams.remove(stream)
+
+
+def shard_keys(events):
+    """
+    Yields (key, type, data) of `events`, events of the same submission
+    have the same key
+    """
+    tags = {}
+    for typ, data in events:
+        project = data.get('project')
+        if data.get('tag'):
+            key = data['tag']
+            if project:
+                tags[project] = key
+        else:
+            key = tags.get(project, project or '')
+        yield key, typ, data
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of sorted `values`
+    """
+    if not values:
+        return 0
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+
+class Report(object):
+    """
+    Latencies, query counts and status codes of replayed events
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.deadlocks = None  # unknown when sent by HTTP
+        self.elapsed = 0.0
+
+    def add(self, typ, latency, status, queries=None):
+        with self.lock:
+            self.latencies[typ].append(latency)
+            if queries is not None:
+                self.queries[typ].append(queries)
+            if not 200 <= status < 300:
+                self.errors[typ] += 1
+
+    @property
+    def count(self):
+        return sum(len(i) for i in self.latencies.values())
+
+    def summary(self):
+        """
+        Returns a dict of totals and per event type statistics, latencies
+        are in milliseconds
+        """
+        types = {}
+        for typ, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            queries = self.queries.get(typ)
+            types[typ] = {
+                'count': len(latencies),
+                'errors': self.errors.get(typ, 0),
+                'p50': percentile(latencies, 50) * 1000,
+                'p95': percentile(latencies, 95) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'queries': float(sum(queries)) / len(queries)
+                           if queries else None,
+                'max_queries': max(queries) if queries else None,
+                }
+        return {
+            'events': self.count,
+            'errors': sum(self.errors.values()),
+            'seconds': self.elapsed,
+            'throughput': self.count / self.elapsed if self.elapsed else 0,
+            'deadlocks': self.deadlocks,
+            'types': types,
+            }
+
+    def format(self):
+        summary = self.summary()
+        if summary['deadlocks'] is None:
+            summary['deadlocks'] = 'unknown'
+        lines = [
+            '%(events)d events in %(seconds).2fs, %(throughput).1f events/s, '
+            '%(errors)d errors, %(deadlocks)s deadlock retries' % summary,
+            '%-20s %7s %7s %9s %9s %9s %8s %8s' % (
+                'type', 'count', 'errors', 'p50(ms)', 'p95(ms)', 'p99(ms)',
+                'queries', 'max'),
+            ]
+        for typ, stat in sorted(summary['types'].items()):
+            queries = ('%8.1f %8d' % (stat['queries'], stat['max_queries'])
+                       if stat['queries'] is not None else
+                       '%8s %8s' % ('-', '-'))
+            lines.append('%-20s %7d %7d %9.1f %9.1f %9.1f %s' % (
+                typ, stat['count'], stat['errors'], stat['p50'],
+                stat['p95'], stat['p99'], queries))
+        return '\n'.join(lines)
+
+
+class DeadlockCounter(logging.Handler):
+    """
+    Counts deadlock retries logged by events handlers
+    """
+    def __init__(self):
+        logging.Handler.__init__(self, logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if record.getMessage().startswith('Deadlock found'):
+            self.count += 1
+
+
+class LocalSender(object):
+    """
+    Applies events by handlers in this process, counting queries
+    """
+    deadlocks = None
+
+    def __init__(self):
+        from iris.submissions.views import events
+        self.events = events
+
+    def __call__(self, typ, data):
+        handler = self.events.HANDLERS.get(typ)
+        if handler is None:
+            return 406, 0
+        with CaptureQueriesContext(connection) as queries:
+            response = self.events.retry_on_deadlock(handler, data)
+        return response.status_code, len(queries)
+
+    def __enter__(self):
+        self.deadlocks = DeadlockCounter()
+        logging.getLogger(self.events.__name__).addHandler(self.deadlocks)
+        return self
+
+    def __exit__(self, *exc_info):
+        logging.getLogger(self.events.__name__).removeHandler(
+            self.deadlocks)
+
+    @staticmethod
+    def close():
+        connection.close()
+
+
+class HttpSender(object):
+    """
+    Posts events to a running instance at `server`
+    """
+    deadlocks = None
+
+    def __init__(self, server, username, password):
+        import requests
+        self.requests = requests
+        self.url = server.rstrip('/') + EVENTS_PATH
+        self.auth = (username, password)
+        self.local = threading.local()
+
+    def __call__(self, typ, data):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+            session.auth = self.auth
+        return session.post(self.url % typ, data).status_code, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def close(self):
+        session = getattr(self.local, 'session', None)
+        if session is not None:
+            session.close()
+
+
+def replay(events, sender, rate=None, concurrency=1):
+    """
+    Send `events` by `sender` at most `rate` events per second by
+    `concurrency` threads, returns a Report
+    """
+    events = list(shard_keys(events))
+    report = Report()
+    queues = defaultdict(list)
+    for index, (key, typ, data) in enumerate(events):
+        queues[shard_worker(key, concurrency)].append((index, typ, data))
+
+    def work(items):
+        for index, typ, data in items:
+            if rate:
+                delay = start + index / float(rate) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            begin = time.time()
+            status, queries = sender(typ, data)
+            report.add(typ, time.time() - begin, status, queries)
+
+    def work_thread(items):
+        try:
+            work(items)
+        finally:
+            sender.close()
+
+    with sender:
+        start = time.time()
+        if concurrency == 1:
+            work(queues[0])
+        else:
+            threads = [threading.Thread(target=work_thread, args=(items,))
+                       for items in queues.values()]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        report.elapsed = time.time() - start
+        if sender.deadlocks is not None:
+            report.deadlocks = sender.deadlocks.count
+    return report
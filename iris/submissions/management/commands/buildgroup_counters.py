@@ -0,0 +1,51 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Rebuild or verify the build counters of build groups
+"""
+# pylint: disable=E1101
+from optparse import make_option
+
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from iris.core.models import BuildGroup
+
+
+class Command(BaseCommand):
+    help = ('Rebuild counters of package and image builds of build groups '
+            'from scratch, or report wrong counters by --verify')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--verify', action='store_true', default=False,
+                    help="Only report wrong counters, don't update them"),
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            with transaction.atomic():
+                count = BuildGroup.update_counters()
+            self.stdout.write('%d build groups updated' % count)
+            return
+
+        counted = BuildGroup.count_builds()
+        wrong = []
+        for row in BuildGroup.objects.values(
+                'pk', 'name', *BuildGroup.COUNTERS).order_by('pk'):
+            pk, name = row.pop('pk'), row.pop('name')
+            if counted[pk] != row:
+                wrong.append((pk, name, row, counted[pk]))
+        for pk, name, current, expected in wrong:
+            self.stdout.write('%d %s: %s' % (pk, name, ', '.join(
+                '%s %d, expected %d' % (key, current[key], expected[key])
+                for key in BuildGroup.COUNTERS
+                if current[key] != expected[key])))
+        if wrong:
+            raise CommandError('%d of %d build groups have wrong counters' % (
+                len(wrong), len(counted)))
+        self.stdout.write('All %d build groups are OK' % len(counted))
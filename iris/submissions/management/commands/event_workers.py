@@ -0,0 +1,37 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Apply queued submission events
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from iris.submissions import queue
+
+
+class Command(BaseCommand):
+    help = ('Run workers applying submission events queued when '
+            'EVENTS_QUEUED is set')
+
+    option_list = BaseCommand.option_list + (
+        make_option('-w', '--workers', type='int', default=4,
+                    help='Number of worker threads'),
+        make_option('--interval', type='float', default=1,
+                    help='Seconds to wait when the queue is empty'),
+        make_option('--once', action='store_true', default=False,
+                    help='Apply available events and exit'),
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = queue.process()
+            self.stdout.write('%d events tried, %s' % (
+                count, queue.METRICS.snapshot()))
+            return
+        queue.run(options['workers'], options['interval'])
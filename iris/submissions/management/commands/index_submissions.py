@@ -0,0 +1,26 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Rebuild the search index of submissions
+"""
+# pylint: disable=E1101
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from iris.core.models import SubmissionTrigram
+
+
+class Command(BaseCommand):
+    help = ('Rebuild trigram search index of submissions, which is needed '
+            'once for submissions created before the index existed')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            SubmissionTrigram.objects.all().delete()
+            count = SubmissionTrigram.index()
+        self.stdout.write('%d submissions indexed' % count)
@@ -0,0 +1,101 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Replay or synthesize submission events and report how fast they are handled
+"""
+import sys
+import json
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from iris.submissions import benchmark
+
+
+def split_list(option, _opt, value, parser):
+    setattr(parser.values, option.dest, value.split(','))
+
+
+class Command(BaseCommand):
+    args = '[events.log]'
+    help = ('Replay events from an events log ("-" for stdin), or synthesize '
+            'them by --submissions, and report throughput, latency and query '
+            'counts per event type. Events are sent to --server, or with '
+            '--local they are applied to the configured database in this '
+            'process, which must not be a production one.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--submissions', type='int', default=0,
+                    help='Synthesize events of this number of submissions'),
+        make_option('--gitpath', default='platform/upstream/bluez',
+                    help='Git tree of synthesized submissions'),
+        make_option('--products', type='string', action='callback',
+                    callback=split_list,
+                    default=['Tizen:IVI', 'Tizen:Common'],
+                    help='Comma separated products of each submission'),
+        make_option('--repos', type='string', action='callback',
+                    callback=split_list, default=['standard'],
+                    help='Comma separated repos of each product'),
+        make_option('--arches', type='string', action='callback',
+                    callback=split_list, default=['i586', 'x86_64'],
+                    help='Comma separated arches of each repo'),
+        make_option('--packages', type='int', default=1,
+                    help='Number of packages built in each product'),
+        make_option('--images', type='int', default=1,
+                    help='Number of images built for each repo'),
+        make_option('--failures', type='float', default=0.0,
+                    help='Fraction of package builds failed then rebuilt'),
+        make_option('--rate', type='float', default=0,
+                    help='Events sent per second, unlimited by default'),
+        make_option('-c', '--concurrency', type='int', default=1,
+                    help='Number of threads sending events'),
+        make_option('--server',
+                    help='Send events to the IRIS instance at this URL'),
+        make_option('--local', action='store_true', default=False,
+                    help='Apply events to the configured database in '
+                    'this process, never use it on production'),
+        make_option('-u', '--username', help='Username of --server'),
+        make_option('-p', '--password', help='Password of --server'),
+        make_option('--json', action='store_true', default=False,
+                    help='Report in JSON'),
+        )
+
+    def handle(self, *args, **options):
+        if not options['server'] and not options['local']:
+            raise CommandError(
+                'Give --server, or --local to write events to the '
+                'configured database %s' % settings.DATABASES[
+                    'default']['NAME'])
+        if options['submissions']:
+            events = list(benchmark.synthesize(
+                options['submissions'], options['gitpath'],
+                options['products'], options['repos'], options['arches'],
+                options['packages'], options['images'],
+                options['failures']))
+        elif len(args) == 1:
+            if args[0] == '-':
+                events = list(benchmark.parse_events_log(sys.stdin))
+            else:
+                with open(args[0]) as reader:
+                    events = list(benchmark.parse_events_log(reader))
+        else:
+            raise CommandError('Give an events log or --submissions')
+
+        if options['server']:
+            sender = benchmark.HttpSender(
+                options['server'], options['username'], options['password'])
+        else:
+            sender = benchmark.LocalSender()
+
+        report = benchmark.replay(events, sender, options['rate'],
+                                  options['concurrency'])
+        if options['json']:
+            self.stdout.write(json.dumps(report.summary(), indent=2))
+        else:
+            self.stdout.write(report.format())
@@ -0,0 +1,47 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Backfill or verify the derived state field of submissions
+"""
+# pylint: disable=E1101
+from optparse import make_option
+
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from iris.core.models import Submission
+
+
+class Command(BaseCommand):
+    help = ('Update Submission.state from build groups of submissions, '
+            'or report submissions whose state is out of date by --verify')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--verify', action='store_true', default=False,
+                    help="Only report wrong states, don't update them"),
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            with transaction.atomic():
+                count = Submission.update_states()
+            self.stdout.write('%d submissions updated' % count)
+            return
+
+        derived = Submission.derive_states()
+        wrong = [(pk, name, state, derived[pk])
+                 for pk, name, state in Submission.objects.values_list(
+                     'pk', 'name', 'state').order_by('pk')
+                 if derived[pk] != state]
+        for pk, name, state, expected in wrong:
+            self.stdout.write('%d %s: %s, expected %s' % (
+                pk, name, state, expected))
+        if wrong:
+            raise CommandError('%d of %d submissions have wrong state' % (
+                len(wrong), len(derived)))
+        self.stdout.write('All %d submissions are OK' % len(derived))
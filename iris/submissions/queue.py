@@ -0,0 +1,226 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+"""
+Workers applying queued submission events.
+
+When settings.EVENTS_QUEUED is set, the events API stores events in
+QueuedEvent and responds at once. Workers here apply them in background.
+
+Events are sharded by pre-release project. Each shard is owned by one worker
+thread, which applies the events of the shard in the order they were
+received. If an event fails by an error or a 5xx response, it's retried
+with exponential backoff, and later events of its shard wait for it, until
+it fails MAX_ATTEMPTS times and is marked as FAILED.
+
+Events rejected by a 4xx response, such as invalid parameters, are marked
+as FAILED at once, unless an earlier event of another shard is still
+pending. Such an event may be the one it depends on, for example the
+submission of a pre-release project, so it's retried as well.
+
+Only one worker process ("manage.py event_workers") should run at a time,
+otherwise the order of events in a shard isn't guaranteed.
+"""
+# pylint: disable=E1101,W0703
+import json
+import zlib
+import time
+import logging
+import threading
+from datetime import timedelta
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Min
+from django.utils import timezone
+
+from iris.core.models import QueuedEvent
+from iris.submissions.views.events import HANDLERS, retry_on_deadlock
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+# delay of retries in seconds: 5, 10, 20, ... at most 10 minutes
+BACKOFF = 5
+MAX_BACKOFF = 600
+# number of shard heads read by one query
+BATCH_SIZE = 500
+
+
+def shard_worker(shard, workers):
+    """
+    Index of the worker which owns `shard`
+    """
+    return (zlib.crc32(shard.encode('utf8')) & 0xffffffff) % workers
+
+
+def backoff(attempts):
+    """
+    Seconds to wait before the next attempt
+    """
+    return min(BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+class Metrics(object):
+    """
+    Counters of events applied by workers in this process
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.latency = 0.0  # sum of seconds from queued to applied
+
+    def count(self, name, latency=None):
+        with self.lock:
+            self.counters[name] += 1
+            if latency is not None:
+                self.latency += latency
+
+    def snapshot(self):
+        """
+        Returns counters and mean latency of applied events, and resets them
+        """
+        with self.lock:
+            counters, latency = dict(self.counters), self.latency
+            self.counters.clear()
+            self.latency = 0.0
+        applied = counters.get('applied', 0)
+        counters['mean_latency'] = latency / applied if applied else 0
+        return counters
+
+
+METRICS = Metrics()
+
+
+def heads(worker, workers, now=None):
+    """
+    The first pending event of each shard owned by `worker`, skipping
+    shards whose first event is waiting to be retried
+    """
+    now = now or timezone.now()
+    pks = sorted(
+        pk for shard, pk in QueuedEvent.objects.filter(
+            status='PENDING').values('shard').annotate(
+                head=Min('id')).values_list('shard', 'head')
+        if shard_worker(shard, workers) == worker)
+    for i in range(0, len(pks), BATCH_SIZE):
+        for event in QueuedEvent.objects.filter(
+                pk__in=pks[i:i + BATCH_SIZE],
+                available__lte=now).order_by('id'):
+            yield event
+
+
+class EventRejected(Exception):
+    """
+    Handler of an event responded with an error status
+    """
+    def __init__(self, detail, status):
+        super(EventRejected, self).__init__(detail)
+        self.status = status
+
+
+def is_final(event, err):
+    """
+    Whether rejected `event` should not be retried: it's invalid and no
+    earlier event it may depend on is pending
+    """
+    return err.status < 500 and not QueuedEvent.objects.filter(
+        status='PENDING', id__lt=event.pk).exclude(
+            shard=event.shard).exists()
+
+
+def apply_event(event):
+    """
+    Apply an event and delete it from the queue in one transaction if
+    succeeded, otherwise roll back and schedule a retry. Returns whether
+    it succeeded.
+    """
+    def _apply():
+        response = HANDLERS[event.typ](json.loads(event.data))
+        if not 200 <= response.status_code < 300:
+            raise EventRejected(response.data['detail'],
+                                response.status_code)
+        event.delete()
+
+    error, final = None, False
+    try:
+        retry_on_deadlock(_apply)
+    except EventRejected as err:
+        error = str(err)
+        final = is_final(event, err)
+    except Exception as err:
+        logger.exception('Failed to apply event %s', event.pk)
+        error = str(err)
+
+    if error is None:
+        METRICS.count('applied', (
+            timezone.now() - event.created).total_seconds())
+        return True
+
+    event.attempts += 1
+    event.error = error
+    if final or event.attempts >= MAX_ATTEMPTS:
+        event.status = 'FAILED'
+        METRICS.count('failed')
+        logger.error('Event %s %s failed %d times, give up: %s', event.pk,
+                     event.typ, event.attempts, error)
+    else:
+        event.available = timezone.now() + timedelta(
+            seconds=backoff(event.attempts))
+        METRICS.count('retried')
+    event.save()
+    return False
+
+
+def process(worker=0, workers=1):
+    """
+    Apply available events of shards owned by `worker`, returns the number
+    of events tried
+    """
+    count = 0
+    while True:
+        events = list(heads(worker, workers))
+        if not events:
+            return count
+        for event in events:
+            apply_event(event)
+        count += len(events)
+
+
+def run_worker(worker, workers, stop, interval=1):
+    """
+    Loop of a worker thread until `stop` is set
+    """
+    try:
+        while not stop.is_set():
+            if not process(worker, workers):
+                stop.wait(interval)
+    finally:
+        connection.close()
+
+
+def run(workers=4, interval=1, report=60):
+    """
+    Run worker threads and log metrics every `report` seconds until
+    interrupted
+    """
+    stop = threading.Event()
+    threads = [threading.Thread(target=run_worker,
+                                args=(i, workers, stop, interval))
+               for i in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        while all(thread.is_alive() for thread in threads):
+            time.sleep(report)
+            logger.info('Event workers: %s, queue: %s',
+                        METRICS.snapshot(), QueuedEvent.stats())
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
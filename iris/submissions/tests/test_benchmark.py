@@ -0,0 +1,86 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+#pylint: disable=missing-docstring,invalid-name
+
+import os
+import json
+from StringIO import StringIO
+from collections import Counter
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from iris.core.models import Submission, BuildGroup
+from iris.submissions import benchmark
+
+
+class BenchmarkTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees', 'products']
+
+    def test_replay_synthesized(self):
+        events = list(benchmark.synthesize(
+            3, products=['Tizen:IVI'], arches=['i586', 'x86_64'],
+            failures=0.5))
+        report = benchmark.replay(events, benchmark.LocalSender())
+
+        summary = report.summary()
+        self.assertEquals(len(events), summary['events'])
+        self.assertEquals(0, summary['errors'])
+        self.assertEquals(0, summary['deadlocks'])
+        self.assertEquals(3, summary['types']['submitted']['count'])
+        self.assertTrue(summary['types']['package_built']['queries'] > 0)
+        self.assertEquals(3, Submission.objects.filter(
+            name__startswith='submit/benchmark/', state='accepted').count())
+        self.assertEquals(0, BuildGroup.update_counters())
+
+    def test_command_replay_log(self):
+        out = StringIO()
+        call_command('replay_events', os.path.join(
+            os.path.dirname(__file__), 'events.log'), local=True, json=True,
+                     stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEquals(59, summary['events'])
+        self.assertEquals(0, summary['errors'])
+
+    def test_command_refuses_local_by_default(self):
+        self.assertRaises(CommandError, call_command, 'replay_events',
+                          submissions=1)
+        self.assertEquals(0, Submission.objects.count())
+
+
+def test_synthesize():
+    events = list(benchmark.synthesize(
+        2, products=['A', 'B'], repos=['r1', 'r2'], arches=['i586'],
+        packages=2, images=1))
+    counts = Counter(typ for typ, _ in events)
+    assert counts == {'submitted': 2, 'pre_created': 4,
+                      'package_built': 16, 'image_building': 8,
+                      'image_created': 8, 'repa_action': 4}
+    # submissions are interleaved
+    assert [typ for typ, _ in events[:2]] == ['submitted', 'submitted']
+
+
+def test_shard_keys():
+    events = [('submitted', {'tag': 't1'}),
+              ('pre_created', {'tag': 't1', 'project': 'p1'}),
+              ('package_built', {'project': 'p1'}),
+              ('package_built', {'project': 'p2'}),
+              ('snapshot_start', {'buildid': 'b1'})]
+    assert [key for key, _, _ in benchmark.shard_keys(events)] == \
+        ['t1', 't1', 't1', 'p2', '']
+
+
+def test_percentile():
+    values = range(1, 101)
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([3], 95) == 3
+    assert benchmark.percentile([], 50) == 0
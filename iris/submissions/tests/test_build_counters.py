@@ -0,0 +1,108 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+#pylint: disable=missing-docstring,invalid-name,no-member
+
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from iris.core.models import BuildGroup, PackageBuild, ImageBuild, Package
+
+
+class BuildCountersTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees', 'products',
+                'submissions']
+
+    def setUp(self):
+        self.group = BuildGroup.objects.create(
+            name='home:prerelease:counters', status='10_PKGBUILDING')
+        self.packages = [Package.objects.create(name='pkg%d' % i)
+                         for i in range(3)]
+
+    def counters(self):
+        return BuildGroup.objects.filter(pk=self.group.pk).values(
+            *BuildGroup.COUNTERS)[0]
+
+    def package_built(self, package, status, arch='i586'):
+        """Same steps as event package_built"""
+        group = BuildGroup.objects.get(pk=self.group.pk)
+        group.check_packages_status(PackageBuild(
+            package=package, repo='standard', arch=arch, group=group,
+            status=status))
+        pbuild, created = PackageBuild.objects.get_or_create(
+            package=package, repo='standard', arch=arch, group=group,
+            defaults={'status': status})
+        if not created:
+            pbuild.status = status
+            pbuild.save()
+        return BuildGroup.objects.get(pk=self.group.pk).status
+
+    def test_package_counters(self):
+        for package in self.packages:
+            self.assertEquals('10_PKGBUILDING',
+                              self.package_built(package, 'SUCCESS'))
+        self.assertEquals('15_PKGFAILED',
+                          self.package_built(self.packages[0], 'FAILURE',
+                                             'x86_64'))
+        self.assertEquals(3, self.counters()['packages_succeeded'])
+        self.assertEquals(1, self.counters()['packages_failed'])
+
+        # rebuilt
+        self.assertEquals('10_PKGBUILDING',
+                          self.package_built(self.packages[0], 'SUCCESS',
+                                             'x86_64'))
+        self.assertEquals(4, self.counters()['packages_succeeded'])
+        self.assertEquals(0, self.counters()['packages_failed'])
+
+    def test_image_counters(self):
+        group = self.group
+        for name in ('a', 'b'):
+            group.check_images_status(ImageBuild(name=name, group=group,
+                                                 status='BUILDING'))
+            ImageBuild.objects.create(name=name, group=group,
+                                      status='BUILDING')
+        self.assertEquals(2, self.counters()['images_building'])
+
+        ibuild = ImageBuild.objects.get(name='a')
+        ibuild.status = 'FAILURE'
+        group.check_images_status(ibuild)
+        ibuild.save()
+        self.assertEquals('25_IMGFAILED', BuildGroup.objects.get(
+            pk=group.pk).status)
+        self.assertEquals(1, self.counters()['images_building'])
+        self.assertEquals(1, self.counters()['images_failed'])
+
+        ibuild.delete()
+        self.assertEquals(0, self.counters()['images_failed'])
+
+    def test_save_group_keeps_counters(self):
+        stale = BuildGroup.objects.get(pk=self.group.pk)
+        self.package_built(self.packages[0], 'FAILURE')
+        stale.status = '33_ACCEPTED'
+        stale.save()
+        self.assertEquals(1, self.counters()['packages_failed'])
+
+    def test_command_rebuild_and_verify(self):
+        self.package_built(self.packages[0], 'FAILURE')
+        BuildGroup.objects.filter(pk=self.group.pk).update(
+            packages_failed=0, images_building=5)
+
+        out = StringIO()
+        self.assertRaises(CommandError, call_command, 'buildgroup_counters',
+                          verify=True, stdout=out)
+        self.assertIn('home:prerelease:counters: packages_failed 0, '
+                      'expected 1', out.getvalue())
+
+        call_command('buildgroup_counters', stdout=out)
+        self.assertIn('1 build groups updated', out.getvalue())
+        call_command('buildgroup_counters', verify=True, stdout=out)
+        self.assertIn('All 4 build groups are OK', out.getvalue())
@@ -0,0 +1,209 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+#pylint: disable=missing-docstring,invalid-name,no-member
+
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from iris.core.models import Submission, BuildGroup, QueuedEvent
+from iris.submissions import queue
+from iris.submissions.views.events import HANDLERS
+
+
+PROJECT = 'home:prerelease:tizen:ivi:submit:trunk:queued'
+
+
+@override_settings(EVENTS_QUEUED=True)
+class EventQueueTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees', 'products',
+                'submissions']
+    url = '/api/submissions/events/%s/'
+
+    def setUp(self):
+        assert self.client.login(username='robot', password='robot')
+        queue.METRICS.snapshot()
+
+    def post(self, typ, data):
+        return self.client.post(self.url % typ, data)
+
+    def submit(self, tag='submit/trunk/queued'):
+        self.assertEquals(202, self.post('submitted', {
+            'gitpath': 'framework/system/dlog', 'tag': tag,
+            'commit_id': 'sha1', 'submitter_email': 'someone@localhost',
+            }).status_code)
+
+    def pre_create(self, tag='submit/trunk/queued'):
+        self.assertEquals(202, self.post('pre_created', {
+            'gitpath': 'framework/system/dlog', 'tag': tag,
+            'product': 'Tizen:IVI', 'project': PROJECT,
+            }).status_code)
+
+    def accept(self):
+        self.assertEquals(202, self.post('repa_action', {
+            'project': PROJECT, 'status': 'accepted',
+            'who': 'robot@localhost', 'reason': 'good',
+            }).status_code)
+
+    def test_queued_and_applied_later(self):
+        self.submit()
+        self.assertFalse(Submission.objects.filter(
+            name='submit/trunk/queued').exists())
+        self.assertEquals('', QueuedEvent.objects.get().shard)
+
+        self.assertEquals(1, queue.process())
+        Submission.objects.get(name='submit/trunk/queued')
+        self.assertFalse(QueuedEvent.objects.exists())
+
+    def test_check_before_queued(self):
+        r = self.post('submitted', {'tag': 'submit/trunk/queued'})
+        self.assertEquals(406, r.status_code)
+        self.assertIn('gitpath', json.loads(r.content)['detail'])
+        self.assertEquals(406, self.post('unknown', {}).status_code)
+        self.assertFalse(QueuedEvent.objects.exists())
+
+    def test_shard_in_order(self):
+        self.submit()
+        self.pre_create()
+        self.accept()
+        self.assertEquals(2, QueuedEvent.objects.filter(
+            shard=PROJECT).count())
+
+        queue.process()
+        self.assertEquals('33_ACCEPTED',
+                          BuildGroup.objects.get(name=PROJECT).status)
+        self.assertEquals('accepted', Submission.objects.get(
+            name='submit/trunk/queued').state)
+
+    def test_retry_with_backoff(self):
+        self.submit()
+        self.pre_create()
+        self.accept()
+        # the submission is waiting to be retried
+        QueuedEvent.objects.filter(typ='submitted').update(
+            attempts=1, available=timezone.now() + timedelta(seconds=60))
+        self.assertEquals(1, queue.process())
+
+        event = QueuedEvent.objects.get(typ='pre_created')
+        self.assertEquals(1, event.attempts)
+        self.assertEquals('PENDING', event.status)
+        self.assertTrue(event.available > timezone.now())
+        # the later event of the same project waits
+        self.assertEquals(0, queue.process())
+        self.assertEquals(3, QueuedEvent.objects.count())
+
+        QueuedEvent.objects.update(available=timezone.now())
+        self.assertEquals(3, queue.process())
+        self.assertFalse(QueuedEvent.objects.exists())
+        self.assertEquals('33_ACCEPTED',
+                          BuildGroup.objects.get(name=PROJECT).status)
+
+    def test_rejected_fails_at_once(self):
+        # the submission never comes, so nothing is worth waiting for
+        self.pre_create()
+        self.accept()
+        self.assertEquals(2, queue.process())
+
+        event = QueuedEvent.objects.get(typ='pre_created')
+        self.assertEquals('FAILED', event.status)
+        self.assertEquals(1, event.attempts)
+        self.assertIn('Submission matching query does not exist',
+                      event.error)
+        self.assertFalse(BuildGroup.objects.filter(name=PROJECT).exists())
+        self.assertEquals('FAILED', QueuedEvent.objects.get(
+            typ='repa_action').status)
+
+    def test_rejected_does_not_block_shard(self):
+        self.post('submitted', {
+            'gitpath': 'no/such/tree', 'tag': 'submit/trunk/bad',
+            'commit_id': 'sha1', 'submitter_email': 'someone@localhost'})
+        self.submit()
+        self.assertEquals(2, queue.process())
+        self.assertEquals('FAILED', QueuedEvent.objects.get().status)
+        Submission.objects.get(name='submit/trunk/queued')
+
+    def test_give_up(self):
+        def broken(_data):
+            raise ValueError('broken handler')
+        HANDLERS['broken'] = broken
+        try:
+            QueuedEvent.objects.create(typ='broken', data='{}',
+                                       available=timezone.now())
+            for _ in range(queue.MAX_ATTEMPTS):
+                QueuedEvent.objects.update(available=timezone.now())
+                queue.process()
+        finally:
+            del HANDLERS['broken']
+
+        event = QueuedEvent.objects.get()
+        self.assertEquals('FAILED', event.status)
+        self.assertEquals(queue.MAX_ATTEMPTS, event.attempts)
+        self.assertIn('broken handler', event.error)
+
+    def test_heads_of_all_shards(self):
+        now = timezone.now()
+        for i in range(3):
+            QueuedEvent.objects.create(typ='repa_action', data='{}',
+                                       shard='busy', available=now)
+        QueuedEvent.objects.create(typ='repa_action', data='{}',
+                                   shard='other', available=now)
+        QueuedEvent.objects.create(typ='repa_action', data='{}',
+                                   shard='waiting',
+                                   available=now + timedelta(seconds=60))
+        self.assertEquals(
+            ['busy', 'other'],
+            sorted(event.shard for event in queue.heads(0, 1)))
+
+    def test_stats_need_permission(self):
+        self.client.logout()
+        self.assertEquals(403, self.client.get(self.url % 'queue').status_code)
+
+    def test_stats(self):
+        self.submit()
+        self.pre_create()
+        QueuedEvent.objects.update(
+            created=timezone.now() - timedelta(seconds=30))
+
+        stats = json.loads(self.client.get(self.url % 'queue').content)
+        self.assertEquals(2, stats['pending'])
+        self.assertEquals(2, stats['shards'])
+        self.assertEquals(0, stats['failed'])
+        self.assertTrue(stats['oldest_pending_seconds'] >= 30)
+
+        queue.process()
+        metrics = queue.METRICS.snapshot()
+        self.assertEquals(2, metrics['applied'])
+        self.assertTrue(metrics['mean_latency'] >= 30)
+
+    def test_batch_queued(self):
+        r = self.client.post('/api/submissions/events/batch/', json.dumps({
+            'events': [{'type': 'repa_action', 'data': {'project': PROJECT}},
+                       {'type': 'snapshot_start', 'data': {
+                           'buildid': 'tizen_20150101.1',
+                           'started_time': '2015-01-01 00:00:00',
+                           'project': 'Tizen:IVI'}}]}),
+                             content_type='application/json')
+        self.assertEquals([406, 202], [i['status'] for i in json.loads(
+            r.content)['results']])
+        self.assertEquals('snapshot_start', QueuedEvent.objects.get().typ)
+
+
+def test_backoff():
+    assert [queue.backoff(i) for i in (1, 2, 3)] == [5, 10, 20]
+    assert queue.backoff(20) == queue.MAX_BACKOFF
+
+
+def test_shard_worker():
+    assert all(0 <= queue.shard_worker(name, 4) < 4
+               for name in ('', PROJECT, u'\u4e2d'))
+    assert queue.shard_worker(PROJECT, 4) == queue.shard_worker(PROJECT, 4)
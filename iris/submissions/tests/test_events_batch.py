@@ -0,0 +1,84 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+#pylint: disable=missing-docstring,invalid-name
+
+import os
+import json
+
+from django.test import TestCase
+
+from iris.core.models import Submission, BuildGroup
+from iris.submissions.benchmark import parse_events_log
+
+
+class BatchEventsTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees', 'products',
+                'submissions']
+    url = '/api/submissions/events/batch/'
+
+    def setUp(self):
+        assert self.client.login(username='robot', password='robot')
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body),
+                                content_type='application/json')
+
+    def post_events(self, *events):
+        r = self.post({'events': [{'type': typ, 'data': data}
+                                  for typ, data in events]})
+        self.assertEquals(200, r.status_code)
+        return [i['status'] for i in json.loads(r.content)['results']]
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEquals(403, self.post({'events': []}).status_code)
+
+    def test_bad_request(self):
+        self.assertEquals(400, self.post({'event': []}).status_code)
+        self.assertEquals(400, self.post({'events': ['submitted']})
+                          .status_code)
+
+    def test_too_many_events(self):
+        self.assertEquals(413, self.post({'events': [
+            {'type': 'submitted', 'data': {}}] * 1001}).status_code)
+
+    def test_results_of_each_event(self):
+        tag = 'submit/trunk/batch'
+        project = 'home:prerelease:tizen:ivi:submit:trunk:batch'
+        self.assertEquals([201, 406, 201, 200, 406], self.post_events(
+            ('submitted', {
+                'gitpath': 'framework/system/dlog', 'tag': tag,
+                'commit_id': 'sha1', 'submitter_email': 'someone@localhost'}),
+            ('unknown', {}),
+            ('pre_created', {
+                'gitpath': 'framework/system/dlog', 'tag': tag,
+                'product': 'Tizen:IVI', 'project': project}),
+            ('repa_action', {
+                'project': project, 'status': 'accepted',
+                'who': 'robot@localhost', 'reason': 'good'}),
+            ('image_building', {'project': 'does-not-exist'}),
+            ))
+        self.assertEquals('33_ACCEPTED', Submission.objects.get(
+            name=tag).status)
+        self.assertEquals('accepted', Submission.objects.get(name=tag).state)
+
+    def test_events_log(self):
+        filename = os.path.join(os.path.dirname(__file__), 'events.log')
+        with open(filename) as reader:
+            events = list(parse_events_log(reader))
+
+        for i in range(0, len(events), 100):
+            statuses = self.post_events(*events[i:i + 100])
+            self.assertTrue(all(200 <= j < 300 for j in statuses), statuses)
+
+        self.assertTrue(BuildGroup.objects.exists())
+        self.assertEquals(Submission.derive_states(), dict(
+            Submission.objects.values_list('pk', 'state')))
+        self.assertEquals(0, BuildGroup.update_counters())
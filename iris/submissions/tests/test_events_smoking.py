@@ -12,17 +12,10 @@
 #C: 44,12: Invalid variable name "r" (invalid-name)
 
 import os
-import ast
 
 from django.test import TestCase
 
-
-def parse_events_log(stream):
-    for line in stream:
-        _, path, param = line.rstrip().split('|')
-        typ = path.rstrip('/').split('/')[-1]
-        data = dict(ast.literal_eval(param))
-        yield typ, data
+from iris.submissions.benchmark import parse_events_log
 
 
 class SmokingTest(TestCase):
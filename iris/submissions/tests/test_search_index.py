@@ -0,0 +1,130 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+#pylint: disable=missing-docstring,invalid-name
+
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.db.models import Q
+from django.core.management import call_command
+from django.contrib.auth.models import User
+
+from iris.core.models import Submission, SubmissionTrigram, GitTree
+from iris.etl.scm import user_names, index_renamed_owners, merge_users
+from iris.submissions.views.read import (
+    parse_query_string, make_query_conditions)
+
+
+class SearchIndexTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees', 'products',
+                'submissions']
+
+    def setUp(self):
+        bob = User.objects.create(username='bob', email='bob@builder.org',
+                                  first_name='Bob', last_name='Builder')
+        tree = GitTree.objects.get(gitpath='platform/upstream/bluez')
+        for i in range(3):
+            Submission.objects.create(
+                name='submit/tizen/2015010%d.1' % i, owner=bob,
+                gittree=tree, commit='deadbeef%d' % i)
+        SubmissionTrigram.index()
+
+    def search(self, querystring):
+        return sorted(Submission.objects.filter(make_query_conditions(
+            parse_query_string(querystring))).values_list('name', flat=True))
+
+    def scan(self, querystring):
+        """Search without index as it was"""
+        kw = parse_query_string(querystring)
+        fields = {
+            'name': ['name__contains'],
+            'owner': ['owner__email__startswith',
+                      'owner__first_name__contains',
+                      'owner__last_name__contains'],
+            'gittree': ['gittree__gitpath__contains'],
+            'query': ['name__contains', 'owner__email__startswith',
+                      'owner__first_name__contains',
+                      'owner__last_name__contains', 'commit__startswith',
+                      'gittree__gitpath__contains'],
+            }
+        query = Q()
+        for key, val in kw.items():
+            query &= reduce(lambda i, j: i | j,
+                            [Q(**{field: val}) for field in fields[key]])
+        return sorted(Submission.objects.filter(query).values_list(
+            'name', flat=True))
+
+    def test_same_as_scan(self):
+        for querystring in ('trunk', 'submit/tizen/20150102', 'owner:Build',
+                            'owner:bob@b', 'gittree:bluez', 'deadbeef1',
+                            'bluez name:tizen', 'Wonder', 'tr', 'uild',
+                            'name:20150101 owner:alice', 'commit-that-not',
+                            'framework/system'):
+            self.assertEqual(self.scan(querystring), self.search(querystring),
+                             querystring)
+
+    def test_search(self):
+        self.assertEqual(['submit/tizen/20150101.1'], self.search('01.1'))
+        self.assertEqual([], self.search('owner:builder.org'))
+
+    def test_short_value_is_not_indexed(self):
+        self.assertIs(None, SubmissionTrigram.candidates(['name'], 'tr'))
+        self.assertEqual(7, len(self.search('tr')))
+
+    def test_index_renamed_owners(self):
+        names = user_names()
+        User.objects.filter(username='bob').update(last_name='Marley')
+        index_renamed_owners(names)
+
+        self.assertEqual([], self.search('owner:Builder'))
+        self.assertEqual(3, len(self.search('Marley')))
+
+    def test_edited_owners_and_gittrees_are_reindexed(self):
+        bob = User.objects.get(username='bob')
+        bob.last_name = 'Marley'
+        bob.save()
+        tree = GitTree.objects.get(gitpath='platform/upstream/bluez')
+        tree.gitpath = 'platform/upstream/bluetooth'
+        tree.save()
+
+        self.assertEqual([], self.search('owner:Builder'))
+        self.assertEqual(3, len(self.search('owner:Marley')))
+        self.assertEqual(self.scan('gittree:bluetooth'),
+                         self.search('gittree:bluetooth'))
+        self.assertEqual([], self.search('gittree:bluez'))
+
+    def test_logins_are_not_reindexed(self):
+        bob = User.objects.get(username='bob')
+        with self.assertNumQueries(1):
+            bob.save(update_fields=['last_login'])
+
+    def test_candidates_are_pks(self):
+        pks = SubmissionTrigram.candidates(['owner'], 'Builder')
+        self.assertEqual(sorted(Submission.objects.filter(
+            owner__last_name='Builder').values_list('pk', flat=True)), pks)
+
+    def test_merge_users(self):
+        User.objects.create(username='bbuilder', email='bob@builder.org',
+                            first_name='Robert', last_name='Builder')
+        User.objects.filter(username='bob').update(username='bob@builder.org')
+        merge_users('bob@builder.org')
+
+        self.assertEqual(3, len(self.search('owner:Robert')))
+        self.assertEqual(self.scan('owner:Robert'),
+                         self.search('owner:Robert'))
+
+    def test_rebuild_command(self):
+        SubmissionTrigram.objects.all().delete()
+        self.assertEqual([], self.search('trunk'))
+
+        out = StringIO()
+        call_command('index_submissions', stdout=out)
+        self.assertIn('7 submissions indexed', out.getvalue())
+        self.assertEqual(4, len(self.search('trunk')))
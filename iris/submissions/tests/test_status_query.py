@@ -0,0 +1,138 @@
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+#pylint: disable=missing-docstring,invalid-name
+
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+
+from iris.core.models import (
+    Submission, SubmissionBuild, BuildGroup, GitTree, Product,
+    DISPLAY_STATUS)
+
+
+class StateQueryTest(TestCase):
+
+    fixtures = ['users', 'domains', 'subdomains', 'gittrees', 'products',
+                'submissions']
+
+    def setUp(self):
+        owner = User.objects.get(username='alice')
+        tree = GitTree.objects.get(gitpath='platform/upstream/bluez')
+        ivi, common = Product.objects.all()[:2]
+
+        def submission(name, status='SUBMITTED'):
+            return Submission.objects.create(
+                name=name, owner=owner, gittree=tree, commit='sha1',
+                status=status)
+
+        def build(sub, product, group, status):
+            group, _ = BuildGroup.objects.get_or_create(
+                name=group, defaults={'status': status})
+            SubmissionBuild.objects.create(
+                submission=sub, product=product, group=group)
+
+        sub = submission('submit/trunk/two-products')
+        build(sub, ivi, 'prj:ivi', '33_ACCEPTED')
+        build(sub, common, 'prj:common', '20_IMGBUILDING')
+
+        sub = submission('submit/trunk/rejected')
+        build(sub, ivi, 'prj:rejected', '36_REJECTED')
+
+        sub = submission('submit/trunk/accepted-rejected')
+        build(sub, ivi, 'prj:ivi2', '33_ACCEPTED')
+        build(sub, common, 'prj:rejected', '36_REJECTED')
+
+        submission('submit/trunk/error', 'ERROR')
+
+    def check(self, status, prop):
+        expected = sorted(sub.name for sub in Submission.objects.all()
+                          if getattr(sub, prop))
+        Submission.update_states()
+        self.assertEqual(expected, sorted(
+            Submission.objects.filter(
+                Submission.state_query(status)).values_list(
+                    'name', flat=True)))
+        return expected
+
+    def test_opened(self):
+        self.assertEqual(
+            ['submit/trunk/01', 'submit/trunk/02',
+             'submit/trunk/two-products'],
+            self.check(DISPLAY_STATUS['OPENED'], 'opened'))
+
+    def test_accepted(self):
+        self.assertEqual(
+            ['submit/trunk/03', 'submit/trunk/04',
+             'submit/trunk/accepted-rejected', 'submit/trunk/two-products'],
+            self.check(DISPLAY_STATUS['ACCEPTED'], 'accepted'))
+
+    def test_rejected(self):
+        self.assertEqual(
+            ['submit/trunk/accepted-rejected', 'submit/trunk/rejected'],
+            self.check(DISPLAY_STATUS['REJECTED'], 'rejected'))
+
+    def test_combined_with_other_conditions(self):
+        Submission.update_states()
+        self.assertEqual(['submit/trunk/two-products'], list(
+            Submission.objects.filter(
+                Submission.state_query(DISPLAY_STATUS['OPENED']),
+                gittree__gitpath='platform/upstream/bluez').values_list(
+                    'name', flat=True)))
+
+    def test_unknown_status(self):
+        self.assertRaises(ValueError, Submission.state_query, 'building')
+
+    def test_state_of_error_submission(self):
+        self.assertEqual(1, Submission.update_states(
+            Submission.objects.filter(name='submit/trunk/error')))
+        self.assertEqual('error', Submission.objects.get(
+            name='submit/trunk/error').state)
+
+    def test_populate_status_updates_states(self):
+        group = BuildGroup.objects.get(name='prj:common')
+        group.status = '33_ACCEPTED'
+        group.save()
+        group.populate_status()
+        self.assertEqual('accepted', Submission.objects.get(
+            name='submit/trunk/two-products').state)
+
+    def test_populate_status_only_changed(self):
+        group = BuildGroup.objects.get(name='prj:common')
+        sub = Submission.objects.get(name='submit/trunk/two-products')
+        for i in range(20):
+            SubmissionBuild.objects.create(
+                submission=Submission.objects.create(
+                    name='submit/trunk/many-%d' % i, owner=sub.owner,
+                    gittree=sub.gittree, commit='sha1',
+                    status='20_IMGBUILDING'),
+                product=sub.submissionbuild_set.all()[0].product,
+                group=group)
+        group.status = '20_IMGBUILDING'
+
+        # read pks, update status, then query and update changed states
+        with self.assertNumQueries(6):
+            self.assertEqual(1, group.populate_status())
+        self.assertGreater(Submission.objects.get(pk=sub.pk).updated,
+                           sub.updated)
+        self.assertEqual(0, group.populate_status())
+
+    def test_command_backfill_and_verify(self):
+        out = StringIO()
+        self.assertRaises(CommandError, call_command, 'submission_states',
+                          verify=True, stdout=out)
+        self.assertIn('submit/trunk/rejected: opened, expected rejected',
+                      out.getvalue())
+
+        call_command('submission_states', stdout=out)
+        call_command('submission_states', verify=True, stdout=out)
+        self.assertIn('All 8 submissions are OK', out.getvalue())
@@ -9,25 +9,32 @@
 View functions to handler submission events
 """
 import sys
+import json
 import urllib
 import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
 
 from MySQLdb.constants.ER import DUP_ENTRY, LOCK_DEADLOCK
 
+from django.conf import settings
 from django.utils import timezone
+from django.core.urlresolvers import reverse
 from django.db import IntegrityError, OperationalError, transaction
 from django.contrib.auth.decorators import permission_required
 
 from rest_framework.status import (
     HTTP_200_OK, HTTP_201_CREATED, HTTP_202_ACCEPTED,
-    HTTP_406_NOT_ACCEPTABLE,
+    HTTP_400_BAD_REQUEST, HTTP_406_NOT_ACCEPTABLE,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE, HTTP_500_INTERNAL_SERVER_ERROR,
     )
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 
 from iris.core.models import (
     Submission, SubmissionBuild, ImageBuild, PackageBuild, Snapshot,
-    BuildGroup
+    BuildGroup, SubmissionTrigram, QueuedEvent
     )
 from iris.submissions.views.event_forms import (
     SubmittedForm, PreCreatedForm, PackageBuiltForm,
@@ -43,32 +50,99 @@ logger = logging.getLogger(__name__)
 
 PUBLISH_EVENTS_PERM = 'core.publish_events'
 
+MAX_BATCH_EVENTS = 1000
+
+# events which are about a build group named by data['project']
+GROUP_EVENTS = ('pre_created', 'package_built', 'image_building',
+                'image_created', 'repa_action')
+
+# build groups to populate status, see coalesced_populate()
+_local = threading.local()
+
 @api_view(["POST"])
 @permission_required(PUBLISH_EVENTS_PERM, raise_exception=True)
 def events_handler(request, typ):
     """
     Common event handler for all submissions events
     """
-    handlers = {
-        'submitted': submitted,
-        'pre_created': pre_created,
-        'pre_created_failed': pre_created_failed,
-        'package_built': package_built,
-        'image_building': image_building,
-        'image_created': image_created,
-        'repa_action': repa_action,
-        'snapshot_start': snapshot_start,
-        'snapshot_finish': snapshot_finish,
-        'snapshot_release': snapshot_release,
-        }
     print >> sys.stderr, 'events|%s|%s' % (request.path, request.POST.items())
-    handler = handlers.get(typ)
+    if settings.EVENTS_QUEUED:
+        return queue_event(typ, request.POST.dict())
+    handler = HANDLERS.get(typ)
     if not handler:
         return Response({'detail': 'Unknown event type'},
                         status=HTTP_406_NOT_ACCEPTABLE)
+    return retry_on_deadlock(handler, request.POST)
+
+
+@api_view(["POST"])
+@permission_required(PUBLISH_EVENTS_PERM, raise_exception=True)
+def batch_events_handler(request):
+    """
+    Handler for a batch of submissions events
+
+    Request body is JSON like:
+      {"events": [{"type": "package_built", "data": {"name": ...}}, ...]}
+
+    Events are applied in order. Events of the same pre-release project are
+    applied in one transaction, which populates status of the project only
+    once. Response contains results of each event in the same order:
+      {"results": [{"status": 200, "detail": ...}, ...]}
+    """
+    events = request.DATA.get('events') if isinstance(
+        request.DATA, dict) else None
+    if not isinstance(events, list) or not all(
+            isinstance(i, dict) and isinstance(i.get('data'), dict)
+            for i in events):
+        return Response(
+            {'detail': 'events should be a list of {"type", "data"}'},
+            status=HTTP_400_BAD_REQUEST)
+    if len(events) > MAX_BATCH_EVENTS:
+        return Response(
+            {'detail': 'At most %d events in a batch' % MAX_BATCH_EVENTS},
+            status=HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    for event in events:
+        print >> sys.stderr, 'events|%s|%s' % (
+            reverse('submissions_events', args=[event.get('type')]),
+            event['data'].items())
+
+    if settings.EVENTS_QUEUED:
+        with transaction.atomic():
+            results = [result_of(queue_event(event.get('type'),
+                                             event['data']))
+                       for event in events]
+        return Response({'results': results}, status=HTTP_200_OK)
+
+    results = [None] * len(events)
+
+    def apply_batch(indexes):
+        with coalesced_populate():
+            for i in indexes:
+                results[i] = apply_event(events[i].get('type'),
+                                         events[i]['data'])
+
+    for indexes in split_batches(events):
+        retry_on_deadlock(apply_batch, indexes)
+    return Response({'results': results}, status=HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_required(PUBLISH_EVENTS_PERM, raise_exception=True)
+def queue_stats(request):
+    """
+    Depth and latency metrics of the event queue, see EVENTS_QUEUED
+    """
+    return Response(QueuedEvent.stats(), status=HTTP_200_OK)
+
+
+def retry_on_deadlock(func, *args):
+    """
+    Call `func` in a transaction, call it again if deadlock found
+    """
     try:
         with transaction.atomic():
-            return handler(request)
+            return func(*args)
     except OperationalError as err:
         if err.args[0] != LOCK_DEADLOCK:
             raise
@@ -77,10 +151,109 @@ def events_handler(request, typ):
         # deadlock. Deadlocks are not dangerous. Just try again.
         logger.warn("Deadlock found, try again: %s" % str(err))
         with transaction.atomic():
-            return handler(request)
+            return func(*args)
 
 
-def submitted(request):
+def split_batches(events):
+    """
+    Split indexes of `events` into batches applied in one transaction each.
+
+    Events of the same pre-release project between two events of other
+    types are in one batch. Other events are batches of their own, so
+    events are never applied before the events they depend on.
+    """
+    groups = OrderedDict()
+    for i, event in enumerate(events):
+        project = event['data'].get('project')
+        if event.get('type') in GROUP_EVENTS and project:
+            groups.setdefault(project, []).append(i)
+            continue
+        for indexes in groups.values():
+            yield indexes
+        groups.clear()
+        yield [i]
+    for indexes in groups.values():
+        yield indexes
+
+
+def apply_event(typ, data):
+    """
+    Apply an event of a batch in a savepoint and returns its result
+    """
+    handler = HANDLERS.get(typ)
+    if not handler:
+        return {'status': HTTP_406_NOT_ACCEPTABLE,
+                'detail': 'Unknown event type'}
+    try:
+        with transaction.atomic():
+            response = handler(data)
+    except Exception as err:
+        # the whole batch is retried on deadlock
+        if isinstance(err, OperationalError) and \
+                err.args[0] == LOCK_DEADLOCK:
+            raise
+        logger.exception('Failed to apply event %s: %s', typ, data)
+        return {'status': HTTP_500_INTERNAL_SERVER_ERROR, 'detail': str(err)}
+    return result_of(response)
+
+
+def result_of(response):
+    """
+    Result of an event in a batch from its response
+    """
+    return {'status': response.status_code,
+            'detail': response.data['detail']}
+
+
+def queue_event(typ, data):
+    """
+    Store an event to the queue if it has all required parameters.
+
+    Parameters are checked further when the event is applied by workers,
+    see iris.submissions.queue.
+    """
+    if typ not in HANDLERS:
+        return Response({'detail': 'Unknown event type'},
+                        status=HTTP_406_NOT_ACCEPTABLE)
+    missing = [i for i in REQUIRED_FIELDS[typ] if not data.get(i)]
+    if missing:
+        return Response(
+            {'detail': 'Missing parameters: %s' % ', '.join(missing)},
+            status=HTTP_406_NOT_ACCEPTABLE)
+    QueuedEvent.objects.create(
+        typ=typ, data=json.dumps(data),
+        shard=data['project'] if typ in GROUP_EVENTS else '',
+        available=timezone.now())
+    return Response({'detail': 'Event queued'}, status=HTTP_202_ACCEPTED)
+
+
+@contextmanager
+def coalesced_populate():
+    """
+    Within this context populate() only records build groups, whose
+    status are populated once at the end
+    """
+    _local.pending = set()
+    try:
+        yield
+        for pk in sorted(_local.pending):
+            BuildGroup.objects.get(pk=pk).populate_status()
+    finally:
+        _local.pending = None
+
+
+def populate(group):
+    """
+    Populate status of build group, see coalesced_populate()
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        group.populate_status()
+    else:
+        pending.add(group.pk)
+
+
+def submitted(data):
     """
     Event that occurs when a tag submitted
 
@@ -89,7 +262,7 @@ def submitted(request):
     commit_id -- Commit hash
     submitter_email -- Email of submitter
     """
-    form = SubmittedForm(request.POST)
+    form = SubmittedForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -109,10 +282,11 @@ def submitted(request):
             return Response({'detail': str(err)}, status=HTTP_202_ACCEPTED)
         raise
 
+    SubmissionTrigram.index([sub.pk])
     return Response({'detail': 'Tag submitted'}, status=HTTP_201_CREATED)
 
 
-def pre_created(request):
+def pre_created(data):
     """
     Event that happens when a pre-release project had been created
 
@@ -121,7 +295,7 @@ def pre_created(request):
     product -- Target product name
     project -- Pre-release project name
     """
-    form = PreCreatedForm(request.POST)
+    form = PreCreatedForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -140,12 +314,12 @@ def pre_created(request):
             return Response({'detail': str(err)}, status=HTTP_202_ACCEPTED)
         raise
 
-    group.populate_status()
+    populate(group)
     return Response({'detail': 'Pre-release project created'},
                     status=HTTP_201_CREATED)
 
 
-def pre_created_failed(request):
+def pre_created_failed(data):
     """
     Event that happens when a pre-release project failed to create
     tag -- Tag name
@@ -154,16 +328,17 @@ def pre_created_failed(request):
     """
     try:
         sub = Submission.objects.get(
-            name=request.POST['tag'],
-            gittree__gitpath=request.POST['gitpath'].strip('/')
+            name=data['tag'],
+            gittree__gitpath=data['gitpath'].strip('/')
             )
     except Submission.DoesNotExist as err:
         return Response({'detail': 'wrong tag name or gitpath'},
                         status=HTTP_406_NOT_ACCEPTABLE)
     else:
         sub.status = 'ERROR'
-        sub.reason = request.POST['reason']
+        sub.reason = data['reason']
         sub.save()
+        Submission.update_states([sub.pk])
         return Response(
             {'detail': 'submission status updated'},
             status=HTTP_200_OK)
@@ -195,7 +370,7 @@ def guess_build_log_url(server, project, package, repo, arch):
         repo)
 
 
-def package_built(request):
+def package_built(data):
     """
     Event that happens when a package was built
 
@@ -206,7 +381,7 @@ def package_built(request):
     status -- Status
     repo_server -- Repository URL
     """
-    form = PackageBuiltForm(request.POST)
+    form = PackageBuiltForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -245,12 +420,12 @@ def package_built(request):
         pbuild.log = log
         pbuild.save()
 
-    group.populate_status()
+    populate(group)
     msg = {'detail': '%s bulit %s' % (data['name'], data['status'])}
     return Response(msg, status=HTTP_200_OK)
 
 
-def image_building(request):
+def image_building(data):
     """
     Event that happens when a image started to build
 
@@ -259,7 +434,7 @@ def image_building(request):
     repo -- Building repository
     #arch -- Building architecture
     """
-    form = ImageBuildingForm(request.POST)
+    form = ImageBuildingForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -281,12 +456,12 @@ def image_building(request):
             'repo': data['repo'],
             })
 
-    group.populate_status()
+    populate(group)
     return Response({'detail': 'Image started to build'},
                     status=HTTP_200_OK)
 
 
-def image_created(request):
+def image_created(data):
     """
     Event that happends when a image created
 
@@ -296,7 +471,7 @@ def image_created(request):
     url -- Image URL
     #log -- Build log
     """
-    form = ImageCreatedForm(request.POST)
+    form = ImageCreatedForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -310,12 +485,12 @@ def image_created(request):
 
     group.check_images_status(ibuild)
     ibuild.save()
-    group.populate_status()
+    populate(group)
     return Response({'detail': 'Image created %s' % data['status']},
                     status=HTTP_200_OK)
 
 
-def repa_action(request):
+def repa_action(data):
     """
     Event that happens when `repa` operates on some pre-release project
 
@@ -325,7 +500,7 @@ def repa_action(request):
     reason - Explanation
     when - When this happened
     """
-    form = RepaActionForm(request.POST)
+    form = RepaActionForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -338,14 +513,14 @@ def repa_action(request):
     group.operated_on = timezone.now()
     group.operate_reason = data['reason'].strip()
     group.save()
-    group.populate_status()
+    populate(group)
 
     return Response({'detail': 'Action %s received' % data['status']},
                     status=HTTP_200_OK)
 
 
-def snapshot_start(request):
-    form = SnapshotStartForm(request.POST)
+def snapshot_start(data):
+    form = SnapshotStartForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -358,7 +533,7 @@ def snapshot_start(request):
                     status=HTTP_200_OK)
 
 
-def snapshot_finish(request):
+def snapshot_finish(data):
 
     def manage_submissions():
         buildgroups = BuildGroup.objects.filter(
@@ -371,7 +546,7 @@ def snapshot_finish(request):
             buildgroup.snapshot = snapshot
             buildgroup.save()
 
-    form = SnapshotFinishedForm(request.POST)
+    form = SnapshotFinishedForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -388,8 +563,8 @@ def snapshot_finish(request):
                     status=HTTP_200_OK)
 
 
-def snapshot_release(request):
-    form = SnapshotReleaseForm(request.POST)
+def snapshot_release(data):
+    form = SnapshotReleaseForm(data)
     if not form.is_valid():
         return Response({'detail': form.errors.as_text()},
                         status=HTTP_406_NOT_ACCEPTABLE)
@@ -404,3 +579,36 @@ def snapshot_release(request):
 
     return Response({'detail': 'Action snapshot release received'},
                     status=HTTP_200_OK)
+
+
+HANDLERS = {
+    'submitted': submitted,
+    'pre_created': pre_created,
+    'pre_created_failed': pre_created_failed,
+    'package_built': package_built,
+    'image_building': image_building,
+    'image_created': image_created,
+    'repa_action': repa_action,
+    'snapshot_start': snapshot_start,
+    'snapshot_finish': snapshot_finish,
+    'snapshot_release': snapshot_release,
+    }
+
+EVENT_FORMS = {
+    'submitted': SubmittedForm,
+    'pre_created': PreCreatedForm,
+    'package_built': PackageBuiltForm,
+    'image_building': ImageBuildingForm,
+    'image_created': ImageCreatedForm,
+    'repa_action': RepaActionForm,
+    'snapshot_start': SnapshotStartForm,
+    'snapshot_finish': SnapshotFinishedForm,
+    'snapshot_release': SnapshotReleaseForm,
+    }
+
+# parameters checked before an event is queued
+REQUIRED_FIELDS = dict(
+    ((typ, [name for name, field in form.base_fields.items()
+            if field.required])
+     for typ, form in EVENT_FORMS.items()),
+    pre_created_failed=['tag', 'gitpath', 'reason'])
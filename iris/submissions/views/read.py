@@ -25,7 +25,9 @@ from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
 
 from iris.core.models import (
-    Submission, BuildGroup, SubmissionGroup, Snapshot, Product, DISPLAY_STATUS)
+    Submission, BuildGroup, SubmissionGroup, SubmissionTrigram, Snapshot,
+    Product, DISPLAY_STATUS)
+from iris.core.pagination import parse_limit, keyset_group_page
 
 
 def index(request):
@@ -41,50 +43,75 @@ def index(request):
     return HttpResponseRedirect(url)
 
 
-def get_submissions(**query):
+def get_submissions(*args, **query):
     return [sub for sub in Submission.objects.select_related(
-        'owner', 'gittree').filter(**query).prefetch_related(
+        'owner', 'gittree').filter(*args, **query).prefetch_related(
             'submissionbuild_set__product',
             'submissionbuild_set__group',
             'submissionbuild_set__group__snapshot',
             )]
 
 
+def summary(request, query, status, **context):
+    """
+    Render a page of submission groups matching `query`.
+
+    Groups are ordered by (updated, name) descendingly and paged by
+    keyset, see iris.core.pagination. Request parameters `limit` and
+    `after` select the page.
+    """
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        names, cursor = keyset_group_page(
+            Submission.objects.filter(query), request.GET.get('after'), limit)
+    except ValueError:
+        return HttpResponseBadRequest('error')
+
+    subs = get_submissions(query, name__in=names) if names else []
+    context['results'] = SubmissionGroup.group(subs, status)
+    if cursor:
+        params = request.GET.copy()
+        params['after'] = cursor
+        context['next_url'] = '?%s' % params.urlencode()
+    if request.GET.get('after'):
+        params = request.GET.copy()
+        del params['after']
+        context['first_url'] = '?%s' % params.urlencode()
+    return render(request, 'submissions/summary.html', context)
+
+
 def opened(request):
     """
     All opened submissions
     """
-    subs = [sub for sub in get_submissions() if sub.opened]
-    return render(request, 'submissions/summary.html', {
-        'title': 'All open submissions',
-        'results': SubmissionGroup.group(subs, DISPLAY_STATUS['OPENED']),
-        'keyword': 'status:%s' % DISPLAY_STATUS['OPENED'],
-        })
+    return summary(
+        request, Submission.state_query(DISPLAY_STATUS['OPENED']),
+        DISPLAY_STATUS['OPENED'],
+        title='All open submissions',
+        keyword='status:%s' % DISPLAY_STATUS['OPENED'])
 
 
 def accepted(request):
     """
     All accepted submissions
     """
-    subs = [sub for sub in get_submissions() if sub.accepted]
-    return render(request, 'submissions/summary.html', {
-        'title': 'All accepted submissions',
-        'results': SubmissionGroup.group(subs, DISPLAY_STATUS['ACCEPTED']),
-        'keyword': 'status:%s' % DISPLAY_STATUS['ACCEPTED'],
-        'show_snapshot': True,
-        })
+    return summary(
+        request, Submission.state_query(DISPLAY_STATUS['ACCEPTED']),
+        DISPLAY_STATUS['ACCEPTED'],
+        title='All accepted submissions',
+        keyword='status:%s' % DISPLAY_STATUS['ACCEPTED'],
+        show_snapshot=True)
 
 
 def rejected(request):
     """
     All rejected submissions
     """
-    subs = [sub for sub in get_submissions() if sub.rejected]
-    return render(request, 'submissions/summary.html', {
-        'title': 'All rejected submissions',
-        'results': SubmissionGroup.group(subs, DISPLAY_STATUS['REJECTED']),
-        'keyword': 'status:%s' % DISPLAY_STATUS['REJECTED'],
-        })
+    return summary(
+        request, Submission.state_query(DISPLAY_STATUS['REJECTED']),
+        DISPLAY_STATUS['REJECTED'],
+        title='All rejected submissions',
+        keyword='status:%s' % DISPLAY_STATUS['REJECTED'])
 
 
 @login_required
@@ -93,13 +120,14 @@ def mine(request):
     All my (the logged-in user) opened submissions
     TODO: add menu as all did, show opened, rejected, accepted
     """
-    subs = [sub for sub in get_submissions(owner=request.user) if sub.opened]
-    return render(request, 'submissions/summary.html', {
-        'title': 'My submissions',
-        'results': SubmissionGroup.group(subs, DISPLAY_STATUS['OPENED']),
-        'keyword': 'status:%s owner:%s' % (DISPLAY_STATUS['OPENED'],
-                                           request.user.email)
-        })
+    return summary(
+        request,
+        Submission.state_query(DISPLAY_STATUS['OPENED']) &
+        Q(owner=request.user),
+        DISPLAY_STATUS['OPENED'],
+        title='My submissions',
+        keyword='status:%s owner:%s' % (DISPLAY_STATUS['OPENED'],
+                                        request.user.email))
 
 
 def parse_query_string(query_string):
@@ -158,15 +186,27 @@ def make_query_conditions(kw):
             ],
         }
 
+    # fields of SubmissionTrigram to narrow down candidates by index
+    indexed = {
+        'name': ['name'],
+        'owner': ['owner'],
+        'gittree': ['gittree'],
+        'query': ['name', 'owner', 'commit', 'gittree'],
+        }
+
     def _and(*args):
         return reduce(lambda i, j: i & j, *args)
 
     def _or(*args):
         return reduce(lambda i, j: i | j, *args)
 
-    return _and([
-        _or([Q(**{field: val}) for field in fields[key]])
-        for key, val in kw.items()])
+    conditions = []
+    for key, val in kw.items():
+        candidates = SubmissionTrigram.candidates(indexed[key], val)
+        if candidates is not None:
+            conditions.append(Q(pk__in=candidates))
+        conditions.append(_or([Q(**{field: val}) for field in fields[key]]))
+    return _and(conditions)
 
 
 def search(request):
@@ -176,31 +216,15 @@ def search(request):
         return HttpResponseBadRequest('error')
     kw = parse_query_string(querystring)
     st = kw.pop('status', None) if kw else None
-    subs = Submission.objects.select_related('owner', 'gittree', 'product')
-    if kw:
-        query = make_query_conditions(kw)
-        subs = subs.filter(query)
-    else:
-        subs = subs.all()
-
-    show_snapshot = False
+    query = make_query_conditions(kw) if kw else Q()
     if st:
-        if st == DISPLAY_STATUS['OPENED']:
-            subs = {sub for sub in subs if sub.opened}
-        if st == DISPLAY_STATUS['REJECTED']:
-            subs = {sub for sub in subs if sub.rejected}
-        if st == DISPLAY_STATUS['ACCEPTED']:
-            subs = {sub for sub in subs if sub.accepted}
-            show_snapshot = True
+        query &= Submission.state_query(st)
 
-    return render(
-        request,
-        'submissions/summary.html',
-        {'title': 'Search result for "%s"' % querystring,
-         'results': SubmissionGroup.group(subs, st),
-         'keyword': querystring,
-         'show_snapshot': show_snapshot
-        })
+    return summary(
+        request, query, st,
+        title='Search result for "%s"' % querystring,
+        keyword=querystring,
+        show_snapshot=st == DISPLAY_STATUS['ACCEPTED'])
 
 
 def detail(request, tag):
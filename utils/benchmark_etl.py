@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of IRIS: Infrastructure and Release Information System
+#
+# Copyright (C) 2013-2015 Intel Corporation
+#
+# IRIS is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2.0 as published by the Free Software Foundation.
+
+"""
+Time the ETL algorithms on synthetic data, which is too slow and too
+noisy to be checked by unit tests.
+
+    python utils/benchmark_etl.py hashdiff --rows 100000
+    python utils/benchmark_etl.py usercache --rows 50000
+"""
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iris.core.settings')
+
+import sys
+import time
+import random
+import argparse
+
+from iris.etl.loader import diff3, hashdiff, getk
+from iris.etl.parser import parse_blocks
+from iris.etl.scm import build_user_cache, MAPPING
+
+
+def bench_hashdiff(total):
+    """
+    Compare hashdiff() with sorting both sides and diff3()
+    """
+    ckey, ukey = ('name', 'domain__name'), ('arch',)
+
+    def row(i, arch='x86'):
+        return {'name': u'tree%d' % i, 'domain__name': u'domain%d' % (i % 50),
+                'arch': arch}
+    # 10% are added, 10% are deleted and 5% are changed
+    left = [row(i, 'arm' if i % 20 == 0 else 'x86')
+            for i in range(total // 10, total + total // 10)]
+    right = [dict(row(i), pk=i) for i in range(total)]
+
+    start = time.time()
+    sleft = sorted(left, key=lambda x: getk(x, ckey))
+    sright = sorted(right, key=lambda x: getk(x, ckey))
+    diff3(sleft, sright, ckey, ukey)
+    merge_time = time.time() - start
+
+    start = time.time()
+    hashdiff(left, right, ckey, ukey)
+    hash_time = time.time() - start
+
+    print 'diff %d rows: sort+diff3 %.3fs, hashdiff %.3fs' % (
+        total, merge_time, hash_time)
+
+
+def bench_usercache(total):
+    """
+    Build UserCache from a synthetic scm file, each user is written in all
+    the three forms and sometimes shares names or emails with others
+    """
+    rand = random.Random(0)
+    ustrings = []
+    for i in range(total):
+        first, last = 'First%d' % rand.randint(0, total), 'Last%d' % i
+        email = 'user%d@i.com' % rand.randint(0, total * 2)
+        ustrings.extend(['%s %s <%s>' % (first, last, email),
+                         '%s %s' % (first, last), email])
+    rand.shuffle(ustrings)
+    lines = []
+    for i, ustring in enumerate(ustrings):
+        lines.extend(['T: tree%d' % i, 'M: %s' % ustring, ''])
+    content = '\n'.join(lines)
+
+    start = time.time()
+    users = build_user_cache(parse_blocks(content, MAPPING)).all()
+    elapsed = time.time() - start
+
+    print 'merge %d user strings into %d users in %.3fs' % (
+        len(ustrings), len(users), elapsed)
+
+
+BENCHMARKS = {
+    'hashdiff': bench_hashdiff,
+    'usercache': bench_usercache,
+    }
+
+
+def main():
+    """
+    Run the benchmark given in command line
+    """
+    parser = argparse.ArgumentParser(
+        description='Time the ETL algorithms on synthetic data')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('-n', '--rows', type=int, default=100000,
+                        help='number of synthetic rows or users')
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args.rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())